@@ -0,0 +1,86 @@
+"""
+Benchmark: prompt tokens per request with and without the context token budget.
+
+Simulates a busy channel chat with chat_history_limit=20. Posts are mostly
+short check-ins with an occasional long post (several thousand characters,
+Cyrillic), and each is followed by a bot comment. For every new post it
+builds the prompt as GroqClient would. Reports estimated input tokens per
+request (mean, p95, max), total tokens and the cost of building the context.
+Nothing is sent to Groq. Run from the repository root:
+
+    python benchmarks/bench_context_builder.py [requests] [max_input_tokens] [max_message_tokens]
+"""
+import logging
+import os
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_history import HistoryEntry, MessageRole  # noqa: E402
+from context_builder import ContextBuilder  # noqa: E402
+from llm_client import GroqClient  # noqa: E402
+
+ROLE = "Ты опытный психолог, который дает мотивирующие комментарии к целям людей"
+SENTENCES = [
+    "Сегодня пробежал пять километров и сделал зарядку.",
+    "Прочитал двадцать страниц книги про привычки.",
+    "Закончил проект на работе, завтра презентация.",
+    "Не получилось лечь спать до 23:00, попробую завтра.",
+    "Выучил десять новых слов на испанском.",
+]
+
+
+def make_post(rng: random.Random) -> str:
+    # One post in ten is a long channel post (weekly report, article repost)
+    sentences = rng.randint(40, 120) if rng.random() < 0.1 else rng.randint(1, 4)
+    return " ".join(rng.choice(SENTENCES) for _ in range(sentences))
+
+
+def run(requests: int, builder: ContextBuilder | None) -> dict:
+    rng = random.Random(1)
+    client = GroqClient(api_key="bench", context_builder=builder)
+    history: deque[HistoryEntry] = deque(maxlen=20)
+    tokens: list[int] = []
+    build_time = 0.0
+    for _ in range(requests):
+        post = make_post(rng)
+        start = time.perf_counter()
+        payload = client._build_payload(ROLE, post, history)
+        build_time += time.perf_counter() - start
+        tokens.append(client.estimate_input_tokens(ROLE, post, history))
+        assert len(payload["messages"]) >= 2
+        history.append(HistoryEntry(MessageRole.USER, post))
+        history.append(HistoryEntry(MessageRole.ASSISTANT, " ".join(rng.choice(SENTENCES) for _ in range(3))))
+    tokens.sort()
+    return {
+        "mean": sum(tokens) / len(tokens),
+        "p95": tokens[int(len(tokens) * 0.95)],
+        "max": tokens[-1],
+        "total": sum(tokens),
+        "build_us": build_time / requests * 1e6,
+    }
+
+
+def main(requests: int, max_input_tokens: int, max_message_tokens: int) -> None:
+    print(f"{'mode':<28} {'mean':>7} {'p95':>7} {'max':>7} {'total':>10} {'build':>9}")
+    for name, builder in (
+        ("no budget", None),
+        (f"budget {max_input_tokens}/{max_message_tokens}", ContextBuilder(max_input_tokens, max_message_tokens)),
+    ):
+        result = run(requests, builder)
+        print(
+            f"{name:<28} {result['mean']:>7.0f} {result['p95']:>7} {result['max']:>7} "
+            f"{result['total']:>10} {result['build_us']:>7.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    logging.getLogger("llm_client").setLevel(logging.WARNING)
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4000,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 1000,
+    )
@@ -0,0 +1,110 @@
+"""
+Benchmark: GroqClient resilience against a stub that replays rate-limit responses.
+
+The stub answers with a repeating script of 429 (with Retry-After), 503,
+slow responses that hit the per-attempt timeout, a 200 without choices, and
+successes carrying x-ratelimit-* headers. Reports success rate and latency percentiles with
+retries disabled vs. enabled. Run from the repository root:
+
+    python benchmarks/bench_groq_retries.py [calls] [concurrency]
+"""
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_client import GroqAPIError, GroqClient  # noqa: E402
+
+COMPLETION = {"choices": [{"message": {"role": "assistant", "content": "Так держать!"}}]}
+
+# One step per request, cycled: roughly half of first attempts fail
+SCRIPT = ["ok", "429", "ok", "503", "ok", "malformed", "slow", "ok", "429", "ok"]
+
+
+async def start_stub_server() -> tuple[web.AppRunner, str]:
+    steps = itertools.cycle(SCRIPT)
+
+    async def completions(request: web.Request) -> web.Response:
+        await request.read()
+        step = next(steps)
+        if step == "429":
+            return web.json_response(
+                {"error": {"message": "Rate limit reached"}}, status=429, headers={"Retry-After": "0.2"}
+            )
+        if step == "503":
+            return web.json_response({"error": {"message": "Service unavailable"}}, status=503)
+        if step == "malformed":
+            return web.json_response({"choices": []})
+        if step == "slow":
+            await asyncio.sleep(2)
+        return web.json_response(COMPLETION, headers={
+            "x-ratelimit-remaining-requests": "100",
+            "x-ratelimit-remaining-tokens": "5000",
+            "x-ratelimit-reset-tokens": "1.5s",
+        })
+
+    app = web.Application()
+    app.router.add_post("/openai/v1/chat/completions", completions)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/openai/v1/chat/completions"
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(name: str, client: GroqClient, calls: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, successes = [], 0
+
+    async def one() -> None:
+        nonlocal successes
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await client.generate_comment("role", "message")
+                successes += 1
+            except GroqAPIError:
+                pass
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    print(
+        f"{name:<10} success={successes / calls:6.1%} "
+        f"p50={percentile(latencies, 50) * 1000:7.1f}ms p99={percentile(latencies, 99) * 1000:7.1f}ms "
+        f"stats={client.stats}"
+    )
+
+
+async def main(calls: int, concurrency: int) -> None:
+    runner, url = await start_stub_server()
+    try:
+        for name, max_retries in (("no-retry", 0), ("retry", 3)):
+            client = GroqClient(
+                api_key="bench", base_url=url, request_timeout=0.5, max_retries=max_retries,
+                request_deadline=5.0, retry_base_delay=0.05, throttle_min_remaining_tokens=0
+            )
+            try:
+                await run(name, client, calls, concurrency)
+            finally:
+                await client.close()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    logging.getLogger("llm_client").setLevel(logging.ERROR)
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    asyncio.run(main(calls, concurrency))
@@ -0,0 +1,88 @@
+"""
+Benchmark: pooled GroqClient session vs. a fresh aiohttp session per call.
+
+Runs a local stub of the chat completions endpoint and reports p50/p99 latency
+per call. Run from the repository root:
+
+    python benchmarks/bench_groq_session.py [calls]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_client import GroqClient  # noqa: E402
+
+
+COMPLETION = {"choices": [{"message": {"role": "assistant", "content": "Отличная цель!"}}]}
+
+
+async def start_stub_server() -> tuple[web.AppRunner, str]:
+    """Start a local stub of the Groq chat completions endpoint"""
+    async def completions(request: web.Request) -> web.Response:
+        await request.read()
+        return web.json_response(COMPLETION)
+
+    app = web.Application()
+    app.router.add_post("/openai/v1/chat/completions", completions)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/openai/v1/chat/completions"
+
+
+async def fresh_session_call(url: str) -> None:
+    """Previous behaviour: a new session (and TCP connection) for every call"""
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json={"messages": []}) as response:
+            await response.json()
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name: str, samples: list[float]) -> None:
+    print(
+        f"{name:<10} calls={len(samples):<5} "
+        f"p50={percentile(samples, 50) * 1000:7.3f}ms "
+        f"p99={percentile(samples, 99) * 1000:7.3f}ms "
+        f"mean={statistics.mean(samples) * 1000:7.3f}ms"
+    )
+
+
+async def main(calls: int) -> None:
+    runner, url = await start_stub_server()
+    client = GroqClient(api_key="bench", base_url=url)
+    try:
+        fresh, pooled = [], []
+        for _ in range(calls):
+            start = time.perf_counter()
+            await fresh_session_call(url)
+            fresh.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await client.generate_comment("role", "message")
+            pooled.append(time.perf_counter() - start)
+
+        report("fresh", fresh)
+        report("pooled", pooled)
+        print("Note: the stub is plain HTTP on loopback; against api.groq.com the fresh "
+              "session additionally pays DNS and a TLS handshake per call.")
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,113 @@
+"""
+Benchmark: latency of one group comment from message to stored reply.
+
+Runs BotHandlers._comment_on_messages against a stubbed Telegram API and a
+stubbed LLM. deleteMessage takes `delete_ms`, sendMessage `send_ms` and the
+comment `llm_ms`. Each chat already has a previous comment to delete. Storage
+is real: JSON without write-behind, where every mutation rewrites the file, and
+SQLite. Reports time to reply (the new comment is visible) and end to end (the
+new comment is visible and the reply is stored), as mean and p95. Also reports
+storage commits per reply. Run from the repository root:
+
+    python benchmarks/bench_handler_pipeline.py [messages] [delete_ms] [llm_ms] [send_ms]
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multi_bot_config import BotConfig  # noqa: E402
+from multi_bot_handlers import BotHandlers  # noqa: E402
+
+CHATS = 20
+
+
+class StubBot:
+    def __init__(self, delete_ms: float):
+        self.delete_seconds = delete_ms / 1000
+
+    async def delete_message(self, chat_id: int, message_id: int) -> bool:
+        await asyncio.sleep(self.delete_seconds)
+        return True
+
+
+class StubLLM:
+    def __init__(self, llm_ms: float):
+        self.seconds = llm_ms / 1000
+
+    async def generate_comment(self, role, message, chat_history=None) -> str:
+        await asyncio.sleep(self.seconds)
+        return "Отличный шаг к цели, так держать!"
+
+
+def make_message(bot: StubBot, chat_id: int, message_id: int, send_ms: float, replied: list[float]):
+    async def reply(text: str):
+        await asyncio.sleep(send_ms / 1000)
+        replied.append(time.perf_counter())
+        return SimpleNamespace(message_id=message_id + 1)
+
+    return SimpleNamespace(
+        bot=bot, chat=SimpleNamespace(id=chat_id), text="Сегодня пробежал пять километров.",
+        message_id=message_id, reply=reply, answer=reply
+    )
+
+
+async def run(backend: str, messages: int, delete_ms: float, llm_ms: float, send_ms: float) -> dict:
+    with tempfile.TemporaryDirectory() as data_dir:
+        bot_config = BotConfig(token=f"bench-{backend}", name="Bench", enable_history=True, use_reply=True)
+        handlers = BotHandlers(
+            bot_config, StubLLM(llm_ms), data_dir,
+            storage_options={"backend": backend, "write_behind": False}
+        )
+        bot = StubBot(delete_ms)
+        for chat_id in range(CHATS):
+            handlers.role_storage.set_last_message_id(chat_id, 1)
+
+        to_reply: list[float] = []
+        end_to_end: list[float] = []
+        mutations = handlers.role_storage.stats.mutations
+        for i in range(messages):
+            replied: list[float] = []
+            message = make_message(bot, i % CHATS, 2 * i + 10, send_ms, replied)
+            start = time.perf_counter()
+            await handlers._comment_on_messages([message])
+            end_to_end.append(time.perf_counter() - start)
+            to_reply.append(replied[0] - start)
+        mutations = handlers.role_storage.stats.mutations - mutations
+        await handlers.aclose()
+
+    to_reply.sort()
+    end_to_end.sort()
+    return {
+        "reply_mean": sum(to_reply) / messages * 1000,
+        "reply_p95": to_reply[int(messages * 0.95)] * 1000,
+        "e2e_mean": sum(end_to_end) / messages * 1000,
+        "e2e_p95": end_to_end[int(messages * 0.95)] * 1000,
+        "commits": mutations / messages,
+    }
+
+
+def main(messages: int, delete_ms: float, llm_ms: float, send_ms: float) -> None:
+    print(f"delete {delete_ms:.0f} ms, llm {llm_ms:.0f} ms, send {send_ms:.0f} ms")
+    print(f"{'storage':<8} {'reply mean':>11} {'reply p95':>10} {'e2e mean':>9} {'e2e p95':>8} {'commits':>8}")
+    for backend in ("json", "sqlite"):
+        result = asyncio.run(run(backend, messages, delete_ms, llm_ms, send_ms))
+        print(
+            f"{backend:<8} {result['reply_mean']:>9.1f}ms {result['reply_p95']:>8.1f}ms "
+            f"{result['e2e_mean']:>7.1f}ms {result['e2e_p95']:>6.1f}ms {result['commits']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 80.0,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 400.0,
+        float(sys.argv[4]) if len(sys.argv) > 4 else 60.0,
+    )
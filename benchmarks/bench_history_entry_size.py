@@ -0,0 +1,70 @@
+"""
+Benchmark: bytes per stored history message, dicts vs. HistoryEntry records.
+
+Uses tracemalloc to measure the heap retained by chat histories with
+realistic Cyrillic content. Run from the repository root:
+
+    python benchmarks/bench_history_entry_size.py [chats] [history_limit]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_history import HistoryEntry, MessageRole  # noqa: E402
+
+USER_TEXT = "Цель на сегодня: пробежать 5 км и прочитать 30 страниц книги №{}"
+ASSISTANT_TEXT = "Отличный план! Маленькие шаги каждый день складываются в большой результат №{}"
+
+
+def build_dicts(chats: int, limit: int) -> dict:
+    return {
+        chat_id: [
+            {"role": "user" if i % 2 == 0 else "assistant",
+             "content": (USER_TEXT if i % 2 == 0 else ASSISTANT_TEXT).format(i)}
+            for i in range(limit)
+        ]
+        for chat_id in range(chats)
+    }
+
+
+def build_entries(chats: int, limit: int) -> dict:
+    return {
+        chat_id: [
+            HistoryEntry(MessageRole(i % 2), (USER_TEXT if i % 2 == 0 else ASSISTANT_TEXT).format(i))
+            for i in range(limit)
+        ]
+        for chat_id in range(chats)
+    }
+
+
+def measure(build, chats: int, limit: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    histories = build(chats, limit)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del histories
+    return current / (chats * limit)
+
+
+def main(chats: int, limit: int) -> None:
+    text_bytes = measure(
+        lambda c, n: [(USER_TEXT if i % 2 == 0 else ASSISTANT_TEXT).format(i) for _ in range(c) for i in range(n)],
+        chats, limit
+    )
+    for name, build in (("dict", build_dicts), ("HistoryEntry", build_entries)):
+        per_message = measure(build, chats, limit)
+        print(
+            f"{name:<13} bytes/message={per_message:7.1f} "
+            f"overhead/message={per_message - text_bytes:7.1f} (text alone: {text_bytes:.1f})"
+        )
+
+
+if __name__ == "__main__":
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    main(chats, limit)
@@ -0,0 +1,80 @@
+"""
+Benchmark: memory held by chat histories with many distinct chats.
+
+Spreads traffic over 50k chats across several BotHandlers and reports the
+Python heap (tracemalloc) retained by storage, comparing the JSON backend
+(all histories in memory) with the SQLite backend and its bounded LRU cache.
+Run from the repository root:
+
+    python benchmarks/bench_history_memory.py [chats] [bots]
+"""
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_client import GroqClient  # noqa: E402
+from multi_bot_config import BotConfig  # noqa: E402
+from multi_bot_handlers import BotHandlers  # noqa: E402
+
+HISTORY_LIMIT = 20
+
+
+async def bench(backend: str, chats: int, bots: int) -> None:
+    with tempfile.TemporaryDirectory() as data_dir:
+        groq_client = GroqClient(api_key="bench")
+        storage_options = {
+            "backend": backend,
+            # Keep the JSON flusher out of the measurement; only memory matters here
+            "write_behind": True,
+            "flush_interval_ms": 3_600_000,
+            "flush_max_mutations": 10 ** 9,
+            "cache_max_chats": 1000,
+        }
+
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        handlers = [
+            BotHandlers(BotConfig(token=f"token-{i}", name=f"Bot{i}"), groq_client, data_dir,
+                        HISTORY_LIMIT, storage_options)
+            for i in range(bots)
+        ]
+        for chat_id in range(chats):
+            storage = handlers[chat_id % bots].role_storage
+            storage.get_chat_history(chat_id)
+            for turn in range(4):
+                storage.add_message_to_history(chat_id, "user", f"Моя цель на сегодня №{turn}: 10 000 шагов")
+                storage.add_message_to_history(chat_id, "assistant", "Отличная цель! Держи темп и не сдавайся.")
+            storage.set_last_message_id(chat_id, chat_id)
+        elapsed = time.perf_counter() - start
+
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        cache_stats = [h.role_storage.history_cache.as_dict() for h in handlers
+                       if hasattr(h.role_storage, "history_cache")]
+        evictions = sum(s["evictions"] for s in cache_stats)
+        print(
+            f"{backend:<7} chats={chats:<6} bots={bots:<3} retained={current / 1024 / 1024:8.1f}MiB "
+            f"peak={peak / 1024 / 1024:8.1f}MiB evictions={evictions:<7} elapsed={elapsed:6.1f}s"
+        )
+        for h in handlers:
+            await h.role_storage.aclose()
+
+
+async def main(chats: int, bots: int) -> None:
+    for backend in ("json", "sqlite"):
+        await bench(backend, chats, bots)
+
+
+if __name__ == "__main__":
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    bots = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    asyncio.run(main(chats, bots))
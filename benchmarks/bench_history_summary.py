@@ -0,0 +1,112 @@
+"""
+Benchmark: prompt tokens and retained context with and without rolling summaries.
+
+Simulates one busy chat: a post, then a bot comment, repeated. Compares a plain
+FIFO history (chat_history_limit=20 and 40) with rolling summarization at
+limit 20 (threshold 16, keep 8). The summarizer runs as in production except
+that a fake client stands in for Groq and returns a summary of the usual size
+(max_summary_tokens). A batch runs every `batch_every` requests, as the
+interval timer would. Reports input tokens per comment request (mean, p95), how
+many earlier messages the prompt still covers (verbatim or folded into the
+summary), and the number and input tokens of summary requests. Nothing is sent
+to Groq. Run from the repository root:
+
+    python benchmarks/bench_history_summary.py [requests] [batch_every]
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_history import estimate_tokens  # noqa: E402
+from context_builder import ContextBuilder, truncate_to_tokens  # noqa: E402
+from database import RoleStorage  # noqa: E402
+from llm_client import GroqClient  # noqa: E402
+from summarizer import HistorySummarizer, history_with_summary  # noqa: E402
+
+ROLE = "Ты опытный психолог, который дает мотивирующие комментарии к целям людей"
+SENTENCES = [
+    "Сегодня пробежал пять километров и сделал зарядку.",
+    "Прочитал двадцать страниц книги про привычки.",
+    "Закончил проект на работе, завтра презентация.",
+    "Не получилось лечь спать до 23:00, попробую завтра.",
+    "Выучил десять новых слов на испанском.",
+]
+CHAT_ID = 1
+
+
+class FakeSummaryClient:
+    """Returns a summary of max_tokens, counting the input tokens a real request would use"""
+
+    def __init__(self):
+        self.requests = 0
+        self.input_tokens = 0
+
+    async def complete(self, messages, model=None, max_tokens=500, temperature=0.7) -> str:
+        self.requests += 1
+        self.input_tokens += sum(estimate_tokens(message["content"]) for message in messages)
+        return truncate_to_tokens(" ".join(SENTENCES * 20), max_tokens)
+
+
+async def run(requests: int, batch_every: int, history_limit: int, summarize: bool, data_dir: str) -> dict:
+    rng = random.Random(1)
+    storage = RoleStorage(f"bench-{history_limit}-{summarize}", data_dir, history_limit)
+    client = GroqClient(api_key="bench", context_builder=ContextBuilder(8000, 1000))
+    fake = FakeSummaryClient()
+    summarizer = HistorySummarizer(fake, threshold=16, keep_recent=8) if summarize else None
+
+    tokens: list[int] = []
+    covered: list[int] = []
+    folded = 0
+    for i in range(requests):
+        post = " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(1, 4)))
+        history = history_with_summary(storage, CHAT_ID)
+        tokens.append(client.estimate_input_tokens(ROLE, post, history))
+        covered.append(len(storage.get_chat_history(CHAT_ID)) + folded)
+
+        storage.add_exchange(CHAT_ID, post, " ".join(rng.choice(SENTENCES) for _ in range(3)))
+        if summarizer is not None:
+            summarizer.note(storage, CHAT_ID)
+            if i % batch_every == batch_every - 1 and summarizer._pending:
+                await summarizer._run_batch()
+                folded = summarizer.stats["folded_messages"]
+    if summarizer is not None:
+        await summarizer.aclose()
+    await storage.aclose()
+
+    tokens.sort()
+    return {
+        "mean": sum(tokens) / len(tokens),
+        "p95": tokens[int(len(tokens) * 0.95)],
+        "covered": covered[-1],
+        "summary_requests": fake.requests,
+        "summary_tokens": fake.input_tokens,
+    }
+
+
+def main(requests: int, batch_every: int) -> None:
+    print(f"{'mode':<22} {'mean':>7} {'p95':>7} {'covered':>8} {'sum.req':>8} {'sum.tokens':>11}")
+    with tempfile.TemporaryDirectory() as data_dir:
+        for name, history_limit, summarize in (
+            ("fifo limit 20", 20, False),
+            ("fifo limit 40", 40, False),
+            ("summary limit 20", 20, True),
+        ):
+            result = asyncio.run(run(requests, batch_every, history_limit, summarize, data_dir))
+            print(
+                f"{name:<22} {result['mean']:>7.0f} {result['p95']:>7} {result['covered']:>8} "
+                f"{result['summary_requests']:>8} {result['summary_tokens']:>11}"
+            )
+
+
+if __name__ == "__main__":
+    logging.getLogger("llm_client").setLevel(logging.WARNING)
+    logging.getLogger("summarizer").setLevel(logging.WARNING)
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 3,
+    )
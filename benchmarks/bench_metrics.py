@@ -0,0 +1,51 @@
+"""
+Benchmark: cost of the built-in metrics on the hot path and of a scrape.
+
+Measures a counter increment and a histogram observation on pre-bound label
+children (what the handlers do) against looking the child up with .labels()
+on every call. Then it renders /metrics for N bots. Metrics are created in a
+private registry; nothing is served. Run from the repository root:
+
+    python benchmarks/bench_metrics.py [bots]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Counter, Histogram, Registry  # noqa: E402
+
+
+def per_call_ns(statement, number: int = 1_000_000) -> float:
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e9
+
+
+def main(bot_count: int) -> None:
+    registry = Registry()
+    counter = Counter("bench_total", "Benchmark counter", ["bot", "result"], registry=registry)
+    histogram = Histogram("bench_seconds", "Benchmark histogram", ["bot", "stage"], registry=registry)
+
+    bound_counter = counter.labels("Bot1", "ok")
+    bound_histogram = histogram.labels("Bot1", "llm")
+
+    rows = [
+        ("counter.inc (bound child)", per_call_ns(bound_counter.inc)),
+        ("counter.labels(...).inc", per_call_ns(lambda: counter.labels("Bot1", "ok").inc())),
+        ("histogram.observe (bound child)", per_call_ns(lambda: bound_histogram.observe(0.42))),
+        ("histogram.labels(...).observe", per_call_ns(lambda: histogram.labels("Bot1", "llm").observe(0.42))),
+    ]
+    for name, ns in rows:
+        print(f"  {name:<34} {ns:8.1f} ns/call")
+
+    for i in range(bot_count):
+        for result in ("ok", "shed", "llm_error", "error"):
+            counter.labels(f"Bot{i}", result).inc()
+        for stage in ("prepare", "llm", "send", "persist", "total"):
+            histogram.labels(f"Bot{i}", stage).observe(0.1)
+    render_ms = min(timeit.repeat(registry.render, number=10, repeat=3)) / 10 * 1000
+    print(f"  render for {bot_count} bots: {render_ms:.2f} ms, {len(registry.render()) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
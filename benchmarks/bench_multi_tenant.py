@@ -0,0 +1,98 @@
+"""
+Benchmark: memory and startup time of per-bot dispatchers vs. one shared dispatcher.
+
+Each scenario runs in a fresh interpreter. It builds N bots with the same
+objects as main_multi.py and opens each Telegram HTTP session, as the first
+getUpdates would. Bots get their own Bot/Dispatcher/router/session (per-bot)
+or share one Dispatcher, router and session (shared). Storage uses the JSON
+backend in a temporary directory; nothing is sent to Telegram. Reports
+startup time and RSS growth. Run from the repository root:
+
+    python benchmarks/bench_multi_tenant.py [bot counts...]
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_kib() -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def build(mode: str, bot_count: int, data_dir: str) -> dict:
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.enums import ParseMode
+
+    from llm_client import GroqClient
+    from llm_scheduler import LLMScheduler
+    from multi_bot_config import BotConfig
+    from multi_bot_handlers import BotHandlers, create_router
+
+    scheduler = LLMScheduler(GroqClient(api_key="bench"))
+    configs = [BotConfig(token=f"{100000 + i}:bench-token-{i}", name=f"Bot{i + 1}") for i in range(bot_count)]
+    default = DefaultBotProperties(parse_mode=ParseMode.HTML)
+    baseline = rss_kib()
+    start = time.perf_counter()
+
+    sessions = []
+    if mode == "per-bot":
+        for bot_config in configs:
+            bot = Bot(token=bot_config.token, default=default)
+            dp = Dispatcher()
+            bot_handlers = BotHandlers(bot_config, scheduler.for_bot(bot_config.name), data_dir)
+            dp.include_router(create_router(lambda _, bot_handlers=bot_handlers: bot_handlers))
+            sessions.append(bot.session)
+    else:
+        session = AiohttpSession()
+        handlers_by_bot_id = {}
+        for bot_config in configs:
+            bot = Bot(token=bot_config.token, session=session, default=default)
+            handlers_by_bot_id[bot.id] = BotHandlers(bot_config, scheduler.for_bot(bot_config.name), data_dir)
+        dp = Dispatcher()
+        dp.include_router(create_router(lambda bot: handlers_by_bot_id.get(bot.id)))
+        sessions.append(session)
+
+    # Open the HTTP sessions, as the first request of each bot would
+    for session in sessions:
+        await session.create_session()
+    elapsed = time.perf_counter() - start
+    result = {"startup_ms": elapsed * 1000, "rss_kib": rss_kib() - baseline, "sessions": len(sessions)}
+
+    for session in sessions:
+        await session.close()
+    return result
+
+
+def main(bot_counts: list[int]) -> None:
+    print(f"{'bots':>5} {'mode':<8} {'startup':>10} {'RSS':>10} {'per bot':>9} {'sessions':>9}")
+    for bot_count in bot_counts:
+        for mode in ("per-bot", "shared"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode, str(bot_count)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{bot_count:>5} {mode:<8} {result['startup_ms']:>8.1f}ms {result['rss_kib'] / 1024:>8.1f}MiB "
+                f"{result['rss_kib'] / bot_count:>7.0f}KiB {result['sessions']:>9}"
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        with tempfile.TemporaryDirectory() as data_dir:
+            print(json.dumps(asyncio.run(build(sys.argv[2], int(sys.argv[3]), data_dir))))
+    else:
+        main([int(n) for n in sys.argv[1:]] or [1, 10, 100])
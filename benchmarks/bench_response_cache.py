@@ -0,0 +1,91 @@
+"""
+Benchmark: ResponseCache hit rate on reposted and templated channel posts.
+
+Generates a stream of posts where some are verbatim reposts, some are daily
+check-in templates with a different date or number, and the rest are unique.
+Reports hit rate, saved tokens, false matches (a comment reused for a post of
+a different template) and lookup latency for exact vs. similarity mode. Run
+from the repository root:
+
+    python benchmarks/bench_response_cache.py [posts]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import ResponseCache  # noqa: E402
+
+ROLE = "Ты опытный психолог, который дает мотивирующие комментарии к целям людей"
+
+TEMPLATES = [
+    "Отчёт за {day}.{month}: пробежал {n} км, сделал зарядку, прочитал 20 страниц книги",
+    "Цели на {day}.{month}: выучить {n} новых слов, закончить проект, лечь спать до 23:00",
+    "День {n} марафона здоровья ({day}.{month}): без сахара, 2 литра воды, 10000 шагов",
+    "Итоги недели {day}.{month}: закрыл {n} задач, провёл встречу с командой, отдохнул",
+]
+PREFIX = "Комментарий к: "
+WORDS = "сегодня завтра цель план работа спорт книга семья отдых проект учёба код встреча".split()
+
+
+def make_posts(count: int, seed: int = 1) -> list[tuple[int, str]]:
+    """(template id, text); template id -1 marks unique posts"""
+    rng = random.Random(seed)
+    posts: list[tuple[int, str]] = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.2 and posts:
+            posts.append(rng.choice(posts))
+        elif kind < 0.7:
+            template = rng.randrange(len(TEMPLATES))
+            text = TEMPLATES[template].format(day=rng.randint(1, 28), month=rng.randint(1, 12), n=rng.randint(1, 30))
+            posts.append((template, text))
+        else:
+            posts.append((-1, " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 15)))))
+    return posts
+
+
+def run(name: str, cache: ResponseCache, posts: list[tuple[int, str]]) -> None:
+    templates = {text: template for template, text in posts}
+    false_matches = 0
+    lookup_time = 0.0
+    for template, text in posts:
+        start = time.perf_counter()
+        comment = cache.get(ROLE, text)
+        lookup_time += time.perf_counter() - start
+        if comment is None:
+            cache.put(ROLE, text, None, f"{PREFIX}{text}")
+            continue
+        source = comment.removeprefix(PREFIX)
+        if templates[source] != template or template == -1 and source != text:
+            false_matches += 1
+
+    stats = cache.as_dict()
+    print(
+        f"{name:<16} hit_rate={stats['hit_rate']:6.1%} near_hits={stats['near_hits']:5d} "
+        f"false_matches={false_matches:4d} saved_tokens={stats['saved_tokens']:7d} "
+        f"lookup={lookup_time / len(posts) * 1e6:6.1f}us"
+    )
+
+
+def main(count: int) -> None:
+    posts = make_posts(count)
+    run("exact", ResponseCache("model", max_entries=count), posts)
+    for threshold in (0.9, 0.8, 0.7):
+        run(f"similarity={threshold}", ResponseCache("model", max_entries=count, similarity_threshold=threshold), posts)
+
+    # Disk tier: a restarted process still answers from the SQLite file
+    with tempfile.TemporaryDirectory() as data_dir:
+        cache = ResponseCache("model", max_entries=count, data_dir=data_dir)
+        for _, text in posts:
+            if cache.get(ROLE, text) is None:
+                cache.put(ROLE, text, None, f"{PREFIX}{text}")
+        cache.close()
+        run("exact+restart", ResponseCache("model", max_entries=count, data_dir=data_dir), posts)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,132 @@
+"""
+Benchmark: time until many bots are ready to poll, and how long startup blocks the event loop.
+
+Each bot has a JSON storage file with `chats` chats of 20 history messages. The
+Telegram API is a stub: setMyCommands and deleteWebhook take `api_ms`. Compares
+the previous startup with the current one, cold and warm:
+- serial: BotHandlers built one after another on the event loop, then commands
+  set and webhooks deleted one bot at a time
+- concurrent, cold: storage of all bots loaded in worker threads (BotHandlers.create),
+  commands set and webhooks deleted with all requests in flight
+- concurrent, warm: the same, but the commands are unchanged since the last
+  start, so setMyCommands is skipped
+
+Reports the time until all bots could start polling, the longest event loop
+stall (a 5 ms ticker runs meanwhile) and the number of setMyCommands requests.
+Run from the repository root:
+
+    python benchmarks/bench_startup.py [bots] [chats] [api_ms]
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_history import HistoryEntry, MessageRole  # noqa: E402
+from database import RoleStorage  # noqa: E402
+from main_multi import setup_bot_commands  # noqa: E402
+from multi_bot_config import BotConfig  # noqa: E402
+from multi_bot_handlers import BotHandlers  # noqa: E402
+
+POST = "Сегодня пробежал пять километров и сделал зарядку, завтра попробую шесть."
+
+
+class StubBot:
+    def __init__(self, token: str, api_ms: float):
+        self.token = token
+        self.seconds = api_ms / 1000
+        self.commands_set = 0
+
+    async def set_my_commands(self, commands, scope=None) -> bool:
+        await asyncio.sleep(self.seconds)
+        self.commands_set += 1
+        return True
+
+    async def delete_webhook(self) -> bool:
+        await asyncio.sleep(self.seconds)
+        return True
+
+
+def write_storage(data_dir: str, token: str, chats: int) -> None:
+    storage = RoleStorage(token, data_dir)
+    for chat_id in range(chats):
+        storage.chat_histories[chat_id] = storage._history(chat_id)
+        storage.chat_histories[chat_id].extend(
+            HistoryEntry(MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT, POST) for i in range(20)
+        )
+        storage.last_message_ids[chat_id] = chat_id + 1
+    storage._pending_mutations = 1
+    storage.flush()
+
+
+async def watch_loop(stop: asyncio.Event) -> float:
+    """Longest gap between 5 ms ticks, minus the tick itself"""
+    longest = 0.0
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.005)
+        now = time.perf_counter()
+        longest = max(longest, now - last - 0.005)
+        last = now
+    return longest
+
+
+async def start(configs: list[BotConfig], bots: list[StubBot], data_dir: str, concurrent: bool) -> dict:
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stop))
+    await asyncio.sleep(0.01)
+
+    begin = time.perf_counter()
+    storage_options = {"backend": "json"}
+    if concurrent:
+        handlers = await asyncio.gather(*(
+            BotHandlers.create(config, None, data_dir, storage_options=storage_options) for config in configs
+        ))
+        await asyncio.gather(
+            *(setup_bot_commands(bot, config.name, data_dir) for bot, config in zip(bots, configs)),
+            *(bot.delete_webhook() for bot in bots)
+        )
+    else:
+        handlers = [BotHandlers(config, None, data_dir, storage_options=storage_options) for config in configs]
+        for bot, config in zip(bots, configs):
+            await setup_bot_commands(bot, config.name)
+        for bot in bots:
+            await bot.delete_webhook()
+    ready = time.perf_counter() - begin
+
+    stop.set()
+    stall = await watcher
+    for bot_handlers in handlers:
+        await bot_handlers.aclose()
+    return {"ready": ready, "stall": stall}
+
+
+def main(bot_count: int, chats: int, api_ms: float) -> None:
+    with tempfile.TemporaryDirectory() as data_dir:
+        configs = [BotConfig(token=f"{i}:bench", name=f"bot{i}", enable_history=True) for i in range(bot_count)]
+        for config in configs:
+            write_storage(data_dir, config.token, chats)
+        size = os.path.getsize(RoleStorage(configs[0].token, data_dir).filename)
+        print(f"{bot_count} bots, {chats} chats each ({size / 1024:.0f} KiB per file), Telegram API {api_ms:.0f} ms")
+        print(f"{'mode':<20} {'ready':>9} {'max stall':>10} {'setMyCommands':>14}")
+
+        for name, concurrent in (("serial", False), ("concurrent, cold", True), ("concurrent, warm", True)):
+            bots = [StubBot(config.token, api_ms) for config in configs]
+            result = asyncio.run(start(configs, bots, data_dir, concurrent))
+            print(
+                f"{name:<20} {result['ready'] * 1000:>7.0f}ms {result['stall'] * 1000:>8.1f}ms "
+                f"{sum(bot.commands_set for bot in bots):>14}"
+            )
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 80.0,
+    )
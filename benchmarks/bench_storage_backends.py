@@ -0,0 +1,90 @@
+"""
+Benchmark: JSON vs. SQLite vs. append-only log storage backends.
+
+Pre-populates a store with many chats of full history, then measures cold
+start (constructing the storage) and per-message write cost (user message,
+assistant reply, last message ID). Run from the repository root:
+
+    python benchmarks/bench_storage_backends.py [chats] [messages]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_history import HistoryEntry, MessageRole  # noqa: E402
+from database import create_role_storage  # noqa: E402
+
+TOKEN = "bench-token"
+HISTORY_LIMIT = 20
+
+
+def populate(storage, chats: int) -> None:
+    """Fill every chat with a full history (bulk, bypassing per-message persistence)"""
+    if hasattr(storage, "chat_histories"):
+        for chat_id in range(chats):
+            storage.chat_histories[chat_id] = deque(
+                (HistoryEntry(MessageRole(i % 2), f"Сообщение {i} в чате {chat_id}") for i in range(HISTORY_LIMIT)),
+                maxlen=HISTORY_LIMIT
+            )
+        storage._pending_mutations += 1
+        storage.flush()
+    elif hasattr(storage, "_conn"):
+        with storage._conn:
+            storage._conn.executemany(
+                "INSERT INTO chat_history (chat_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [
+                    (chat_id, i + 1, "user" if i % 2 == 0 else "assistant", f"Сообщение {i} в чате {chat_id}")
+                    for chat_id in range(chats)
+                    for i in range(HISTORY_LIMIT)
+                ]
+            )
+    else:
+        for chat_id in range(chats):
+            for i in range(HISTORY_LIMIT):
+                role = "user" if i % 2 == 0 else "assistant"
+                storage.add_message_to_history(chat_id, role, f"Сообщение {i} в чате {chat_id}")
+
+
+async def bench(backend: str, chats: int, messages: int) -> None:
+    with tempfile.TemporaryDirectory() as data_dir:
+        options = {"write_behind": False} if backend == "json" else {}
+        storage = create_role_storage(TOKEN, data_dir, HISTORY_LIMIT, backend=backend, **options)
+        populate(storage, chats)
+        await storage.aclose()
+
+        start = time.perf_counter()
+        storage = create_role_storage(TOKEN, data_dir, HISTORY_LIMIT, backend=backend, **options)
+        cold_start = time.perf_counter() - start
+
+        samples = []
+        for i in range(messages):
+            chat_id = (i * 7919) % chats
+            start = time.perf_counter()
+            storage.add_message_to_history(chat_id, "user", f"Новая цель {i}")
+            storage.add_message_to_history(chat_id, "assistant", "Отличная цель!")
+            storage.set_last_message_id(chat_id, i)
+            samples.append(time.perf_counter() - start)
+        await storage.aclose()
+
+        print(
+            f"{backend:<7} chats={chats:<6} cold_start={cold_start * 1000:9.1f}ms "
+            f"per_message_p50={statistics.median(samples) * 1000:8.3f}ms "
+            f"per_message_max={max(samples) * 1000:8.3f}ms"
+        )
+
+
+async def main(chats: int, messages: int) -> None:
+    for backend in ("json", "sqlite", "log"):
+        await bench(backend, chats, messages)
+
+
+if __name__ == "__main__":
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(main(chats, messages))
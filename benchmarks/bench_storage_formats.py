@@ -0,0 +1,99 @@
+"""
+Benchmark: encode/decode time and file size of the storage formats.
+
+Builds the data of one bot's JSON storage: `chats` chats with 20 history
+messages each (Russian posts and comments of 8-60 words) and a running
+summary for a third of them. Compares the previous format (JSON with indent=2)
+with every STORAGE_FORMAT; msgpack and zstd rows need those packages and are
+skipped when they are missing. Encode is the serializer's dumps, decode is
+serializers.decode with format detection, both averaged over `rounds` runs.
+Run from the repository root:
+
+    python benchmarks/bench_storage_formats.py [chats] [rounds]
+"""
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_history import HistoryEntry, MessageRole  # noqa: E402
+from serializers import STORAGE_FORMATS, StorageFormatError, decode, get_serializer  # noqa: E402
+
+# Posts and comments are built from random words, so zstd can't just match whole repeated sentences
+WORDS = (
+    "сегодня вчера завтра утром вечером пробежал прочитал выучил закончил начал сделал попробую хочу "
+    "получилось удалось смог пять десять двадцать километров страниц слов минут часов книги проекта "
+    "зарядку тренировку презентацию испанском английском работе команды цели привычки отличный шаг "
+    "так держать главное регулярность результат каждый день неделю месяц маленькие шаги большие "
+    "изменения горжусь тобой продолжай в том же духе спать до 23:00 🇪🇸 💪 🔥"
+).split()
+
+
+def text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def build_data(chats: int) -> dict:
+    rng = random.Random(1)
+    return {
+        "role": "Ты опытный психолог, который дает мотивирующие комментарии к целям людей",
+        "last_message_ids": {-1001000000000 - chat_id: rng.randrange(1, 10**6) for chat_id in range(chats)},
+        "chat_histories": {
+            -1001000000000 - chat_id: [
+                HistoryEntry(
+                    MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT, text(rng, rng.randint(8, 60))
+                ).to_json()
+                for i in range(20)
+            ]
+            for chat_id in range(chats)
+        },
+        "chat_summaries": {-1001000000000 - chat_id: text(rng, 120) for chat_id in range(0, chats, 3)},
+    }
+
+
+def measure(encode, data: dict, rounds: int) -> dict:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        raw = encode(data)
+    encode_ms = (time.perf_counter() - start) / rounds * 1000
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decode(raw)
+    decode_ms = (time.perf_counter() - start) / rounds * 1000
+    return {"encode": encode_ms, "decode": decode_ms, "size": len(raw)}
+
+
+def main(chats: int, rounds: int) -> None:
+    data = build_data(chats)
+    print(f"{chats} chats x 20 messages, {len(data['chat_summaries'])} summaries")
+    print(f"{'format':<22} {'encode':>9} {'decode':>9} {'size':>10} {'vs indent':>10}")
+
+    def legacy(data: dict) -> bytes:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+    baseline = measure(legacy, data, rounds)
+    rows = [("json indent=2 (old)", baseline)]
+    for file_format in STORAGE_FORMATS:
+        try:
+            serializer = get_serializer(file_format)
+        except StorageFormatError as e:
+            print(f"{file_format:<22} skipped: {e}")
+            continue
+        rows.append((file_format, measure(serializer.dumps, data, rounds)))
+
+    for name, result in rows:
+        print(
+            f"{name:<22} {result['encode']:>7.1f}ms {result['decode']:>7.1f}ms "
+            f"{result['size'] / 1024:>7.0f}KiB {result['size'] / baseline['size']:>9.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+    )
@@ -0,0 +1,123 @@
+"""
+Benchmark: event loop lag caused by JSON storage writes, inline vs. in the writer thread.
+
+`bots` JSON storages share one event loop, each with `chats` chats of 20 history
+messages. Comments are recorded at `rate` per second (spread over all bots) for
+`seconds` seconds, while a LoopLagMonitor samples the loop every 10 ms. Modes:
+write-through and write-behind (STORAGE_WRITE_BEHIND), each with the file
+encoded and written on the event loop or in the writer thread
+(STORAGE_WRITE_THREAD). Reports loop lag (mean, p99, max), file writes and
+whether every file, reloaded after close, matches the data in memory. Run from
+the repository root:
+
+    python benchmarks/bench_storage_loop_lag.py [bots] [chats] [rate] [seconds]
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_history import HistoryEntry, MessageRole  # noqa: E402
+from database import RoleStorage  # noqa: E402
+from loop_monitor import LoopLagMonitor  # noqa: E402
+
+POST = "Сегодня пробежал пять километров и сделал зарядку, завтра попробую шесть."
+COMMENT = "Отличный шаг к цели, так держать!"
+
+
+class SampledLagMonitor(LoopLagMonitor):
+    """Keeps every sample for percentiles"""
+
+    def __init__(self, interval: float):
+        super().__init__(interval, histogram=None)
+        self.lags: list[float] = []
+
+    def record(self, lag: float) -> None:
+        super().record(lag)
+        self.lags.append(lag)
+
+
+def prefill(data_dir: str, bots: int, chats: int) -> None:
+    for bot in range(bots):
+        storage = RoleStorage(f"bench-{bot}", data_dir, write_thread=False)
+        for chat_id in range(chats):
+            history = storage._history(chat_id)
+            history.extend(
+                HistoryEntry(MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT, POST) for i in range(20)
+            )
+            storage.last_message_ids[chat_id] = 1
+        storage._pending_mutations = 1
+        storage.flush()
+
+
+async def run(data_dir: str, bots: int, rate: float, seconds: float, write_behind: bool, write_thread: bool) -> dict:
+    rng = random.Random(1)
+    storages = [
+        RoleStorage(f"bench-{bot}", data_dir, write_behind=write_behind, write_thread=write_thread)
+        for bot in range(bots)
+    ]
+    chats = len(storages[0].chat_histories)
+    monitor = SampledLagMonitor(0.01)
+    monitor.start()
+
+    start = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        storage = rng.choice(storages)
+        storage.record_comment(rng.randrange(chats), i + 2, (POST, COMMENT))
+        await asyncio.sleep(max(0.0, start + (i + 1) / rate - time.perf_counter()))
+
+    for storage in storages:
+        await storage.aclose()
+    await monitor.aclose()
+
+    consistent = True
+    for bot, storage in enumerate(storages):
+        reloaded = RoleStorage(f"bench-{bot}", data_dir)
+        consistent &= reloaded.last_message_ids == storage.last_message_ids
+        consistent &= all(
+            list(reloaded.chat_histories[chat_id]) == list(history)
+            for chat_id, history in storage.chat_histories.items()
+        )
+
+    lags = sorted(monitor.lags)
+    return {
+        "mean": monitor.total / monitor.samples * 1000,
+        "p99": lags[int(len(lags) * 0.99)] * 1000,
+        "max": monitor.max * 1000,
+        "flushes": sum(storage.stats.flushes for storage in storages),
+        "consistent": consistent,
+    }
+
+
+def main(bots: int, chats: int, rate: float, seconds: float) -> None:
+    with tempfile.TemporaryDirectory() as data_dir:
+        prefill(data_dir, bots, chats)
+        size = os.path.getsize(RoleStorage("bench-0", data_dir).filename)
+        print(f"{bots} bots, {chats} chats each ({size / 1024:.0f} KiB per file), {rate:.0f} comments/s for {seconds:.0f}s")
+        print(f"{'mode':<28} {'lag mean':>9} {'lag p99':>8} {'lag max':>8} {'writes':>7} {'consistent':>11}")
+        for name, write_behind, write_thread in (
+            ("write-through, on loop", False, False),
+            ("write-through, thread", False, True),
+            ("write-behind, on loop", True, False),
+            ("write-behind, thread", True, True),
+        ):
+            result = asyncio.run(run(data_dir, bots, rate, seconds, write_behind, write_thread))
+            print(
+                f"{name:<28} {result['mean']:>7.1f}ms {result['p99']:>6.1f}ms {result['max']:>6.1f}ms "
+                f"{result['flushes']:>7} {str(result['consistent']):>11}"
+            )
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 300,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 50.0,
+        float(sys.argv[4]) if len(sys.argv) > 4 else 4.0,
+    )
@@ -0,0 +1,54 @@
+"""
+Benchmark: RoleStorage write-through vs. write-behind persistence.
+
+Simulates group traffic (one user/assistant pair plus last_message_id per
+message) over many chats and reports writes, bytes written and flush latency.
+Run from the repository root:
+
+    python benchmarks/bench_storage_write_behind.py [chats] [messages]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import RoleStorage  # noqa: E402
+
+
+async def simulate(storage: RoleStorage, chats: int, messages: int) -> float:
+    rng = random.Random(42)
+    start = time.perf_counter()
+    for i in range(messages):
+        chat_id = -1000000000000 - rng.randrange(chats)
+        storage.add_message_to_history(chat_id, "user", f"Сегодня моя цель номер {i}: пробежать 5 км")
+        storage.add_message_to_history(chat_id, "assistant", "Отличная цель! Так держать, у тебя всё получится.")
+        storage.set_last_message_id(chat_id, i)
+        # Yield like a real handler awaiting Telegram/LLM calls
+        await asyncio.sleep(0)
+    await storage.aclose()
+    return time.perf_counter() - start
+
+
+async def main(chats: int, messages: int) -> None:
+    for write_behind in (False, True):
+        with tempfile.TemporaryDirectory() as data_dir:
+            storage = RoleStorage("bench-token", data_dir, history_limit=20, write_behind=write_behind)
+            elapsed = await simulate(storage, chats, messages)
+            stats = storage.stats.as_dict()
+            mode = "write-behind" if write_behind else "write-through"
+            print(
+                f"{mode:<14} elapsed={elapsed:7.2f}s flushes={stats['flushes']:<6} "
+                f"coalesced={stats['coalesced_mutations']:<6} "
+                f"bytes={stats['bytes_written'] / 1024 / 1024:8.2f}MiB "
+                f"flush_ms_total={stats['total_flush_ms']:9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    asyncio.run(main(chats, messages))
@@ -0,0 +1,120 @@
+"""
+Benchmark: time until a comment becomes visible, full response vs. streaming.
+
+A stub Groq server generates a comment at a fixed token rate, either as one
+JSON response or as server-sent events. Messages are "sent" and "edited" by
+in-memory fakes. Reports time to first visible text and edit counts for both
+modes. Run from the repository root:
+
+    python benchmarks/bench_streaming.py [calls] [tokens] [token_delay_ms]
+"""
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_client import GroqClient  # noqa: E402
+from streaming import StreamStats, send_streamed_comment  # noqa: E402
+
+WORD = "отлично "
+message_ids = itertools.count(1)
+
+
+async def start_stub_server(tokens: int, token_delay: float) -> tuple[web.AppRunner, str]:
+    async def completions(request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        if not payload.get("stream"):
+            await asyncio.sleep(tokens * token_delay)
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": WORD * tokens}}]})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for _ in range(tokens):
+            await asyncio.sleep(token_delay)
+            chunk = {"choices": [{"index": 0, "delta": {"content": WORD}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/openai/v1/chat/completions", completions)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/openai/v1/chat/completions"
+
+
+class FakeSentMessage:
+    """Stands in for aiogram's Message returned by reply/answer"""
+
+    def __init__(self, text: str):
+        self.message_id = next(message_ids)
+        self.text = text
+        self.edits = 0
+
+    async def edit_text(self, text: str) -> None:
+        self.text = text
+        self.edits += 1
+
+    async def delete(self) -> None:
+        pass
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def main(calls: int, tokens: int, token_delay: float) -> None:
+    runner, url = await start_stub_server(tokens, token_delay)
+    client = GroqClient(api_key="bench", base_url=url)
+    try:
+        for mode in ("full", "stream"):
+            first_visible, total, edits = [], [], 0
+            stats = StreamStats()
+
+            async def one() -> None:
+                nonlocal edits
+                start = time.perf_counter()
+                shown_at = None
+
+                async def send(text: str) -> FakeSentMessage:
+                    nonlocal shown_at
+                    shown_at = time.perf_counter()
+                    return FakeSentMessage(text)
+
+                if mode == "full":
+                    await send(await client.generate_comment("role", "message"))
+                else:
+                    _, sent = await send_streamed_comment(
+                        client.stream_comment("role", "message"), send, 0.3, stats
+                    )
+                    edits += sent.edits
+                first_visible.append(shown_at - start)
+                total.append(time.perf_counter() - start)
+
+            await asyncio.gather(*(one() for _ in range(calls)))
+            print(
+                f"{mode:<7} first visible p50={percentile(first_visible, 50) * 1000:7.1f}ms "
+                f"p99={percentile(first_visible, 99) * 1000:7.1f}ms  "
+                f"complete p50={percentile(total, 50) * 1000:7.1f}ms  "
+                f"edits/comment={edits / calls:.1f}"
+            )
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+    token_delay_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 15
+    asyncio.run(main(calls, tokens, token_delay_ms / 1000))
@@ -0,0 +1,132 @@
+"""
+Benchmark: webhook server throughput and acknowledgement latency.
+
+Registers N bots on one WebhookServer. Their handlers simulate a slow LLM
+comment. The benchmark then POSTs synthetic group-message updates to
+/webhook/<bot-id> with the correct secret tokens and reports updates/sec,
+ack latency percentiles and how many updates were processed after the
+server drained. A few requests with a wrong secret check that they are
+rejected. Run from the repository root:
+
+    python benchmarks/bench_webhook.py [bots] [updates] [concurrency] [handler_ms]
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import aiohttp
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Message
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook_server import SECRET_HEADER, WebhookServer  # noqa: E402
+
+
+def make_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": -1000000000000 - update_id % 50, "type": "supergroup", "title": "Цели"},
+            "from": {"id": 1000 + update_id % 200, "is_bot": False, "first_name": "Иван"},
+            "text": f"Отчёт за сегодня #{update_id}: пробежал 5 км",
+        },
+    }
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def load(base: str, targets: list[tuple[int, str]], updates: int, concurrency: int) -> tuple:
+    """POST updates round-robin to (bot id, secret) targets; returns latencies, statuses, seconds"""
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def post(update_id: int, secret: str | None = None) -> int:
+            bot_id, bot_secret = targets[update_id % len(targets)]
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.post(
+                    f"{base}/webhook/{bot_id}",
+                    json=make_update(update_id),
+                    headers={SECRET_HEADER: secret if secret is not None else bot_secret}
+                ) as response:
+                    await response.read()
+                    latencies.append(time.perf_counter() - start)
+                    return response.status
+
+        rejected = await asyncio.gather(*(post(i, secret="wrong") for i in range(10)))
+        latencies.clear()
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(post(i) for i in range(updates)))
+        elapsed = time.perf_counter() - start
+    return latencies, statuses, sorted(set(rejected)), elapsed
+
+
+def load_process(base: str, targets: list[tuple[int, str]], updates: int, concurrency: int, results) -> None:
+    # Separate process so the load generator does not compete with the server's event loop
+    results.put(asyncio.run(load(base, targets, updates, concurrency)))
+
+
+async def main(bot_count: int, updates: int, concurrency: int, handler_delay: float) -> None:
+    processed = 0
+
+    server = WebhookServer("https://example.invalid", host="127.0.0.1", port=0, secret="bench")
+    bots = []
+    for i in range(bot_count):
+        router = Router()
+
+        @router.message(F.text)
+        async def handle(message: Message) -> None:
+            nonlocal processed
+            await asyncio.sleep(handler_delay)
+            processed += 1
+
+        dp = Dispatcher()
+        dp.include_router(router)
+        bot = Bot(token=f"{100000 + i}:bench-token-{i}")
+        server.register(bot, dp)
+        bots.append(bot)
+    await server.start()
+
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=load_process, args=(
+        f"http://127.0.0.1:{server.port}",
+        [(bot.id, server.secret_token_for(bot)) for bot in bots],
+        updates,
+        concurrency,
+        results
+    ))
+    process.start()
+    latencies, statuses, rejected, elapsed = await asyncio.get_running_loop().run_in_executor(None, results.get)
+    process.join()
+
+    await server.stop()
+    for bot in bots:
+        await bot.session.close()
+
+    print(
+        f"bots={bot_count} updates={updates} concurrency={concurrency} handler={handler_delay * 1000:.0f}ms\n"
+        f"  {updates / elapsed:8.0f} updates/s  ack p50={percentile(latencies, 50) * 1000:.2f}ms "
+        f"p99={percentile(latencies, 99) * 1000:.2f}ms\n"
+        f"  acked={statuses.count(200)} processed={processed} bad-secret responses={rejected}\n"
+        f"  server={server.as_dict()}"
+    )
+
+
+if __name__ == "__main__":
+    bot_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    updates = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    handler_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 500
+    logging.getLogger("webhook_server").setLevel(logging.ERROR)
+    asyncio.run(main(bot_count, updates, concurrency, handler_ms / 1000))
@@ -0,0 +1,169 @@
+"""
+Soak test: concurrent group comments in the same chats, checked for orphaned comments.
+
+Messages arrive in a few busy chats, each handled by handle_group_message in its
+own task as aiogram dispatches it. The Telegram API is a stub Bot that keeps the
+comments still visible in every chat; deleting a message that is gone raises,
+as Telegram does. The LLM stub takes `llm_ms` with jitter and counts the tokens
+of the calls it completes. Storage is real (JSON with write-behind).
+
+After the run every chat must show at most one bot comment, and it must be the
+one stored as last_message_id; any other visible comment is an orphan. Modes:
+without chat locks (the old behaviour, for comparison), with chat locks, with
+locks and supersede, and with the update queue and supersede. Reports comments
+posted, orphans, superseded generations, completed LLM calls and their tokens.
+Exits with status 1 if a locked mode leaves an orphan. Run from the repository root:
+
+    python benchmarks/soak_chat_ordering.py [messages] [chats] [llm_ms] [gap_ms]
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_history import estimate_tokens  # noqa: E402
+from multi_bot_config import BotConfig  # noqa: E402
+from multi_bot_handlers import BotHandlers  # noqa: E402
+
+POSTS = [
+    "Сегодня пробежал пять километров и сделал зарядку.",
+    "Прочитал двадцать страниц книги про привычки.",
+    "Закончил проект на работе, завтра презентация.",
+    "Выучил десять новых слов на испанском.",
+]
+COMMENT = "Отличный шаг к цели, так держать!"
+
+
+class StubBot:
+    """Telegram API stub: tracks the bot comments visible in each chat"""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.visible: dict[int, set[int]] = {}
+        self.next_id = 1_000_000
+        self.sent = 0
+
+    async def _latency(self) -> None:
+        await asyncio.sleep(self.rng.uniform(0.02, 0.08))
+
+    async def delete_message(self, chat_id: int, message_id: int) -> bool:
+        await self._latency()
+        if message_id not in self.visible.get(chat_id, ()):
+            raise RuntimeError("Bad Request: message to delete not found")
+        self.visible[chat_id].discard(message_id)
+        return True
+
+    async def send_message(self, chat_id: int, text: str) -> SimpleNamespace:
+        await self._latency()
+        self.next_id += 1
+        self.sent += 1
+        self.visible.setdefault(chat_id, set()).add(self.next_id)
+        return SimpleNamespace(message_id=self.next_id)
+
+
+class StubLLM:
+    def __init__(self, llm_ms: float, rng: random.Random):
+        self.seconds = llm_ms / 1000
+        self.rng = rng
+        self.completed = 0
+        self.tokens = 0
+
+    async def generate_comment(self, role, message, chat_history=None) -> str:
+        await asyncio.sleep(self.seconds * self.rng.uniform(0.5, 1.5))
+        self.completed += 1
+        history_tokens = sum(estimate_tokens(entry.content) for entry in chat_history or ())
+        self.tokens += estimate_tokens(role) + estimate_tokens(message) + history_tokens + estimate_tokens(COMMENT)
+        return COMMENT
+
+
+def make_message(bot: StubBot, chat_id: int, message_id: int, text: str) -> SimpleNamespace:
+    async def reply(text: str):
+        return await bot.send_message(chat_id, text)
+
+    return SimpleNamespace(
+        bot=bot, chat=SimpleNamespace(id=chat_id), text=text, message_id=message_id,
+        from_user=SimpleNamespace(is_bot=False, username="user", id=1), sender_chat=None,
+        reply=reply, answer=reply
+    )
+
+
+async def soak(locks: bool, supersede: bool, workers: int, messages: int, chats: int,
+               llm_ms: float, gap_ms: float) -> dict:
+    rng = random.Random(7)
+    bot = StubBot(rng)
+    llm = StubLLM(llm_ms, rng)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        handlers = BotHandlers(
+            BotConfig(token="soak", name="Soak", enable_history=True, use_reply=True, supersede=supersede),
+            llm, data_dir,
+            storage_options={"backend": "json", "write_behind": True},
+            update_queue_options={"workers": workers, "max_pending": 100, "max_pending_per_chat": 3}
+        )
+        superseded = handlers.metrics.comments_superseded.value  # The counter is process-wide
+        if not locks:
+            # The old behaviour: comments of one chat run concurrently
+            handlers._comment_on_messages = handlers._write_comment
+
+        tasks = []
+        for message_id in range(messages):
+            chat_id = rng.randrange(chats)
+            message = make_message(bot, chat_id, message_id, rng.choice(POSTS))
+            tasks.append(asyncio.create_task(handlers.handle_group_message(message)))
+            await asyncio.sleep(rng.expovariate(1000 / gap_ms))
+        await asyncio.gather(*tasks)
+        while handlers.update_queue and (handlers.update_queue.depth or handlers.update_queue.busy_workers):
+            await asyncio.sleep(0.05)
+
+        orphans = 0
+        for chat_id, visible in bot.visible.items():
+            last_message_id = handlers.role_storage.get_last_message_id(chat_id)
+            orphans += len(visible - {last_message_id})
+        superseded = int(handlers.metrics.comments_superseded.value - superseded)
+        shed = handlers.update_queue.shed if handlers.update_queue else 0
+        await handlers.aclose()
+
+    return {
+        "posted": bot.sent,
+        "orphans": orphans,
+        "superseded": superseded,
+        "shed": shed,
+        "llm_calls": llm.completed,
+        "tokens": llm.tokens,
+    }
+
+
+def main(messages: int, chats: int, llm_ms: float, gap_ms: float) -> None:
+    print(f"{messages} messages over {chats} chats, one every {gap_ms:.0f} ms on average, llm {llm_ms:.0f} ms")
+    print(f"{'mode':<22} {'posted':>7} {'orphans':>8} {'supersed.':>10} {'shed':>5} {'llm calls':>10} {'tokens':>8}")
+    failed = False
+    for name, locks, supersede, workers in (
+        ("no locks", False, False, 0),
+        ("chat locks", True, False, 0),
+        ("locks + supersede", True, True, 0),
+        ("queue + supersede", True, True, 4),
+    ):
+        result = asyncio.run(soak(locks, supersede, workers, messages, chats, llm_ms, gap_ms))
+        print(
+            f"{name:<22} {result['posted']:>7} {result['orphans']:>8} {result['superseded']:>10} "
+            f"{result['shed']:>5} {result['llm_calls']:>10} {result['tokens']:>8}"
+        )
+        failed = failed or (locks and result["orphans"] > 0)
+    if failed:
+        print("FAILED: orphaned comments with chat locks")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 300,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 400.0,
+        float(sys.argv[4]) if len(sys.argv) > 4 else 60.0,
+    )
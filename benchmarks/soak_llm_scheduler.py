@@ -0,0 +1,99 @@
+"""
+Soak test: LLMScheduler slots under timeouts that race with grants.
+
+`bots` bots send `requests` LLM calls through one LLMScheduler with a single slot
+(max_concurrency=1) and a max_wait of `max_wait_ms`. The stub client holds the slot
+for about max_wait_ms and then stalls the event loop briefly, so waiting requests
+time out in the same loop iteration in which the slot is released and granted to
+them; some are shed, some are served. After all
+calls finish, no slot may still be counted as in flight, and a final request
+must still be granted. Reports granted and shed requests per bot. Exits with
+status 1 if a slot leaked. Run from the repository root:
+
+    python benchmarks/soak_llm_scheduler.py [bots] [requests] [max_wait_ms]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_scheduler import LLMRequestShed, LLMScheduler  # noqa: E402
+
+
+class StubClient:
+    """
+    Holds the slot for about `seconds`, then the loop stalls for `stall` seconds
+
+    The stall runs in the same loop iteration in which the sleep ends, as when other
+    bots' callbacks keep the loop busy. Timeouts that fall due meanwhile run in the
+    next iteration together with the release, so the grant and the timeout race.
+    """
+
+    def __init__(self, seconds: float, stall: float):
+        self.seconds = seconds
+        self.stall = stall
+        self.rng = random.Random(1)
+
+    def estimate_input_tokens(self, role, message, chat_history) -> int:
+        return 10
+
+    async def generate_comment(self, role, message, chat_history=None) -> str:
+        seconds = self.seconds * self.rng.uniform(0.5, 1.5)
+        asyncio.get_running_loop().call_later(seconds, time.sleep, self.stall)
+        await asyncio.sleep(seconds)
+        return "ok"
+
+
+async def run(bots: int, requests: int, max_wait: float) -> dict:
+    scheduler = LLMScheduler(
+        StubClient(max_wait, max_wait / 10),
+        max_concurrency=1,
+        requests_per_minute=10**9,
+        tokens_per_minute=10**12,
+        max_wait=max_wait,
+    )
+    clients = [scheduler.for_bot(f"bot{i}") for i in range(bots)]
+
+    async def call(client) -> None:
+        try:
+            await client.generate_comment("role", "message")
+        except LLMRequestShed:
+            pass
+
+    rng = random.Random(2)
+    tasks = []
+    for i in range(requests):
+        tasks.append(asyncio.create_task(call(clients[i % bots])))
+        await asyncio.sleep(rng.uniform(0, max_wait / 2))
+    await asyncio.gather(*tasks)
+
+    leaked = scheduler._active
+    try:
+        await asyncio.wait_for(clients[0].generate_comment("role", "message"), timeout=max_wait * 10)
+        final_granted = True
+    except (LLMRequestShed, TimeoutError):
+        final_granted = False
+    return {"leaked": leaked, "final_granted": final_granted, "stats": scheduler.stats()}
+
+
+def main(bots: int, requests: int, max_wait_ms: float) -> None:
+    result = asyncio.run(run(bots, requests, max_wait_ms / 1000))
+    print(f"{bots} bots, {requests} requests, 1 slot, max_wait {max_wait_ms:.0f}ms")
+    print(f"{'bot':<8} {'granted':>8} {'shed':>6}")
+    for bot_name, stats in result["stats"].items():
+        print(f"{bot_name:<8} {stats['granted']:>8} {stats['shed']:>6}")
+    print(f"slots in flight after the run: {result['leaked']}, final request granted: {result['final_granted']}")
+    if result["leaked"] or not result["final_granted"]:
+        print("FAILED: scheduler slot leaked")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 400,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 20.0,
+    )
@@ -0,0 +1,133 @@
+"""
+Soak test: flood synthetic group updates into BotHandlers, with and without the update queue.
+
+Each update goes through handle_group_message in its own task, as aiogram
+dispatches it. The LLM and Telegram API are stubs with fixed latencies; the LLM
+stub serves at most `llm_slots` requests at a time, like the scheduler's
+concurrency limit in front of Groq. Storage is real (JSON with write-behind).
+Updates arrive at `rate` per second spread over `chats` chats for `seconds`
+seconds. Reports peak pending work (tasks plus queued messages), peak traced
+Python memory, comments written and messages shed, the p95 time from update to
+comment, and whether every chat's comments stayed in message order.
+Run from the repository root:
+
+    python benchmarks/soak_update_queue.py [seconds] [rate] [chats] [llm_ms] [llm_slots]
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multi_bot_config import BotConfig  # noqa: E402
+from multi_bot_handlers import BotHandlers  # noqa: E402
+
+POST = "Сегодня пробежал пять километров и сделал зарядку. " * 20
+
+
+class StubBot:
+    async def delete_message(self, chat_id: int, message_id: int) -> bool:
+        await asyncio.sleep(0.03)
+        return True
+
+
+class StubLLM:
+    def __init__(self, llm_ms: float, slots: int):
+        self.seconds = llm_ms / 1000
+        self.slots = asyncio.Semaphore(slots)
+
+    async def generate_comment(self, role, message, chat_history=None) -> str:
+        async with self.slots:
+            await asyncio.sleep(self.seconds)
+        return "Отличный шаг к цели, так держать!"
+
+
+async def soak(workers: int, seconds: float, rate: float, chats: int, llm_ms: float, llm_slots: int) -> dict:
+    rng = random.Random(1)
+    bot = StubBot()
+    replies: dict[int, list[int]] = {}
+    latencies: list[float] = []
+
+    def make_update(chat_id: int, message_id: int):
+        received = time.perf_counter()
+
+        async def reply(text: str):
+            await asyncio.sleep(0.03)
+            latencies.append(time.perf_counter() - received)
+            replies.setdefault(chat_id, []).append(message_id)
+            return SimpleNamespace(message_id=message_id + 1_000_000)
+
+        return SimpleNamespace(
+            bot=bot, chat=SimpleNamespace(id=chat_id), text=POST, message_id=message_id,
+            from_user=SimpleNamespace(is_bot=False, username="user", id=1), sender_chat=None,
+            reply=reply, answer=reply
+        )
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        handlers = BotHandlers(
+            BotConfig(token=f"soak-{workers}", name="Soak", enable_history=True, use_reply=True),
+            StubLLM(llm_ms, llm_slots), data_dir,
+            storage_options={"backend": "json", "write_behind": True},
+            update_queue_options={"workers": workers, "max_pending": 100, "max_pending_per_chat": 3}
+        )
+
+        tracemalloc.start()
+        tasks: set[asyncio.Task] = set()
+        peak_tasks = 0
+        start = time.perf_counter()
+        for message_id in range(int(seconds * rate)):
+            # Hot chats: a few chats get most of the traffic
+            chat_id = min(int(rng.expovariate(4 / chats)), chats - 1)
+            task = asyncio.create_task(handlers.handle_group_message(make_update(chat_id, message_id)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            pending = len(tasks) + (handlers.update_queue.depth if handlers.update_queue else 0)
+            peak_tasks = max(peak_tasks, pending)
+            await asyncio.sleep(max(0.0, start + (message_id + 1) / rate - time.perf_counter()))
+
+        # Let the backlog drain
+        while tasks or (handlers.update_queue and (handlers.update_queue.depth or handlers.update_queue.busy_workers)):
+            await asyncio.sleep(0.05)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        shed = handlers.update_queue.shed if handlers.update_queue else 0
+        await handlers.aclose()
+
+    latencies.sort()
+    return {
+        "peak_pending": peak_tasks,
+        "peak_mib": peak_memory / 1024 / 1024,
+        "comments": len(latencies),
+        "shed": shed,
+        "p95_s": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        "ordered": all(ids == sorted(ids) for ids in replies.values()),
+    }
+
+
+def main(seconds: float, rate: float, chats: int, llm_ms: float, llm_slots: int) -> None:
+    print(f"{seconds:.0f}s at {rate:.0f} updates/s over {chats} chats, llm {llm_ms:.0f} ms x {llm_slots} slots")
+    print(f"{'mode':<16} {'peak pending':>12} {'peak MiB':>9} {'comments':>9} {'shed':>6} {'p95':>8} {'ordered':>8}")
+    for name, workers in (("no queue", 0), ("4 workers", 4), ("8 workers", 8)):
+        result = asyncio.run(soak(workers, seconds, rate, chats, llm_ms, llm_slots))
+        print(
+            f"{name:<16} {result['peak_pending']:>12} {result['peak_mib']:>9.1f} {result['comments']:>9} "
+            f"{result['shed']:>6} {result['p95_s']:>7.2f}s {str(result['ordered']):>8}"
+        )
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    main(
+        float(sys.argv[1]) if len(sys.argv) > 1 else 8.0,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 40.0,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 50,
+        float(sys.argv[4]) if len(sys.argv) > 4 else 400.0,
+        int(sys.argv[5]) if len(sys.argv) > 5 else 4,
+    )
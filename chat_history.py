@@ -0,0 +1,83 @@
+"""Compact in-memory representation of chat history messages"""
+import math
+from enum import IntEnum
+from typing import Any, Dict
+
+# Llama 3 tokenizer approximation: ~4 ASCII characters or ~3 other (e.g. Cyrillic) characters per token
+ASCII_CHARS_PER_TOKEN = 4.0
+OTHER_CHARS_PER_TOKEN = 3.0
+
+# Chat template tokens added around every message (role header, end-of-turn marker)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of tokens in text, without running a tokenizer"""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return math.ceil(ascii_chars / ASCII_CHARS_PER_TOKEN + (len(text) - ascii_chars) / OTHER_CHARS_PER_TOKEN)
+
+
+class MessageRole(IntEnum):
+    """Role of a history message (stored as a small int in memory and on disk)"""
+
+    USER = 0
+    ASSISTANT = 1
+    SYSTEM = 2
+
+    @property
+    def label(self) -> str:
+        """OpenAI-style role name"""
+        return ROLE_LABELS[self]
+
+    @classmethod
+    def parse(cls, role: "str | int | MessageRole") -> "MessageRole":
+        """Convert a role name ("user", "assistant", "system") or code to MessageRole"""
+        if isinstance(role, str):
+            return ROLES_BY_LABEL[role]
+        return cls(role)
+
+
+ROLE_LABELS = ("user", "assistant", "system")
+ROLES_BY_LABEL = {label: MessageRole(code) for code, label in enumerate(ROLE_LABELS)}
+
+
+class HistoryEntry:
+    """One chat history message: a role code and the message text"""
+
+    __slots__ = ("role", "content", "_tokens")
+
+    def __init__(self, role: MessageRole, content: str):
+        self.role = role
+        self.content = content
+        self._tokens: int | None = None
+
+    @property
+    def tokens(self) -> int:
+        """Estimated prompt tokens of this message, computed once"""
+        if self._tokens is None:
+            self._tokens = estimate_tokens(self.content) + MESSAGE_OVERHEAD_TOKENS
+        return self._tokens
+
+    def __repr__(self) -> str:
+        return f"HistoryEntry({self.role.label!r}, {self.content!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, HistoryEntry):
+            return NotImplemented
+        return self.role == other.role and self.content == other.content
+
+    def as_message(self) -> Dict[str, str]:
+        """Convert to an OpenAI-style {"role", "content"} message dict"""
+        return {"role": ROLE_LABELS[self.role], "content": self.content}
+
+    def to_json(self) -> list:
+        """Compact JSON form: [role_code, content]"""
+        return [int(self.role), self.content]
+
+    @classmethod
+    def from_json(cls, data: Any) -> "HistoryEntry":
+        """Parse the compact [role_code, content] form or a legacy {"role", "content"} dict"""
+        if isinstance(data, dict):
+            return cls(MessageRole.parse(data["role"]), data["content"])
+        role, content = data
+        return cls(MessageRole.parse(role), content)
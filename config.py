@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
 
@@ -13,6 +15,63 @@ class Config(BaseSettings):
     chat_history_limit: int = 20  # Max number of messages to keep in chat history
     delete_previous_messages: bool = True  # Delete previous bot messages before sending new ones
     channel_id: int | None = None  # Only reply to messages from this channel ID (optional)
+    debounce_seconds: float = 0.0  # Coalesce messages arriving within this window into one comment (0 = off)
+    debounce_max_batch: int = 10  # Max messages coalesced into one comment
+    stream_responses: bool = False  # Send the comment early and edit it while it is generated
+    stream_edit_interval: float = 1.5  # Min seconds between edits of a streamed comment
+    supersede_comments: bool = False  # Cancel a comment still being generated when a newer message arrives
+
+    # Group message queue: bounded concurrency, per-chat ordering, oldest messages dropped when full
+    update_workers: int = 4  # Comments generated concurrently (0 = no queue, one task per message)
+    update_queue_max_pending: int = 100  # Max messages waiting for a worker
+    update_queue_max_per_chat: int = 3  # Max messages waiting per chat
+
+    # Response cache: reuse comments generated for identical or similar messages
+    response_cache: bool = False  # Enable the response cache for group comments
+    response_cache_max_entries: int = 1000  # Max cached comments kept in memory
+    response_cache_ttl: float = 86400.0  # Seconds a cached comment can be reused
+    response_cache_similarity: float = 0.0  # Reuse comments of near-duplicates at this similarity, 0-1 (0 = exact)
+    response_cache_match_history: bool = False  # Include chat history in the cache key
+    response_cache_persist: bool = False  # Also keep cached comments on disk under data_dir
+
+    # Prometheus metrics endpoint (GET /metrics)
+    metrics_port: int = 0  # Port of the metrics endpoint (0 = off)
+    metrics_host: str = "0.0.0.0"  # Interface the metrics endpoint listens on
+
+    # Groq HTTP connection pool
+    groq_pool_limit_per_host: int = 10  # Max open connections to the Groq API host
+    groq_keepalive_timeout: float = 30.0  # Seconds to keep an idle connection open for reuse
+    groq_dns_cache_ttl: int = 300  # Seconds to cache resolved DNS entries
+
+    # Groq retries (429/5xx/timeouts, honouring Retry-After)
+    groq_max_retries: int = 3  # Max retries per request
+    groq_request_deadline: float = 45.0  # Total seconds per request including retries
+
+    # Prompt token budget: newest history first, long messages truncated
+    groq_max_input_tokens: int = 4000  # Max estimated prompt tokens per request (0 = no limit)
+    groq_max_message_tokens: int = 1000  # Max estimated tokens of a single message in the prompt
+
+    # Rolling summary: old history is folded into a running summary by a small model, off the request path
+    history_summary: bool = False  # Enable rolling summarization of chat history
+    history_summary_model: str = "llama-3.1-8b-instant"  # Model that writes the summaries
+    history_summary_threshold: int = 16  # Summarize a chat once its history has this many messages
+    history_summary_keep: int = 8  # Newest messages kept verbatim when older ones are folded
+    history_summary_interval: float = 10.0  # Seconds between summarization batches
+    history_summary_batch_size: int = 20  # Max chats per batch (a full batch starts early)
+
+    # Storage persistence
+    storage_backend: Literal["json", "sqlite", "log"] = "json"  # JSON file, SQLite database or append-only log
+    storage_write_behind: bool = True  # Batch storage writes in a background flusher
+    storage_flush_interval_ms: int = 1000  # Max delay before a pending change is written
+    storage_flush_max_mutations: int = 50  # Flush early after this many pending changes
+    storage_write_thread: bool = True  # Encode and write the JSON file in a background thread
+    storage_format: Literal["json", "json+zstd", "msgpack", "msgpack+zstd"] = "json"  # JSON backend file encoding
+    storage_zstd_level: int = 3  # zstd compression level for the "+zstd" formats
+
+    # Hot chat history cache (sqlite backend): cold chats are loaded on demand
+    history_cache_max_chats: int = 1000  # Max chats kept in memory
+    history_cache_max_bytes: int = 16 * 1024 * 1024  # Approximate max memory for cached histories
+    history_cache_ttl: float = 600.0  # Seconds before an idle chat is evicted
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -30,5 +89,52 @@ class Config(BaseSettings):
         except ValueError:
             return []
 
+    @property
+    def storage_options(self) -> dict:
+        """Keyword arguments for RoleStorage persistence settings"""
+        return {
+            "backend": self.storage_backend,
+            "write_behind": self.storage_write_behind,
+            "flush_interval_ms": self.storage_flush_interval_ms,
+            "flush_max_mutations": self.storage_flush_max_mutations,
+            "write_thread": self.storage_write_thread,
+            "file_format": self.storage_format,
+            "zstd_level": self.storage_zstd_level,
+            "cache_max_chats": self.history_cache_max_chats,
+            "cache_max_bytes": self.history_cache_max_bytes,
+            "cache_ttl": self.history_cache_ttl,
+        }
+
+    @property
+    def update_queue_options(self) -> dict:
+        """Keyword arguments for ChatWorkQueue settings"""
+        return {
+            "workers": self.update_workers,
+            "max_pending": self.update_queue_max_pending,
+            "max_pending_per_chat": self.update_queue_max_per_chat,
+        }
+
+    @property
+    def response_cache_options(self) -> dict:
+        """Keyword arguments for ResponseCache settings"""
+        return {
+            "max_entries": self.response_cache_max_entries,
+            "ttl": self.response_cache_ttl,
+            "similarity_threshold": self.response_cache_similarity,
+            "match_history": self.response_cache_match_history,
+            "data_dir": self.data_dir if self.response_cache_persist else None,
+        }
+
+    @property
+    def history_summary_options(self) -> dict:
+        """Keyword arguments for HistorySummarizer settings"""
+        return {
+            "model": self.history_summary_model,
+            "threshold": self.history_summary_threshold,
+            "keep_recent": self.history_summary_keep,
+            "interval": self.history_summary_interval,
+            "batch_size": self.history_summary_batch_size,
+        }
+
 
 config = Config()
@@ -0,0 +1,100 @@
+"""Token-budgeted prompt context: newest history first, oversized messages truncated"""
+from typing import Sequence
+
+from chat_history import MESSAGE_OVERHEAD_TOKENS, HistoryEntry, MessageRole, estimate_tokens
+
+TRUNCATION_MARK = "…"
+
+# A history message is only truncated to fit the remaining budget if at least this much of it fits
+MIN_TRUNCATED_TOKENS = 32
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens (at a word boundary when possible) and mark the cut"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Shrink proportionally to the estimate; repeat in case the kept part is denser than the rest
+    cut = len(text)
+    while cut > 0 and estimate_tokens(text[:cut]) > max_tokens:
+        cut = int(cut * max_tokens / estimate_tokens(text[:cut])) - 1
+    head = text[:max(cut, 0)]
+    space = head.rfind(" ")
+    if space > len(head) * 0.8:
+        head = head[:space]
+    return head.rstrip() + TRUNCATION_MARK
+
+
+class PromptContext:
+    """What is actually sent: the history subset, the (possibly truncated) message and its token estimate"""
+
+    __slots__ = ("history", "message", "tokens", "dropped", "truncated")
+
+    def __init__(self, history: list[HistoryEntry], message: str, tokens: int, dropped: int, truncated: int):
+        self.history = history
+        self.message = message
+        self.tokens = tokens
+        self.dropped = dropped  # History messages left out to stay within the budget
+        self.truncated = truncated  # Messages (history or current) that were shortened
+
+
+class ContextBuilder:
+    """
+    Fits role, chat history and the new message into an input token budget
+
+    The role is always sent in full. The new message and every history message are
+    capped at max_message_tokens; history is then added newest first until the budget
+    is used up, so the turns closest to the new message are the ones kept. Leading system
+    entries (the running summary of older turns) are kept ahead of any other history.
+    Token counts of history messages are estimated once and cached on the HistoryEntry.
+    """
+
+    def __init__(self, max_input_tokens: int = 4000, max_message_tokens: int = 1000):
+        self.max_input_tokens = max_input_tokens
+        self.max_message_tokens = max_message_tokens
+
+    def build(self, role: str, message: str, chat_history: Sequence[HistoryEntry] | None = None) -> PromptContext:
+        truncated = 0
+        budget = self.max_input_tokens - estimate_tokens(role) - MESSAGE_OVERHEAD_TOKENS
+
+        # The new message always goes in, shortened to its cap and to what the role leaves over
+        message_cap = max(MIN_TRUNCATED_TOKENS, min(self.max_message_tokens, budget - MESSAGE_OVERHEAD_TOKENS))
+        if estimate_tokens(message) > message_cap:
+            message = truncate_to_tokens(message, message_cap)
+            truncated += 1
+        budget -= estimate_tokens(message) + MESSAGE_OVERHEAD_TOKENS
+
+        entries = list(chat_history or ())
+        pinned: list[HistoryEntry] = []
+        while entries and entries[0].role == MessageRole.SYSTEM:
+            entry = entries.pop(0)
+            if entry.tokens > min(self.max_message_tokens, budget):
+                cap = min(self.max_message_tokens, budget) - MESSAGE_OVERHEAD_TOKENS
+                if cap < MIN_TRUNCATED_TOKENS:
+                    continue
+                entry = HistoryEntry(entry.role, truncate_to_tokens(entry.content, cap))
+                truncated += 1
+            pinned.append(entry)
+            budget -= entry.tokens
+
+        history: list[HistoryEntry] = []
+        for index in range(len(entries) - 1, -1, -1):
+            entry = entries[index]
+            tokens = entry.tokens
+            if tokens > self.max_message_tokens or tokens > budget:
+                cap = min(self.max_message_tokens, budget) - MESSAGE_OVERHEAD_TOKENS
+                if cap < MIN_TRUNCATED_TOKENS:
+                    break
+                entry = HistoryEntry(entry.role, truncate_to_tokens(entry.content, cap))
+                tokens = entry.tokens
+                truncated += 1
+            history.append(entry)
+            budget -= tokens
+        history.reverse()
+
+        return PromptContext(
+            pinned + history,
+            message,
+            self.max_input_tokens - budget,
+            len(chat_history or ()) - len(pinned) - len(history),
+            truncated
+        )
@@ -1,8 +1,89 @@
 """Simple JSON-based storage for bot role"""
+import asyncio
 import json
+import logging
 import os
 import hashlib
-from typing import List, Dict
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from chat_history import HistoryEntry, MessageRole
+from serializers import decode, get_serializer
+
+logger = logging.getLogger(__name__)
+
+
+class StorageStats:
+    """Persistence counters for a storage instance"""
+
+    def __init__(self):
+        self.mutations = 0  # Mutations that requested a save
+        self.flushes = 0  # Actual file writes
+        self.coalesced_mutations = 0  # Mutations absorbed by a later write
+        self.bytes_written = 0
+        self.last_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.flush_histogram = None  # Optional metrics histogram child (seconds), see metrics.BotMetrics
+
+    def record_flush(self, elapsed_ms: float) -> None:
+        """Count one completed write/commit that took elapsed_ms"""
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.total_flush_ms += elapsed_ms
+        if self.flush_histogram is not None:
+            self.flush_histogram.observe(elapsed_ms / 1000)
+
+    def as_dict(self) -> dict:
+        """Return counters as a plain dict (for logs and metrics)"""
+        return {
+            "mutations": self.mutations,
+            "flushes": self.flushes,
+            "coalesced_mutations": self.coalesced_mutations,
+            "bytes_written": self.bytes_written,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "total_flush_ms": round(self.total_flush_ms, 3),
+        }
+
+
+def atomic_write(filename: str, data: bytes) -> None:
+    """Write data to filename via temp file + fsync + atomic rename"""
+    directory = os.path.dirname(filename) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    # Persist the rename itself
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+# One thread serializes and writes the files of all JSON storages, in submission order
+_writer: ThreadPoolExecutor | None = None
+
+
+def _storage_writer() -> ThreadPoolExecutor:
+    global _writer
+    if _writer is None:
+        _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-writer")
+    return _writer
 
 
 class RoleStorage:
@@ -10,7 +91,18 @@ class RoleStorage:
 
     DEFAULT_ROLE = "Ты дружелюбный помощник, который комментирует сообщения в групповом чате."
 
-    def __init__(self, bot_token: str, data_dir: str = "/data", history_limit: int = 20):
+    def __init__(
+        self,
+        bot_token: str,
+        data_dir: str = "/data",
+        history_limit: int = 20,
+        write_behind: bool = False,
+        flush_interval_ms: int = 1000,
+        flush_max_mutations: int = 50,
+        write_thread: bool = True,
+        file_format: str = "json",
+        zstd_level: int = 3,
+    ):
         # Create data directory if it doesn't exist
         os.makedirs(data_dir, exist_ok=True)
 
@@ -19,12 +111,31 @@ class RoleStorage:
         self.filename = os.path.join(data_dir, f"role_{token_hash}.json")
         self.role: str = self.DEFAULT_ROLE
         self.last_message_ids: dict[int, int] = {}  # chat_id -> message_id
-        self.chat_histories: dict[int, List[Dict[str, str]]] = {}  # chat_id -> list of messages
+        self.chat_histories: dict[int, deque[HistoryEntry]] = {}  # chat_id -> ring of last messages
+        self.chat_summaries: dict[int, str] = {}  # chat_id -> running summary of folded (older) messages
         self.history_limit = history_limit
+
+        # Write-behind: mutations only mark the store dirty, a background task writes the file
+        self.write_behind = write_behind
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_max_mutations = flush_max_mutations
+        self.stats = StorageStats()
+        self._pending_mutations = 0
+        self._flush_event: asyncio.Event | None = None
+        self._flusher: asyncio.Task | None = None
+
+        # Writer thread: on the event loop a write only copies the data, the shared writer thread
+        # encodes and writes it. Writes run in submission order, so a file never goes back in time
+        self.write_thread = write_thread
+        self._last_write: asyncio.Future | None = None
+
+        # File encoding (compact JSON, msgpack, optionally zstd); any of them is read back
+        self.serializer = get_serializer(file_format, zstd_level)
+
         self._load()
 
     def _load(self) -> None:
-        """Load role, last message IDs, and chat histories from JSON file (backward compatible)"""
+        """Load role, last message IDs, and chat histories from the storage file (any format, backward compatible)"""
         # Handle case where file is a directory (Docker volume issue)
         if os.path.isdir(self.filename):
             import shutil
@@ -32,8 +143,11 @@ class RoleStorage:
 
         if os.path.exists(self.filename) and os.path.isfile(self.filename):
             try:
-                with open(self.filename, "r", encoding="utf-8") as f:
-                    data = json.load(f)
+                with open(self.filename, "rb") as f:
+                    data, file_format = decode(f.read())
+                    if file_format != self.serializer.name:
+                        logger.info(f"{self.filename} is stored as {file_format}, rewriting as {self.serializer.name}")
+                        self._pending_mutations = 1
 
                     # Load role (backward compatible)
                     self.role = data.get("role", self.DEFAULT_ROLE)
@@ -44,20 +158,145 @@ class RoleStorage:
 
                     # Load chat_histories with integer keys (new field, backward compatible)
                     chat_hists = data.get("chat_histories", {})
-                    self.chat_histories = {int(k): v for k, v in chat_hists.items()} if chat_hists else {}
-            except (json.JSONDecodeError, ValueError):
+                    # Entries are [role_code, content] pairs; older files use {"role", "content"} dicts
+                    self.chat_histories = {
+                        int(k): deque(map(HistoryEntry.from_json, v), maxlen=self.history_limit)
+                        for k, v in chat_hists.items()
+                    } if chat_hists else {}
+
+                    # Load chat_summaries with integer keys (new field, backward compatible)
+                    self.chat_summaries = {int(k): v for k, v in data.get("chat_summaries", {}).items()}
+            except (json.JSONDecodeError, ValueError, KeyError):
                 self.role = self.DEFAULT_ROLE
                 self.last_message_ids = {}
                 self.chat_histories = {}
+                self.chat_summaries = {}
 
     def _save(self) -> None:
-        """Save role, last message IDs, and chat histories to JSON file"""
-        with open(self.filename, "w", encoding="utf-8") as f:
-            json.dump({
-                "role": self.role,
-                "last_message_ids": self.last_message_ids,
-                "chat_histories": self.chat_histories
-            }, f, ensure_ascii=False, indent=2)
+        """Persist a mutation: write immediately, or schedule a write-behind flush"""
+        self.stats.mutations += 1
+        self._pending_mutations += 1
+
+        if self.write_behind and self._start_flusher():
+            if self._pending_mutations >= self.flush_max_mutations:
+                self._flush_event.set()
+            return
+
+        if self.write_thread and _running_loop() is not None:
+            self._submit_write()
+            return
+
+        self.flush()
+
+    def _start_flusher(self) -> bool:
+        """Start the background flusher if needed; False when there is no running event loop"""
+        if self._flusher is not None and not self._flusher.done():
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._flush_event = asyncio.Event()
+        self._flusher = loop.create_task(self._flush_loop())
+        return True
+
+    async def _flush_loop(self) -> None:
+        """Write the file at most every flush_interval_ms, or early after flush_max_mutations"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval_ms / 1000)
+            except TimeoutError:
+                pass
+            self._flush_event.clear()
+            if self._pending_mutations:
+                if self.write_thread:
+                    await self.flush_async()
+                    continue
+                try:
+                    self.flush()
+                except OSError as e:
+                    logger.error(f"Failed to flush {self.filename}: {e}")
+
+    def _snapshot(self) -> tuple:
+        """Shallow copy of the persisted data (history entries are never modified, only replaced)"""
+        return (
+            self.role,
+            dict(self.last_message_ids),
+            {chat_id: list(history) for chat_id, history in self.chat_histories.items()},
+            dict(self.chat_summaries),
+        )
+
+    def _write_snapshot(self, snapshot: tuple) -> tuple[int, float]:
+        """Encode and write a snapshot; returns (bytes written, elapsed ms)"""
+        start = time.perf_counter()
+        role, last_message_ids, chat_histories, chat_summaries = snapshot
+        data = self.serializer.dumps({
+            "role": role,
+            "last_message_ids": last_message_ids,
+            "chat_histories": {
+                chat_id: [entry.to_json() for entry in history]
+                for chat_id, history in chat_histories.items()
+            },
+            "chat_summaries": chat_summaries
+        })
+        atomic_write(self.filename, data)
+        return len(data), (time.perf_counter() - start) * 1000
+
+    def _record_write(self, mutations: int, size: int, elapsed_ms: float) -> None:
+        self.stats.record_flush(elapsed_ms)
+        self.stats.coalesced_mutations += mutations - 1
+        self.stats.bytes_written += size
+
+    def _submit_write(self) -> None:
+        """Hand the pending changes to the writer thread (must be called on the event loop)"""
+        mutations = self._pending_mutations
+        self._pending_mutations = 0
+        write = asyncio.wrap_future(_storage_writer().submit(self._write_snapshot, self._snapshot()))
+
+        def done(future: asyncio.Future) -> None:
+            error = future.exception()
+            if error is not None:
+                # Written again with the next flush
+                self._pending_mutations += mutations
+                logger.error(f"Failed to flush {self.filename}: {error}")
+                return
+            self._record_write(mutations, *future.result())
+
+        write.add_done_callback(done)
+        self._last_write = write
+
+    async def flush_async(self) -> None:
+        """Write pending changes and wait until everything written so far is on disk (or has failed)"""
+        if not self.write_thread:
+            self.flush()
+            return
+        if self._pending_mutations:
+            self._submit_write()
+        if self._last_write is not None:
+            # asyncio.wait neither raises the write's error (logged in done) nor cancels the write
+            await asyncio.wait({self._last_write})
+
+    def flush(self) -> None:
+        """Write role, last message IDs, and chat histories to JSON file if anything changed"""
+        if not self._pending_mutations:
+            return
+        size, elapsed_ms = self._write_snapshot(self._snapshot())
+        self._record_write(self._pending_mutations, size, elapsed_ms)
+        self._pending_mutations = 0
+
+    async def aclose(self) -> None:
+        """Stop the background flusher and write any pending changes"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self.write_thread:
+            await self.flush_async()
+        # Whatever is still pending (a failed write) is written here, raising if it fails again
+        self.flush()
 
     def get_role(self) -> str:
         """Get current role"""
@@ -88,29 +327,140 @@ class RoleStorage:
             del self.last_message_ids[chat_id]
             self._save()
 
-    def get_chat_history(self, chat_id: int) -> List[Dict[str, str]]:
+    def record_comment(self, chat_id: int, message_id: int, exchange: tuple[str, str] | None = None) -> None:
+        """Store the ID of a new bot comment and add the (user message, comment) exchange, with a single save"""
+        if exchange is not None:
+            history = self._history(chat_id)
+            history.append(HistoryEntry(MessageRole.USER, exchange[0]))
+            history.append(HistoryEntry(MessageRole.ASSISTANT, exchange[1]))
+        self.last_message_ids[chat_id] = message_id
+        self._save()
+
+    def get_chat_history(self, chat_id: int) -> deque[HistoryEntry]:
         """Get chat history for a specific chat"""
-        return self.chat_histories.get(chat_id, [])
+        return self.chat_histories.get(chat_id, deque())
+
+    def _history(self, chat_id: int) -> deque[HistoryEntry]:
+        """Get or create the history ring for a chat (oldest messages drop off automatically)"""
+        history = self.chat_histories.get(chat_id)
+        if history is None:
+            history = self.chat_histories[chat_id] = deque(maxlen=self.history_limit)
+        return history
 
     def add_message_to_history(self, chat_id: int, role: str, content: str) -> None:
         """Add a message to chat history and maintain limit"""
-        if chat_id not in self.chat_histories:
-            self.chat_histories[chat_id] = []
+        self._history(chat_id).append(HistoryEntry(MessageRole.parse(role), content))
+        self._save()
 
-        # Add new message
-        self.chat_histories[chat_id].append({"role": role, "content": content})
+    def add_exchange(self, chat_id: int, user_message: str, assistant_message: str) -> None:
+        """Add a user message and the bot's reply to chat history with a single save"""
+        history = self._history(chat_id)
+        history.append(HistoryEntry(MessageRole.USER, user_message))
+        history.append(HistoryEntry(MessageRole.ASSISTANT, assistant_message))
+        self._save()
+
+    def set_history_limit(self, history_limit: int) -> None:
+        """Change the max number of messages kept per chat, trimming existing histories"""
+        if history_limit == self.history_limit:
+            return
+        trimmed = any(len(history) > history_limit for history in self.chat_histories.values())
+        self.history_limit = history_limit
+        self.chat_histories = {
+            chat_id: deque(history, maxlen=history_limit)
+            for chat_id, history in self.chat_histories.items()
+        }
+        if trimmed:
+            self._save()
 
-        # Trim history if it exceeds limit
-        if len(self.chat_histories[chat_id]) > self.history_limit:
-            self.chat_histories[chat_id] = self.chat_histories[chat_id][-self.history_limit:]
+    def get_summary(self, chat_id: int) -> str | None:
+        """Get the running summary of a chat's folded history"""
+        return self.chat_summaries.get(chat_id)
 
+    def fold_history(self, chat_id: int, count: int, summary: str) -> None:
+        """Replace the `count` oldest history messages of a chat with a new running summary"""
+        history = self._history(chat_id)
+        for _ in range(min(count, len(history))):
+            history.popleft()
+        self.chat_summaries[chat_id] = summary
         self._save()
 
     def clear_chat_history(self, chat_id: int) -> None:
-        """Clear chat history for a specific chat"""
-        if chat_id in self.chat_histories:
-            del self.chat_histories[chat_id]
+        """Clear chat history (and its summary) for a specific chat"""
+        if chat_id in self.chat_histories or chat_id in self.chat_summaries:
+            self.chat_histories.pop(chat_id, None)
+            self.chat_summaries.pop(chat_id, None)
             self._save()
 
 
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def create_role_storage(
+    bot_token: str,
+    data_dir: str = "/data",
+    history_limit: int = 20,
+    backend: str = "json",
+    write_behind: bool = False,
+    flush_interval_ms: int = 1000,
+    flush_max_mutations: int = 50,
+    write_thread: bool = True,
+    file_format: str = "json",
+    zstd_level: int = 3,
+    cache_max_chats: int = 1000,
+    cache_max_bytes: int = 16 * 1024 * 1024,
+    cache_ttl: float = 600.0,
+):
+    """
+    Create role storage for the configured backend
+
+    Args:
+        bot_token: Bot token (hashed into the storage filename)
+        data_dir: Directory for persistent data
+        history_limit: Max number of messages to keep per chat
+        backend: "json" (single file per bot), "sqlite" (one row per history message)
+            or "log" (append-only segmented log)
+        write_behind, flush_interval_ms, flush_max_mutations: Write-behind settings (JSON backend)
+        write_thread: Encode and write the file in the shared writer thread (JSON backend)
+        file_format, zstd_level: File encoding, see serializers.get_serializer (JSON backend)
+        cache_max_chats, cache_max_bytes, cache_ttl: Hot history cache limits (SQLite backend)
+
+    Returns:
+        RoleStorage, SQLiteRoleStorage or LogRoleStorage instance
+    """
+    if backend == "json":
+        return RoleStorage(
+            bot_token, data_dir, history_limit,
+            write_behind=write_behind,
+            flush_interval_ms=flush_interval_ms,
+            flush_max_mutations=flush_max_mutations,
+            write_thread=write_thread,
+            file_format=file_format,
+            zstd_level=zstd_level
+        )
+    if backend == "sqlite":
+        from history_cache import HistoryCache
+        from sqlite_storage import SQLiteRoleStorage
+        cache = HistoryCache(max_chats=cache_max_chats, max_bytes=cache_max_bytes, ttl=cache_ttl)
+        return SQLiteRoleStorage(bot_token, data_dir, history_limit, history_cache=cache)
+    if backend == "log":
+        from history_log import LogRoleStorage
+        return LogRoleStorage(bot_token, data_dir, history_limit)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+async def open_role_storage(bot_token: str, data_dir: str = "/data", history_limit: int = 20, **options):
+    """
+    create_role_storage in a worker thread of the default executor
+
+    Loading a JSON file, replaying a log or migrating to SQLite blocks for as long as the
+    data takes to read; bots starting together load their storage in parallel instead of
+    one after another on the event loop.
+    """
+    return await asyncio.to_thread(create_role_storage, bot_token, data_dir, history_limit, **options)
+
+
 # Global storage instance will be initialized in handlers.py after config is loaded
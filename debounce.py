@@ -0,0 +1,70 @@
+"""Per-chat message coalescing for busy group chats"""
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class ChatDebouncer:
+    """
+    Collects messages per chat and hands each burst to a callback once the chat goes quiet
+
+    A burst is flushed when no new message arrives for `window` seconds, or as soon as it
+    reaches `max_batch` messages.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        max_batch: int,
+        callback: Callable[[list[Any]], Awaitable[None]],
+    ):
+        self.window = window
+        self.max_batch = max_batch
+        self.callback = callback
+
+        self._batches: dict[int, list[Any]] = {}
+        self._timers: dict[int, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+        self.messages_received = 0
+        self.batches_flushed = 0
+
+    @property
+    def pending_chats(self) -> int:
+        """Chats with a burst waiting to be flushed"""
+        return len(self._batches)
+
+    def submit(self, chat_id: int, message: Any) -> None:
+        """Add a message to the chat's pending burst and restart its quiet timer"""
+        self.messages_received += 1
+        batch = self._batches.setdefault(chat_id, [])
+        batch.append(message)
+
+        timer = self._timers.pop(chat_id, None)
+        if timer is not None:
+            timer.cancel()
+
+        if len(batch) >= self.max_batch:
+            self._flush(chat_id)
+        else:
+            self._timers[chat_id] = asyncio.get_running_loop().call_later(self.window, self._flush, chat_id)
+
+    def _flush(self, chat_id: int) -> None:
+        self._timers.pop(chat_id, None)
+        batch = self._batches.pop(chat_id, None)
+        if not batch:
+            return
+
+        self.batches_flushed += 1
+        task = asyncio.get_running_loop().create_task(self.callback(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def aclose(self) -> None:
+        """Flush all pending bursts immediately and wait for their callbacks"""
+        for chat_id in list(self._batches):
+            timer = self._timers.pop(chat_id, None)
+            if timer is not None:
+                timer.cancel()
+            self._flush(chat_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
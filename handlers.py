@@ -1,24 +1,73 @@
 """Bot message handlers"""
-from aiogram import Router, F
+from aiogram import Bot, Router, F
 from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
 from aiogram.enums import ChatType
+import asyncio
 import logging
+import time
+from typing import Sequence
 
-from database import RoleStorage
-from llm_client import GroqClient
+from chat_history import HistoryEntry
+from database import create_role_storage
+from debounce import ChatDebouncer
+from llm_client import GroqAPIError, GroqClient
 from config import config
+from context_builder import ContextBuilder
+from metrics import BotMetrics
+from response_cache import CachedLLMClient, ResponseCache
+from streaming import StreamStats, send_streamed_comment
+from summarizer import HistorySummarizer, history_with_summary
+from update_queue import ChatLocks, ChatWorkQueue
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 # Initialize storage and LLM client
-role_storage = RoleStorage(
+role_storage = create_role_storage(
     bot_token=config.telegram_bot_token,
     data_dir=config.data_dir,
-    history_limit=config.chat_history_limit
+    history_limit=config.chat_history_limit,
+    **config.storage_options
 )
-llm_client = GroqClient(api_key=config.groq_api_key, proxy=config.proxy_url)
+
+# Prompt token budget: keep the newest history that fits, truncate oversized messages
+context_builder = None
+if config.groq_max_input_tokens > 0:
+    context_builder = ContextBuilder(config.groq_max_input_tokens, config.groq_max_message_tokens)
+
+llm_client = GroqClient(
+    api_key=config.groq_api_key,
+    proxy=config.proxy_url,
+    pool_limit_per_host=config.groq_pool_limit_per_host,
+    keepalive_timeout=config.groq_keepalive_timeout,
+    dns_cache_ttl=config.groq_dns_cache_ttl,
+    max_retries=config.groq_max_retries,
+    request_deadline=config.groq_request_deadline,
+    context_builder=context_builder
+)
+stream_stats = StreamStats()
+
+# Rolling summary of old chat history, written in the background by a small model
+history_summarizer: HistorySummarizer | None = None
+if config.history_summary:
+    history_summarizer = HistorySummarizer(llm_client, **config.history_summary_options)
+
+# Metrics (single bot: labelled "default"); children are bound once here
+bot_metrics = BotMetrics("default")
+role_storage.stats.flush_histogram = bot_metrics.storage_flush_seconds
+
+# Group comments go through the response cache when enabled
+response_cache: ResponseCache | None = None
+comment_client: GroqClient | CachedLLMClient = llm_client
+if config.response_cache:
+    response_cache = ResponseCache(llm_client.model, **config.response_cache_options)
+    comment_client = CachedLLMClient(llm_client, response_cache)
+
+# One comment at a time per chat, in arrival order; newer messages may supersede
+# a comment that is still being generated (chat_id -> generation task)
+chat_locks = ChatLocks()
+generations: dict[int, asyncio.Task] = {}
 
 
 def is_admin(user_id: int) -> bool:
@@ -38,7 +87,8 @@ async def cmd_start(message: Message):
         "Команды:\n"
         "/setrole &lt;текст роли&gt; - установить роль для этого чата\n"
         "/getrole - посмотреть текущую роль\n"
-        "/deleterole - удалить роль (вернуться к стандартной)\n\n"
+        "/deleterole - удалить роль (вернуться к стандартной)\n"
+        "/historylimit &lt;число&gt; - сколько сообщений помнить в каждом чате\n\n"
         "Добавь меня в группу, и я буду комментировать сообщения!"
     )
 
@@ -88,6 +138,35 @@ async def cmd_delete_role(message: Message):
     logger.info(f"Role deleted by user {message.from_user.id}")
 
 
+@router.message(Command("historylimit"))
+async def cmd_history_limit(message: Message, command: CommandObject):
+    """Show or change how many messages are kept per chat (admin only)"""
+    # Check admin access
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        logger.warning(f"Unauthorized historylimit attempt from user {message.from_user.id}")
+        return
+
+    if not command.args:
+        await message.answer(
+            f"Текущий лимит истории: {role_storage.history_limit}\n\n"
+            "Использование: /historylimit &lt;число&gt;"
+        )
+        return
+
+    try:
+        history_limit = int(command.args.strip())
+    except ValueError:
+        history_limit = 0
+    if history_limit < 1:
+        await message.answer("Лимит должен быть положительным числом.")
+        return
+
+    role_storage.set_history_limit(history_limit)
+    await message.answer(f"Лимит истории установлен: {history_limit}")
+    logger.info(f"History limit set to {history_limit} by user {message.from_user.id}")
+
+
 @router.message(
     F.chat.type.in_({ChatType.GROUP, ChatType.SUPERGROUP}),
     F.text
@@ -109,51 +188,176 @@ async def handle_group_message(message: Message):
             logger.debug(f"Ignoring message: not from configured channel {config.channel_id}")
             return
 
-    chat_id = message.chat.id
-    role = role_storage.get_role()
-    user_message = message.text
-
     # Log message source for debugging
     if message.sender_chat:
         logger.info(f"Processing message from channel/chat: {message.sender_chat.title} (id={message.sender_chat.id})")
     elif message.from_user:
         logger.info(f"Processing message from user: {message.from_user.username or message.from_user.id}")
 
-    try:
-        # Delete previous bot comment if it exists and deletion is enabled
-        if config.delete_previous_messages:
-            last_message_id = role_storage.get_last_message_id(chat_id)
-            if last_message_id:
-                try:
-                    await message.bot.delete_message(chat_id=chat_id, message_id=last_message_id)
-                    logger.info(f"Deleted previous comment (message_id={last_message_id}) in chat {chat_id}")
-                except Exception as e:
-                    logger.warning(f"Could not delete previous message {last_message_id} in chat {chat_id}: {e}")
-                    # Clear the stored message_id if deletion failed (message might have been deleted manually)
-                    role_storage.clear_last_message_id(chat_id)
+    bot_metrics.updates.inc()
 
-        # Get chat history for context
-        chat_history = role_storage.get_chat_history(chat_id)
+    # A comment still being generated for an older message is stale now
+    if config.supersede_comments:
+        supersede(message.chat.id)
 
-        # Generate comment using LLM with chat history
-        comment = await llm_client.generate_comment(role, user_message, chat_history)
+    # Coalesce bursts into a single comment when debouncing is enabled
+    if group_debouncer is not None:
+        group_debouncer.submit(message.chat.id, message)
+        return
 
-        # Send comment as reply to the user's message
-        sent_message = await message.reply(comment)
+    # Bounded concurrency: the update handler returns at once, a worker writes the comment
+    if update_queue is not None:
+        update_queue.submit(message.chat.id, [message])
+        return
+
+    await comment_on_messages([message])
 
-        # Add user message and bot response to chat history
-        role_storage.add_message_to_history(chat_id, "user", user_message)
-        role_storage.add_message_to_history(chat_id, "assistant", comment)
 
-        # Store the message ID of the new comment
-        role_storage.set_last_message_id(chat_id, sent_message.message_id)
+async def delete_previous_comment(bot: Bot, chat_id: int, message_id: int) -> bool:
+    """Delete the bot's previous comment in a chat; False if Telegram refused"""
+    try:
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+    except Exception as e:
+        bot_metrics.delete_failures.inc()
+        logger.warning(f"Could not delete previous message {message_id} in chat {chat_id}: {e}")
+        return False
+    logger.info(f"Deleted previous comment (message_id={message_id}) in chat {chat_id}")
+    return True
+
+
+def supersede(chat_id: int) -> None:
+    """Cancel the comment still being generated in a chat: a newer message makes it stale"""
+    generation = generations.pop(chat_id, None)
+    if generation is not None and not generation.done():
+        generation.cancel()
+        bot_metrics.comments_superseded.inc()
+        logger.info(f"Newer message superseded the pending comment in chat {chat_id}")
+
+
+async def generate(
+    chat_id: int,
+    role: str,
+    user_message: str,
+    chat_history: Sequence[HistoryEntry] | None
+) -> str | None:
+    """Generate a comment; None if a newer message superseded it (see supersede)"""
+    if not config.supersede_comments:
+        return await comment_client.generate_comment(role, user_message, chat_history)
+
+    # Own task, so supersede can cancel the LLM call without touching the caller
+    generation = asyncio.create_task(comment_client.generate_comment(role, user_message, chat_history))
+    generations[chat_id] = generation
+    try:
+        return await generation
+    except asyncio.CancelledError:
+        if not generation.cancelled() or asyncio.current_task().cancelling():
+            raise
+        return None
+    finally:
+        if generations.get(chat_id) is generation:
+            del generations[chat_id]
+
+
+async def comment_on_messages(messages: list[Message]) -> None:
+    """Generate and send one comment for one or more group messages from the same chat"""
+    # Comments of one chat are written one at a time, so each deletes its predecessor
+    async with chat_locks.hold(messages[-1].chat.id):
+        await write_comment(messages)
+
+
+async def write_comment(messages: list[Message]) -> None:
+    """Replace the chat's previous comment with a new one for the messages (caller holds the chat lock)"""
+    # Comment on the latest message; earlier ones in a burst are combined into one prompt
+    message = messages[-1]
+    chat_id = message.chat.id
+    role = role_storage.get_role()
+    user_message = "\n\n".join(m.text for m in messages)
+    start = time.perf_counter()
+
+    if len(messages) > 1:
+        logger.info(f"Coalesced {len(messages)} messages in chat {chat_id}")
+
+    # Delete the previous bot comment (if enabled) while the new one is generated
+    deletion: asyncio.Task | None = None
+    if config.delete_previous_messages:
+        last_message_id = role_storage.get_last_message_id(chat_id)
+        if last_message_id:
+            deletion = asyncio.create_task(delete_previous_comment(message.bot, chat_id, last_message_id))
+
+    async def reply(text: str) -> Message:
+        # The old comment goes away before the new one appears
+        if deletion is not None:
+            await deletion
+        return await message.reply(text)
+
+    recorded = False
+    try:
+        # Get chat history for context
+        chat_history = history_with_summary(role_storage, chat_id)
+        bot_metrics.history_messages.observe(len(chat_history))
+        llm_start = time.perf_counter()
+        bot_metrics.prepare_seconds.observe(llm_start - start)
+
+        if config.stream_responses:
+            # Show the comment as soon as its first words arrive, then edit it as it grows
+            # (generation and sending overlap, so the whole stream counts as the llm stage)
+            comment, sent_message = await send_streamed_comment(
+                comment_client.stream_comment(role, user_message, chat_history),
+                reply,
+                config.stream_edit_interval,
+                stream_stats
+            )
+            persist_start = time.perf_counter()
+            bot_metrics.llm_seconds.observe(persist_start - llm_start)
+        else:
+            # Generate comment using LLM with chat history
+            comment = await generate(chat_id, role, user_message, chat_history)
+            if comment is None:
+                return
+            send_start = time.perf_counter()
+            bot_metrics.llm_seconds.observe(send_start - llm_start)
+
+            # Send comment as reply to the user's message
+            sent_message = await reply(comment)
+            persist_start = time.perf_counter()
+            bot_metrics.send_seconds.observe(persist_start - send_start)
+
+        # Store the ID of the new comment and add the exchange to chat history in one write
+        role_storage.record_comment(chat_id, sent_message.message_id, (user_message, comment))
+        recorded = True
+        if history_summarizer is not None:
+            history_summarizer.note(role_storage, chat_id)
+        end = time.perf_counter()
+        bot_metrics.persist_seconds.observe(end - persist_start)
+        bot_metrics.total_seconds.observe(end - start)
+        bot_metrics.comments_ok.inc()
 
         logger.info(f"Commented in chat {chat_id} (message_id={sent_message.message_id})")
 
+    except GroqAPIError as e:
+        bot_metrics.comments_llm_error.inc()
+        logger.error(f"Error generating comment: {e}")
+        # Rate limits and outages are temporary: don't add an error message to the group
+        if not e.retryable:
+            await message.answer("Извини, произошла ошибка при генерации комментария.")
+
     except Exception as e:
+        bot_metrics.comments_error.inc()
         logger.error(f"Error generating comment: {e}", exc_info=True)
         await message.answer("Извини, произошла ошибка при генерации комментария.")
 
+    finally:
+        # No new comment replaced the ID of the deleted one (or of one that could not be
+        # deleted, which might have been deleted manually): forget it so it is not tried again
+        if deletion is not None and not recorded:
+            await deletion
+            role_storage.clear_last_message_id(chat_id)
+
+
+async def queue_burst(messages: list[Message]) -> None:
+    """Debouncer callback: hand a flushed burst to the worker queue"""
+    update_queue.submit(messages[-1].chat.id, messages)
+
 
 @router.message(
     F.chat.type == ChatType.PRIVATE,
@@ -185,7 +389,7 @@ async def handle_private_message(message: Message):
     try:
         # Get chat history for context
         chat_id = message.chat.id
-        chat_history = role_storage.get_chat_history(chat_id)
+        chat_history = history_with_summary(role_storage, chat_id)
 
         # Generate response using LLM with bot's role
         response = await llm_client.generate_comment(role, user_message, chat_history)
@@ -194,11 +398,34 @@ async def handle_private_message(message: Message):
         await message.answer(response)
 
         # Add to chat history
-        role_storage.add_message_to_history(chat_id, "user", user_message)
-        role_storage.add_message_to_history(chat_id, "assistant", response)
+        role_storage.add_exchange(chat_id, user_message, response)
+        if history_summarizer is not None:
+            history_summarizer.note(role_storage, chat_id)
 
         logger.info(f"Responded to admin in private chat (user_id={message.from_user.id})")
 
     except Exception as e:
         logger.error(f"Error generating response for admin: {e}", exc_info=True)
         await message.answer("Извини, произошла ошибка при генерации ответа.")
+
+
+# Bounded worker pool for group comments: per-chat ordering, oldest messages shed when full
+# (built after the comment functions it calls back, as BotHandlers.__init__ does per bot)
+update_queue: ChatWorkQueue | None = None
+if config.update_workers > 0:
+    update_queue = ChatWorkQueue(callback=comment_on_messages, name="default", **config.update_queue_options)
+    update_queue.shed_counter = bot_metrics.update_queue_shed
+    update_queue.wait_histogram = bot_metrics.update_queue_wait_seconds
+    bot_metrics.update_queue_depth.set_function(lambda: update_queue.depth)
+    bot_metrics.update_queue_busy.set_function(lambda: update_queue.busy_workers)
+
+
+# Optional per-chat debounce: bursts of messages get a single combined comment
+group_debouncer: ChatDebouncer | None = None
+if config.debounce_seconds > 0:
+    group_debouncer = ChatDebouncer(
+        window=config.debounce_seconds,
+        max_batch=config.debounce_max_batch,
+        callback=queue_burst if update_queue is not None else comment_on_messages
+    )
+    bot_metrics.debounce_pending.set_function(lambda: group_debouncer.pending_chats)
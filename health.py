@@ -0,0 +1,223 @@
+"""Liveness and readiness tracking: polling heartbeats, LLM results and storage writability"""
+import logging
+import os
+import time
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+from aiohttp import web
+
+from metrics import STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failed comment generations after which a bot is reported as not ready
+LLM_FAILURE_THRESHOLD = 3
+
+
+class BotHealth:
+    """What the health endpoints know about one bot"""
+
+    def __init__(self, bot_name: str):
+        self.bot_name = bot_name
+        self.state = "starting"  # starting, running, restarting, stopped
+        self.restarts = 0
+        self.last_error: str | None = None
+
+        # Polling loop: a getUpdates request starts at least every polling timeout while the loop is alive
+        self.last_poll: float | None = None
+        self.first_poll: float | None = None
+        self.last_updates_ok: float | None = None
+        self.last_updates_error: str | None = None
+
+        # LLM: a run of failures without a success in between means the bot cannot comment
+        self.last_llm_ok: float | None = None
+        self.llm_failures = 0
+
+    def record_llm(self, ok: bool) -> None:
+        if ok:
+            self.last_llm_ok = time.time()
+            self.llm_failures = 0
+        else:
+            self.llm_failures += 1
+
+    def record_crash(self, error: BaseException) -> None:
+        self.state = "restarting"
+        self.restarts += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+
+
+def _age(timestamp: float | None, now: float) -> float | None:
+    return round(now - timestamp, 1) if timestamp is not None else None
+
+
+class _UpdatesProbe(BaseRequestMiddleware):
+    """Session middleware recording the start and outcome of every getUpdates call"""
+
+    def __init__(self, monitor: "HealthMonitor"):
+        self.monitor = monitor
+
+    async def __call__(self, make_request, bot: Bot, method):
+        if not isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+
+        bot_health = self.monitor.by_bot_id.get(bot.id)
+        if bot_health is None:
+            return await make_request(bot, method)
+        bot_health.last_poll = time.time()
+        if bot_health.first_poll is None:
+            self.monitor.record_first_poll(bot_health)
+        try:
+            result = await make_request(bot, method)
+        except Exception as e:
+            bot_health.last_updates_error = f"{type(e).__name__}: {e}"
+            raise
+        bot_health.last_updates_ok = time.time()
+        bot_health.last_updates_error = None
+        return result
+
+
+class HealthMonitor:
+    """
+    Aggregates BotHealth records into liveness (/healthz) and readiness (/readyz)
+
+    Live: no bot's polling loop is stuck (a getUpdates request started within
+    `stale_after` seconds). Ready: additionally every bot (at least `expected_bots`) is running, has fetched
+    updates successfully within `stale_after` seconds (polling mode), its LLM calls
+    are not failing repeatedly, and the data directory is writable.
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        update_mode: str = "polling",
+        stale_after: float = 120.0,
+        started_at: float | None = None,
+        expected_bots: int = 0
+    ):
+        self.data_dir = data_dir
+        self.update_mode = update_mode
+        self.stale_after = stale_after
+        # Startup time (time.time()) that time to first poll is measured from
+        self.started_at = started_at if started_at is not None else time.time()
+        # Bots that are still loading are not registered yet, but the process is not ready without them
+        self.expected_bots = expected_bots
+        self.polling_bots = 0
+
+        self.bots: dict[str, BotHealth] = {}
+        self.by_bot_id: dict[int, BotHealth] = {}
+        self.request_middleware = _UpdatesProbe(self)
+
+        self.storage_writable = True
+        self.storage_error: str | None = None
+        self.storage_checked_at: float | None = None
+
+    def add(self, bot_health: BotHealth, bot: Bot) -> None:
+        """Track a bot; its session must have request_middleware installed (see watch_session)"""
+        self.bots[bot_health.bot_name] = bot_health
+        self.by_bot_id[bot.id] = bot_health
+
+    def watch_session(self, bot: Bot) -> None:
+        """Observe getUpdates calls made through the bot's session (once per shared session)"""
+        if self.request_middleware not in bot.session.middleware:
+            bot.session.middleware(self.request_middleware)
+
+    def record_first_poll(self, bot_health: BotHealth) -> None:
+        """Time to first poll: how long after startup the bot started receiving updates"""
+        bot_health.first_poll = bot_health.last_poll
+        startup = bot_health.first_poll - self.started_at
+        STARTUP_SECONDS.labels(bot_health.bot_name).set(startup)
+        logger.info(f"[{bot_health.bot_name}] First poll {startup:.3f}s after startup")
+        self.polling_bots += 1
+        if self.polling_bots == max(self.expected_bots, len(self.bots)):
+            logger.info(f"All {self.polling_bots} bot(s) polling {startup:.3f}s after startup")
+
+    def check_storage(self) -> bool:
+        """Write, fsync and remove a probe file in the data directory"""
+        probe = os.path.join(self.data_dir, f".health_probe_{os.getpid()}")
+        try:
+            with open(probe, "wb") as f:
+                f.write(b"ok")
+                f.flush()
+                os.fsync(f.fileno())
+            os.unlink(probe)
+        except OSError as e:
+            if self.storage_writable:
+                logger.error(f"Data directory {self.data_dir} is not writable: {e}")
+            self.storage_writable = False
+            self.storage_error = f"{type(e).__name__}: {e}"
+        else:
+            if not self.storage_writable:
+                logger.info(f"Data directory {self.data_dir} is writable again")
+            self.storage_writable = True
+            self.storage_error = None
+        self.storage_checked_at = time.time()
+        return self.storage_writable
+
+    def _bot_status(self, bot_health: BotHealth, now: float) -> dict:
+        polling = self.update_mode == "polling"
+        # A stuck loop stops starting getUpdates requests; only meaningful while it should be polling
+        live = not (
+            polling
+            and bot_health.state == "running"
+            and bot_health.last_poll is not None
+            and now - bot_health.last_poll > self.stale_after
+        )
+        updates_ok = not polling or (
+            bot_health.last_updates_ok is not None and now - bot_health.last_updates_ok <= self.stale_after
+        )
+        llm_ok = bot_health.llm_failures < LLM_FAILURE_THRESHOLD
+        return {
+            "state": bot_health.state,
+            "live": live,
+            "ready": live and bot_health.state == "running" and updates_ok and llm_ok,
+            "restarts": bot_health.restarts,
+            "last_error": bot_health.last_error,
+            "poll_age": _age(bot_health.last_poll, now),
+            "startup_seconds": (
+                round(bot_health.first_poll - self.started_at, 3) if bot_health.first_poll is not None else None
+            ),
+            "updates_ok_age": _age(bot_health.last_updates_ok, now),
+            "updates_error": bot_health.last_updates_error,
+            "llm_ok_age": _age(bot_health.last_llm_ok, now),
+            "llm_failures": bot_health.llm_failures,
+        }
+
+    def status(self) -> dict:
+        """Per-bot detail plus overall live/ready flags"""
+        now = time.time()
+        bots = {name: self._bot_status(bot_health, now) for name, bot_health in self.bots.items()}
+        return {
+            "live": all(bot["live"] for bot in bots.values()),
+            "ready": (
+                bool(bots) and len(bots) >= self.expected_bots
+                and self.storage_writable and all(bot["ready"] for bot in bots.values())
+            ),
+            "storage": {
+                "writable": self.storage_writable,
+                "error": self.storage_error,
+                "checked_age": _age(self.storage_checked_at, now),
+            },
+            "bots": bots,
+        }
+
+    async def _handle_healthz(self, request: web.Request) -> web.Response:
+        status = self.status()
+        return web.json_response(status, status=200 if status["live"] else 503)
+
+    async def _handle_readyz(self, request: web.Request) -> web.Response:
+        self.check_storage()
+        status = self.status()
+        return web.json_response(status, status=200 if status["ready"] else 503)
+
+    async def start_server(self, host: str, port: int) -> web.AppRunner:
+        """Serve GET /healthz and GET /readyz; returns the runner to clean up on shutdown"""
+        app = web.Application()
+        app.router.add_get("/healthz", self._handle_healthz)
+        app.router.add_get("/readyz", self._handle_readyz)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Health checks on http://{host}:{port}/healthz and /readyz")
+        return runner
@@ -0,0 +1,127 @@
+"""Bounded LRU/TTL cache of chat histories"""
+import time
+from collections import OrderedDict, deque
+from typing import Iterable
+
+from chat_history import HistoryEntry
+
+# Approximate per-message overhead of a HistoryEntry in a list (object, str header, list slot);
+# text is counted at 2 bytes per character since Cyrillic strings are stored as UCS-2
+ENTRY_OVERHEAD_BYTES = 140
+
+
+def history_size(history: Iterable[HistoryEntry]) -> int:
+    """Approximate memory footprint of a chat history in bytes"""
+    return sum(ENTRY_OVERHEAD_BYTES + 2 * len(entry.content) for entry in history)
+
+
+class HistoryCache:
+    """
+    Keeps hot chat histories in memory, bounded by chat count, approximate size and idle time
+
+    The least recently used chats are evicted first; chats idle for longer than ttl are
+    evicted on access or when new chats are added.
+    """
+
+    def __init__(self, max_chats: int = 1000, max_bytes: int = 16 * 1024 * 1024, ttl: float = 600.0):
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # chat_id -> [history, size_bytes, last_access]
+        self._entries: OrderedDict[int, list] = OrderedDict()
+        self.size_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, chat_id: int) -> deque[HistoryEntry] | None:
+        """Return the cached history for a chat, or None on miss"""
+        entry = self._entries.get(chat_id)
+        now = time.monotonic()
+        if entry is None or now - entry[2] > self.ttl:
+            if entry is not None:
+                self._evict(chat_id)
+            self.misses += 1
+            return None
+
+        entry[2] = now
+        self._entries.move_to_end(chat_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, chat_id: int, history: deque[HistoryEntry]) -> None:
+        """Cache a chat history loaded from the persistent store"""
+        if chat_id in self._entries:
+            self._evict(chat_id, count=False)
+        size = history_size(history)
+        self._entries[chat_id] = [history, size, time.monotonic()]
+        self.size_bytes += size
+        self._shrink()
+
+    def append(self, chat_id: int, entry: HistoryEntry) -> None:
+        """Append a message to a cached history ring in place"""
+        cached = self._entries.get(chat_id)
+        if cached is None:
+            return
+
+        history = cached[0]
+        added = ENTRY_OVERHEAD_BYTES + 2 * len(entry.content)
+        if len(history) == history.maxlen:
+            added -= ENTRY_OVERHEAD_BYTES + 2 * len(history[0].content)
+        history.append(entry)
+
+        cached[1] += added
+        cached[2] = time.monotonic()
+        self.size_bytes += added
+        self._entries.move_to_end(chat_id)
+        self._shrink()
+
+    def resize(self, history_limit: int) -> None:
+        """Re-create cached history rings with a new capacity"""
+        for cached in self._entries.values():
+            history = deque(cached[0], maxlen=history_limit)
+            size = history_size(history)
+            self.size_bytes += size - cached[1]
+            cached[0], cached[1] = history, size
+
+    def discard(self, chat_id: int) -> None:
+        """Drop a chat from the cache (without counting it as an eviction)"""
+        if chat_id in self._entries:
+            self._evict(chat_id, count=False)
+
+    def _evict(self, chat_id: int, count: bool = True) -> None:
+        _, size, _ = self._entries.pop(chat_id)
+        self.size_bytes -= size
+        if count:
+            self.evictions += 1
+
+    def _shrink(self) -> None:
+        """Evict idle chats, then least recently used ones until within limits"""
+        now = time.monotonic()
+        while self._entries:
+            chat_id, (_, _, last_access) = next(iter(self._entries.items()))
+            if (
+                len(self._entries) > self.max_chats
+                or self.size_bytes > self.max_bytes
+                or now - last_access > self.ttl
+            ):
+                self._evict(chat_id)
+            else:
+                break
+
+    def as_dict(self) -> dict:
+        """Return cache counters as a plain dict (for logs and metrics)"""
+        lookups = self.hits + self.misses
+        return {
+            "chats": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,419 @@
+"""Append-only segmented log storage for bot role, last message IDs and chat histories"""
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from typing import List
+
+from chat_history import HistoryEntry, MessageRole
+from database import RoleStorage, StorageStats
+
+logger = logging.getLogger(__name__)
+
+
+# Record header: payload length, crc32 of (chat_id, kind, payload), chat_id, kind
+HEADER = struct.Struct("<IIqB")
+LAST_ID = struct.Struct("<q")
+# Number of newest messages kept, followed by the UTF-8 summary. "Keep the last n" rather than
+# "drop the first n", so replaying a fold that a snapshot already reflects is a no-op.
+FOLD = struct.Struct("<I")
+
+KIND_MESSAGE = 0
+KIND_LAST_ID = 1
+KIND_CLEAR_LAST_ID = 2
+KIND_CLEAR_HISTORY = 3
+KIND_ROLE = 4
+KIND_RESET_ROLE = 5
+KIND_SNAPSHOT = 6  # First record of a compacted segment: state of all earlier segments follows
+KIND_FOLD = 7  # Oldest messages of a chat replaced by a running summary
+
+SEGMENT_SUFFIX = ".seg"
+
+
+def _encode(chat_id: int, kind: int, payload: bytes = b"") -> bytes:
+    """Encode one log record"""
+    body = struct.pack("<qB", chat_id, kind) + payload
+    return struct.pack("<II", len(payload), zlib.crc32(body)) + body
+
+
+class LogRoleStorage:
+    """
+    RoleStorage-compatible storage backed by an append-only segmented log
+
+    Every mutation is a single appended record, so the write cost per message does not
+    depend on the number of chats. An in-memory index keeps (segment, offset, length) of
+    the last history_limit messages per chat; reads slice memory-mapped segments.
+    Segments whose records are mostly superseded are compacted in the background.
+    """
+
+    DEFAULT_ROLE = RoleStorage.DEFAULT_ROLE
+
+    def __init__(
+        self,
+        bot_token: str,
+        data_dir: str = "/data",
+        history_limit: int = 20,
+        segment_max_bytes: int = 4 * 1024 * 1024,
+        compact_min_bytes: int = 1024 * 1024,
+    ):
+        # Use hash of bot token for unique directory name (same scheme as the JSON backend)
+        token_hash = hashlib.md5(bot_token.encode()).hexdigest()[:8]
+        self.directory = os.path.join(data_dir, f"role_{token_hash}.log")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.history_limit = history_limit
+        self.segment_max_bytes = segment_max_bytes
+        self.compact_min_bytes = compact_min_bytes
+        self.stats = StorageStats()
+
+        self.role: str = self.DEFAULT_ROLE
+        self.last_message_ids: dict[int, int] = {}
+        self.summaries: dict[int, str] = {}
+        # chat_id -> (segment_id, offset, record_length) of the newest history_limit messages
+        self._index: dict[int, deque[tuple[int, int, int]]] = {}
+
+        self._segment_sizes: dict[int, int] = {}
+        self._maps: dict[int, mmap.mmap] = {}
+        self._live_history_bytes = 0
+        self._live_summary_bytes = 0
+        self._compaction: asyncio.Task | None = None
+
+        self._replay()
+
+        self._active_id = max(self._segment_sizes, default=0) or self._new_segment_id()
+        self._segment_sizes.setdefault(self._active_id, 0)
+        self._active = open(self._segment_path(self._active_id), "ab", buffering=0)
+
+    # Segment files
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"{segment_id:08d}{SEGMENT_SUFFIX}")
+
+    def _new_segment_id(self) -> int:
+        return max(self._segment_sizes, default=0) + 1
+
+    def _segment_ids(self) -> list[int]:
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _map(self, segment_id: int, end: int) -> mmap.mmap:
+        """Return a read-only map of the segment covering at least `end` bytes"""
+        mapped = self._maps.get(segment_id)
+        if mapped is None or len(mapped) < end:
+            with open(self._segment_path(segment_id), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment_id] = mapped
+        return mapped
+
+    # Replay
+
+    def _replay(self) -> None:
+        """Rebuild role, last message IDs and the history index by scanning all segments"""
+        for segment_id in self._segment_ids():
+            path = self._segment_path(segment_id)
+            size = os.path.getsize(path)
+            self._segment_sizes[segment_id] = size
+            if not size:
+                continue
+
+            mapped = self._map(segment_id, size)
+            offset = 0
+            while offset + HEADER.size <= size:
+                length, crc, chat_id, kind = HEADER.unpack_from(mapped, offset)
+                end = offset + HEADER.size + length
+                if end > size or zlib.crc32(mapped[offset + 8:end]) != crc:
+                    break
+                self._apply(segment_id, offset, chat_id, kind, mapped[offset + HEADER.size:end])
+                offset = end
+
+            if offset < size:
+                # Torn write at the tail (crash during append): drop the partial record
+                logger.warning(f"Truncating corrupt tail of {path} at offset {offset}")
+                self._maps.pop(segment_id, None)
+                os.truncate(path, offset)
+                self._segment_sizes[segment_id] = offset
+
+    def _apply(self, segment_id: int, offset: int, chat_id: int, kind: int, payload: bytes) -> None:
+        """Apply one record to the in-memory state"""
+        if kind == KIND_MESSAGE:
+            self._index_message(chat_id, (segment_id, offset, HEADER.size + len(payload)))
+        elif kind == KIND_LAST_ID:
+            self.last_message_ids[chat_id] = LAST_ID.unpack(payload)[0]
+        elif kind == KIND_CLEAR_LAST_ID:
+            self.last_message_ids.pop(chat_id, None)
+        elif kind == KIND_CLEAR_HISTORY:
+            self._drop_history(chat_id)
+            self._set_summary(chat_id, None)
+        elif kind == KIND_FOLD:
+            keep = FOLD.unpack_from(payload)[0]
+            self._fold(chat_id, keep, str(payload[FOLD.size:], "utf-8"))
+        elif kind == KIND_ROLE:
+            self.role = payload.decode("utf-8")
+        elif kind == KIND_RESET_ROLE:
+            self.role = self.DEFAULT_ROLE
+        elif kind == KIND_SNAPSHOT:
+            # Everything before a compacted segment is superseded by its contents
+            self.role = self.DEFAULT_ROLE
+            self.last_message_ids = {}
+            self.summaries = {}
+            self._index = {}
+            self._live_history_bytes = 0
+            self._live_summary_bytes = 0
+
+    def _index_message(self, chat_id: int, location: tuple[int, int, int]) -> None:
+        entries = self._index.get(chat_id)
+        if entries is None:
+            entries = self._index[chat_id] = deque(maxlen=self.history_limit)
+        if len(entries) == entries.maxlen:
+            self._live_history_bytes -= entries[0][2]
+        entries.append(location)
+        self._live_history_bytes += location[2]
+
+    def _drop_history(self, chat_id: int) -> None:
+        entries = self._index.pop(chat_id, None)
+        if entries:
+            self._live_history_bytes -= sum(length for _, _, length in entries)
+
+    def _set_summary(self, chat_id: int, summary: str | None) -> None:
+        # A live summary costs one fold record in a snapshot
+        previous = self.summaries.pop(chat_id, None)
+        if previous is not None:
+            self._live_summary_bytes -= HEADER.size + FOLD.size + len(previous.encode("utf-8"))
+        if summary is not None:
+            self.summaries[chat_id] = summary
+            self._live_summary_bytes += HEADER.size + FOLD.size + len(summary.encode("utf-8"))
+
+    def _fold(self, chat_id: int, keep: int, summary: str) -> None:
+        entries = self._index.get(chat_id)
+        while entries and len(entries) > keep:
+            self._live_history_bytes -= entries.popleft()[2]
+        self._set_summary(chat_id, summary)
+
+    # Appends
+
+    def _append(self, chat_id: int, kind: int, payload: bytes = b"") -> tuple[int, int, int]:
+        """Append one record to the active segment and return its location"""
+        record = _encode(chat_id, kind, payload)
+        if self._segment_sizes[self._active_id] + len(record) > self.segment_max_bytes:
+            self._rotate()
+
+        offset = self._segment_sizes[self._active_id]
+        self._active.write(record)
+        self._segment_sizes[self._active_id] = offset + len(record)
+
+        self.stats.mutations += 1
+        self.stats.bytes_written += len(record)
+        self._maybe_compact()
+        return self._active_id, offset, len(record)
+
+    def _rotate(self) -> None:
+        """Seal the active segment and start a new one"""
+        os.fsync(self._active.fileno())
+        self._active.close()
+        self._active_id = self._new_segment_id()
+        self._segment_sizes[self._active_id] = 0
+        self._active = open(self._segment_path(self._active_id), "ab", buffering=0)
+
+    def flush(self) -> None:
+        """fsync the active segment"""
+        start = time.perf_counter()
+        os.fsync(self._active.fileno())
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats.record_flush(elapsed_ms)
+
+    async def aclose(self) -> None:
+        """Wait for a running compaction, then sync and close the active segment"""
+        if self._compaction is not None:
+            await self._compaction
+        self.flush()
+        self._active.close()
+        self._maps.clear()
+
+    # Compaction
+
+    def _dead_bytes(self) -> int:
+        live = self._live_history_bytes + self._live_summary_bytes + len(self.last_message_ids) * (HEADER.size + LAST_ID.size)
+        return sum(self._segment_sizes.values()) - live
+
+    def _maybe_compact(self) -> None:
+        """Schedule a background compaction when superseded records dominate sealed segments"""
+        if self._compaction is not None or len(self._segment_sizes) < 2:
+            return
+        dead = self._dead_bytes()
+        if dead < self.compact_min_bytes or dead < sum(self._segment_sizes.values()) // 2:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._compaction = loop.create_task(self._compact())
+
+    async def _compact(self) -> None:
+        """Rewrite the live records of all sealed segments into one snapshot segment"""
+        try:
+            sealed = sorted(s for s in self._segment_sizes if s != self._active_id)
+            if not sealed:
+                return
+            sealed_set = set(sealed)
+            target_id = sealed[-1]
+
+            # Capture live state on the event loop; sealed segments are immutable
+            role = self.role
+            last_ids = dict(self.last_message_ids)
+            summaries = dict(self.summaries)
+            live = [
+                (chat_id, location)
+                for chat_id, entries in self._index.items()
+                for location in entries
+                if location[0] in sealed_set
+            ]
+            maps = {segment_id: self._map(segment_id, self._segment_sizes[segment_id]) for segment_id in sealed}
+
+            relocated = await asyncio.to_thread(self._write_snapshot, target_id, role, last_ids, summaries, live, maps)
+
+            # Swap in the snapshot: no awaits below, so appends cannot interleave
+            os.replace(self._segment_path(target_id) + ".tmp", self._segment_path(target_id))
+            for segment_id in sealed[:-1]:
+                os.unlink(self._segment_path(segment_id))
+                del self._segment_sizes[segment_id]
+                self._maps.pop(segment_id, None)
+            self._maps.pop(target_id, None)
+            self._segment_sizes[target_id] = os.path.getsize(self._segment_path(target_id))
+
+            for entries in self._index.values():
+                for i, location in enumerate(entries):
+                    if location in relocated:
+                        entries[i] = relocated[location]
+
+            logger.info(f"Compacted {len(sealed)} segment(s) in {self.directory}")
+        except Exception as e:
+            logger.error(f"Failed to compact {self.directory}: {e}", exc_info=True)
+        finally:
+            self._compaction = None
+
+    def _write_snapshot(
+        self,
+        target_id: int,
+        role: str,
+        last_ids: dict[int, int],
+        summaries: dict[int, str],
+        live: list[tuple[int, tuple[int, int, int]]],
+        maps: dict[int, mmap.mmap],
+    ) -> dict[tuple[int, int, int], tuple[int, int, int]]:
+        """Write a snapshot segment to a temp file; return old -> new record locations"""
+        relocated = {}
+        offset = 0
+        with open(self._segment_path(target_id) + ".tmp", "wb") as f:
+            def write(record: bytes) -> None:
+                nonlocal offset
+                f.write(record)
+                offset += len(record)
+
+            write(_encode(0, KIND_SNAPSHOT))
+            if role != self.DEFAULT_ROLE:
+                write(_encode(0, KIND_ROLE, role.encode("utf-8")))
+            for chat_id, message_id in last_ids.items():
+                write(_encode(chat_id, KIND_LAST_ID, LAST_ID.pack(message_id)))
+            for chat_id, summary in summaries.items():
+                # Written before the chat's messages, so it folds nothing on replay
+                write(_encode(chat_id, KIND_FOLD, FOLD.pack(0) + summary.encode("utf-8")))
+            for _, location in live:
+                segment_id, old_offset, length = location
+                relocated[location] = (target_id, offset, length)
+                write(maps[segment_id][old_offset:old_offset + length])
+            f.flush()
+            os.fsync(f.fileno())
+        return relocated
+
+    # Public API (same as RoleStorage)
+
+    def get_role(self) -> str:
+        """Get current role"""
+        return self.role
+
+    def set_role(self, role: str) -> None:
+        """Set new role"""
+        self.role = role
+        self._append(0, KIND_ROLE, role.encode("utf-8"))
+
+    def delete_role(self) -> None:
+        """Reset to default role"""
+        self.role = self.DEFAULT_ROLE
+        self._append(0, KIND_RESET_ROLE)
+
+    def get_last_message_id(self, chat_id: int) -> int | None:
+        """Get last message ID for a chat"""
+        return self.last_message_ids.get(chat_id)
+
+    def set_last_message_id(self, chat_id: int, message_id: int) -> None:
+        """Set last message ID for a chat"""
+        self.last_message_ids[chat_id] = message_id
+        self._append(chat_id, KIND_LAST_ID, LAST_ID.pack(message_id))
+
+    def clear_last_message_id(self, chat_id: int) -> None:
+        """Clear last message ID for a chat"""
+        if chat_id in self.last_message_ids:
+            del self.last_message_ids[chat_id]
+            self._append(chat_id, KIND_CLEAR_LAST_ID)
+
+    def get_chat_history(self, chat_id: int) -> List[HistoryEntry]:
+        """Get chat history for a specific chat (decoded straight from the mapped segments)"""
+        history = []
+        for segment_id, offset, length in self._index.get(chat_id, ()):
+            with memoryview(self._map(segment_id, offset + length)) as view:
+                payload = view[offset + HEADER.size:offset + length]
+                history.append(HistoryEntry(MessageRole(payload[0]), str(payload[1:], "utf-8")))
+                payload.release()
+        return history
+
+    def add_message_to_history(self, chat_id: int, role: str, content: str) -> None:
+        """Add a message to chat history and maintain limit"""
+        # Message payload: one byte role code followed by the UTF-8 text
+        payload = bytes((MessageRole.parse(role),)) + content.encode("utf-8")
+        self._index_message(chat_id, self._append(chat_id, KIND_MESSAGE, payload))
+
+    def add_exchange(self, chat_id: int, user_message: str, assistant_message: str) -> None:
+        """Add a user message and the bot's reply to chat history"""
+        self.add_message_to_history(chat_id, "user", user_message)
+        self.add_message_to_history(chat_id, "assistant", assistant_message)
+
+    def record_comment(self, chat_id: int, message_id: int, exchange: tuple[str, str] | None = None) -> None:
+        """Store the ID of a new bot comment and add the (user message, comment) exchange"""
+        if exchange is not None:
+            self.add_exchange(chat_id, *exchange)
+        self.set_last_message_id(chat_id, message_id)
+
+    def set_history_limit(self, history_limit: int) -> None:
+        """Change the max number of messages kept per chat (older records become compactable)"""
+        if history_limit == self.history_limit:
+            return
+        self.history_limit = history_limit
+        self._live_history_bytes = 0
+        for chat_id, entries in self._index.items():
+            entries = self._index[chat_id] = deque(entries, maxlen=history_limit)
+            self._live_history_bytes += sum(length for _, _, length in entries)
+
+    def get_summary(self, chat_id: int) -> str | None:
+        """Get the running summary of a chat's folded history"""
+        return self.summaries.get(chat_id)
+
+    def fold_history(self, chat_id: int, count: int, summary: str) -> None:
+        """Replace the `count` oldest history messages of a chat with a new running summary"""
+        keep = max(len(self._index.get(chat_id, ())) - count, 0)
+        self._fold(chat_id, keep, summary)
+        self._append(chat_id, KIND_FOLD, FOLD.pack(keep) + summary.encode("utf-8"))
+
+    def clear_chat_history(self, chat_id: int) -> None:
+        """Clear chat history (and its summary) for a specific chat"""
+        if chat_id in self._index or chat_id in self.summaries:
+            self._drop_history(chat_id)
+            self._set_summary(chat_id, None)
+            self._append(chat_id, KIND_CLEAR_HISTORY)
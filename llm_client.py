@@ -1,6 +1,61 @@
 """Groq LLM API client"""
+import asyncio
+import json
+import logging
+import random
+import re
+import time
 import aiohttp
-from typing import List, Dict
+from typing import AsyncIterator, Sequence
+
+from chat_history import MESSAGE_OVERHEAD_TOKENS, HistoryEntry, estimate_tokens
+from context_builder import ContextBuilder
+from metrics import GROQ_INPUT_TOKENS, GROQ_REQUEST_SECONDS, GROQ_RESPONSES, GROQ_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limited or temporarily unavailable
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Groq reset headers look like "2m59.56s", "7.66s" or "120ms"
+DURATION_PATTERN = re.compile(r"^(?:(\d+)h)?(?:(\d+)m(?!s))?(?:([\d.]+)s)?(?:([\d.]+)ms)?$")
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Parse a Retry-After / x-ratelimit-reset-* header value into seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    match = DURATION_PATTERN.match(value)
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds, millis = match.groups()
+    return (
+        int(hours or 0) * 3600
+        + int(minutes or 0) * 60
+        + float(seconds or 0)
+        + float(millis or 0) / 1000
+    )
+
+
+class GroqAPIError(Exception):
+    """Groq request failed (after retries, if the failure was retryable)"""
+
+    def __init__(
+        self,
+        message: str,
+        status: int | None = None,
+        retryable: bool = False,
+        retry_after: float | None = None
+    ):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable  # Temporary failure (rate limit, overload, timeout)
+        self.retry_after = retry_after
 
 
 class GroqClient:
@@ -8,61 +63,386 @@ class GroqClient:
 
     BASE_URL = "https://api.groq.com/openai/v1/chat/completions"
 
-    def __init__(self, api_key: str, model: str = "llama-3.3-70b-versatile", proxy: str | None = None):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "llama-3.3-70b-versatile",
+        proxy: str | None = None,
+        base_url: str | None = None,
+        pool_limit_per_host: int = 10,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+        request_timeout: float = 20.0,
+        max_retries: int = 3,
+        request_deadline: float = 45.0,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 10.0,
+        retry_after_max_delay: float = 40.0,
+        throttle_min_remaining_tokens: int = 1000,
+        context_builder: ContextBuilder | None = None,
+    ):
         self.api_key = api_key
         self.model = model
         self.proxy = proxy
+        self.base_url = base_url or self.BASE_URL
+
+        # Connection pool settings for the shared session
+        self.pool_limit_per_host = pool_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.request_timeout = request_timeout
+
+        # Retries: jittered exponential backoff within a per-request deadline
+        self.max_retries = max_retries
+        self.request_deadline = request_deadline
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        # Longest server-requested Retry-After that is honoured (the request deadline still applies)
+        self.retry_after_max_delay = retry_after_max_delay
+
+        # Proactive throttling from x-ratelimit-* headers; Groq's limits are per model (model -> until)
+        self.throttle_min_remaining_tokens = throttle_min_remaining_tokens
+        self._throttle_until: dict[str, float] = {}
+
+        # Input token budget: history is trimmed newest-first and long messages are truncated
+        self.context_builder = context_builder
+
+        self.stats = {
+            "requests": 0, "attempts": 0, "retries": 0, "failures": 0, "cancelled": 0,
+            "throttled_seconds": 0.0, "input_tokens": 0
+        }
 
-    async def generate_comment(self, role: str, message: str, chat_history: List[Dict[str, str]] = None) -> str:
+        # Metric children bound once; status counters are added the first time a status is seen
+        self._request_seconds = GROQ_REQUEST_SECONDS.labels()
+        self._retries_counter = GROQ_RETRIES.labels()
+        self._input_tokens = GROQ_INPUT_TOKENS.labels()
+        self._response_counters: dict[int, object] = {}
+
+        # Created lazily on first request so the client can be built outside of an event loop
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it (and its connection pool) on first use"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.pool_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Close the shared session and release pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def generate_comment(
+        self,
+        role: str,
+        message: str,
+        chat_history: Sequence[HistoryEntry] | None = None
+    ) -> str:
         """
         Generate a comment based on the role, message, and chat history
 
         Args:
             role: System role/prompt for the bot
             message: User message to comment on
-            chat_history: Previous messages in the chat (list of {role, content} dicts)
+            chat_history: Previous messages in the chat (HistoryEntry records)
 
         Returns:
             Generated comment text
         """
+        return await self._request(self._build_payload(role, message, chat_history))
+
+    async def complete(
+        self,
+        messages: list[dict],
+        model: str | None = None,
+        max_tokens: int = 500,
+        temperature: float = 0.7
+    ) -> str:
+        """
+        Run a plain chat completion (no role, history or token budget handling)
+
+        Args:
+            messages: OpenAI-style {"role", "content"} message dicts
+            model: Model to use instead of the client's default (e.g. a smaller one for background work)
+            max_tokens: Max tokens to generate
+            temperature: Sampling temperature
+
+        Returns:
+            Generated text
+        """
+        return await self._request({
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        })
+
+    async def _request(self, payload: dict) -> str:
+        """Send a completion request, retrying temporary failures within the request deadline"""
+        self.stats["requests"] += 1
+        deadline = time.monotonic() + self.request_deadline
+        attempt = 0
+        while True:
+            try:
+                await self._wait_for_throttle(payload["model"], deadline)
+                return await self._post(payload, deadline)
+            except GroqAPIError as e:
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = GroqAPIError(f"Groq API request failed: {type(e).__name__} {e}", retryable=True)
+            except asyncio.CancelledError:
+                # Caller gave up (e.g. the comment was superseded by a newer message)
+                self.stats["cancelled"] += 1
+                raise
+
+            attempt = await self._backoff(error, attempt, deadline)
+
+    async def stream_comment(
+        self,
+        role: str,
+        message: str,
+        chat_history: Sequence[HistoryEntry] | None = None
+    ) -> AsyncIterator[str]:
+        """
+        Generate a comment as a stream of text chunks (server-sent events, `stream: true`)
+
+        Failures before the first chunk are retried like generate_comment; once text has
+        been yielded a failure is raised as non-retryable, since the caller already used it.
+
+        Args:
+            role: System role/prompt for the bot
+            message: User message to comment on
+            chat_history: Previous messages in the chat (HistoryEntry records)
+
+        Yields:
+            Pieces of the generated comment text, in order
+        """
+        payload = self._build_payload(role, message, chat_history)
+        payload["stream"] = True
+
+        self.stats["requests"] += 1
+        deadline = time.monotonic() + self.request_deadline
+        attempt = 0
+        started = False
+        while True:
+            try:
+                await self._wait_for_throttle(payload["model"], deadline)
+                async for chunk in self._post_stream(payload, deadline):
+                    started = True
+                    yield chunk
+                return
+            except GroqAPIError as e:
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                error = GroqAPIError(f"Groq API stream failed: {type(e).__name__} {e}", retryable=True)
+
+            if started:
+                self.stats["failures"] += 1
+                raise GroqAPIError(f"Comment stream interrupted: {error}", error.status)
+            attempt = await self._backoff(error, attempt, deadline)
+
+    def estimate_input_tokens(
+        self,
+        role: str,
+        message: str,
+        chat_history: Sequence[HistoryEntry] | None = None
+    ) -> int:
+        """Estimated prompt tokens of a request, after the context budget is applied"""
+        if self.context_builder is not None:
+            return self.context_builder.build(role, message, chat_history).tokens
+        tokens = estimate_tokens(role) + estimate_tokens(message) + 2 * MESSAGE_OVERHEAD_TOKENS
+        if chat_history:
+            tokens += sum(entry.tokens for entry in chat_history)
+        return tokens
+
+    def _build_payload(self, role: str, message: str, chat_history: Sequence[HistoryEntry] | None) -> dict:
+        """Build the chat completion request body"""
+        if self.context_builder is not None:
+            context = self.context_builder.build(role, message, chat_history)
+            chat_history, message, tokens = context.history, context.message, context.tokens
+            logger.info(
+                f"Groq request: ~{tokens} input tokens, {len(context.history)} history messages "
+                f"({context.dropped} dropped, {context.truncated} truncated)"
+            )
+        else:
+            tokens = self.estimate_input_tokens(role, message, chat_history)
+            logger.info(f"Groq request: ~{tokens} input tokens, {len(chat_history or ())} history messages")
+        self.stats["input_tokens"] += tokens
+        self._input_tokens.observe(tokens)
+
         messages = [{"role": "system", "content": role}]
 
-        # Add chat history if provided
+        # Add chat history if provided (converted to message dicts only here)
         if chat_history:
-            messages.extend(chat_history)
+            messages.extend(entry.as_message() for entry in chat_history)
 
         # Add current user message
         messages.append({"role": "user", "content": message})
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
+        return {
             "model": self.model,
             "messages": messages,
             "temperature": 0.7,
             "max_tokens": 500,
         }
 
+    async def _backoff(self, error: GroqAPIError, attempt: int, deadline: float) -> int:
+        """Sleep before the next attempt, or raise if the error is final; returns the new attempt number"""
+        delay = self._retry_delay(attempt, error.retry_after)
+        if not error.retryable or attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+            self.stats["failures"] += 1
+            raise GroqAPIError(f"Failed to generate comment: {error}", error.status, error.retryable)
+
+        attempt += 1
+        self.stats["retries"] += 1
+        self._retries_counter.inc()
+        logger.warning(f"Groq request failed ({error}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+        return attempt
+
+    async def _post(self, payload: dict, deadline: float) -> str:
+        """Send one chat completion request"""
+        self.stats["attempts"] += 1
+        timeout = aiohttp.ClientTimeout(total=max(0.1, min(self.request_timeout, deadline - time.monotonic())))
+        session = self._get_session()
+        start = time.perf_counter()
+        status = 0
         try:
-            connector = None
-            if self.proxy:
-                connector = aiohttp.TCPConnector()
-
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.post(
-                    self.BASE_URL,
-                    json=payload,
-                    headers=headers,
-                    proxy=self.proxy if self.proxy else None
-                ) as response:
-                    if response.status == 200:
+            async with session.post(
+                self.base_url,
+                json=payload,
+                proxy=self.proxy if self.proxy else None,
+                timeout=timeout
+            ) as response:
+                status = response.status
+                self._update_throttle(payload["model"], response.headers)
+                if response.status == 200:
+                    try:
                         data = await response.json()
-                        return data["choices"][0]["message"]["content"]
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"Groq API error: {response.status} - {error_text}")
-        except Exception as e:
-            raise Exception(f"Failed to generate comment: {str(e)}")
+                        content = data["choices"][0]["message"]["content"]
+                        if not isinstance(content, str):
+                            raise TypeError(f"content is {type(content).__name__}")
+                    except (aiohttp.ContentTypeError, ValueError, LookupError, TypeError) as e:
+                        # Not JSON, or no text in the first choice: treat like a temporary server failure
+                        raise GroqAPIError(
+                            f"Groq API returned a malformed completion: {type(e).__name__} {e}",
+                            status=200,
+                            retryable=True
+                        ) from e
+                    return content
+
+                error_text = await response.text()
+                raise GroqAPIError(
+                    f"Groq API error: {response.status} - {error_text}",
+                    status=response.status,
+                    retryable=response.status in RETRYABLE_STATUSES,
+                    retry_after=parse_duration(response.headers.get("Retry-After"))
+                )
+        finally:
+            self._record_attempt(status, start)
+
+    async def _post_stream(self, payload: dict, deadline: float) -> AsyncIterator[str]:
+        """Send one streaming chat completion request and yield content deltas"""
+        self.stats["attempts"] += 1
+        # No total timeout: a long generation may outlive it; bound the gaps between chunks instead
+        timeout = aiohttp.ClientTimeout(
+            connect=max(0.1, min(self.request_timeout, deadline - time.monotonic())),
+            sock_read=self.request_timeout
+        )
+        session = self._get_session()
+        start = time.perf_counter()
+        status = 0
+        try:
+            async with session.post(
+                self.base_url,
+                json=payload,
+                proxy=self.proxy if self.proxy else None,
+                timeout=timeout
+            ) as response:
+                status = response.status
+                self._update_throttle(payload["model"], response.headers)
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise GroqAPIError(
+                        f"Groq API error: {response.status} - {error_text}",
+                        status=response.status,
+                        retryable=response.status in RETRYABLE_STATUSES,
+                        retry_after=parse_duration(response.headers.get("Retry-After"))
+                    )
+
+                # Server-sent events: one "data: {json}" line per chunk, terminated by "data: [DONE]"
+                async for line in response.content:
+                    line = line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        return
+                    chunk = json.loads(data)
+                    if "error" in chunk:
+                        raise GroqAPIError(f"Groq API stream error: {chunk['error']}")
+                    if not chunk.get("choices"):
+                        continue
+                    content = chunk["choices"][0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+        finally:
+            # Whole stream duration, not just the time to the response headers
+            self._record_attempt(status, start)
+
+    def _record_attempt(self, status: int, start: float) -> None:
+        """Observe one HTTP attempt in the Groq metrics (status 0 = no response)"""
+        self._request_seconds.observe(time.perf_counter() - start)
+        counter = self._response_counters.get(status)
+        if counter is None:
+            counter = self._response_counters[status] = GROQ_RESPONSES.labels(status)
+        counter.inc()
+
+    def _retry_delay(self, attempt: int, retry_after: float | None) -> float:
+        """Delay before the next attempt: server-provided Retry-After, else full-jitter backoff"""
+        if retry_after is not None:
+            return min(retry_after, self.retry_after_max_delay)
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    def _update_throttle(self, model: str, headers) -> None:
+        """Pause new requests for `model` until its limit resets when Groq reports it is nearly exhausted"""
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        reset = None
+        try:
+            if remaining_requests is not None and int(remaining_requests) <= 0:
+                reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if remaining_tokens is not None and int(remaining_tokens) < self.throttle_min_remaining_tokens:
+                reset = max(reset or 0.0, parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0.0)
+        except ValueError:
+            return
+        if reset:
+            self._throttle_until[model] = max(self._throttle_until.get(model, 0.0), time.monotonic() + reset)
+
+    async def _wait_for_throttle(self, model: str, deadline: float) -> None:
+        """Sleep while `model` is proactively throttled; fail fast if that would pass the deadline"""
+        wait = self._throttle_until.get(model, 0.0) - time.monotonic()
+        if wait <= 0:
+            return
+        if time.monotonic() + wait >= deadline:
+            raise GroqAPIError(
+                f"Groq rate limit of {model} nearly exhausted, resets in {wait:.1f}s",
+                status=429,
+                retryable=True,
+                retry_after=wait
+            )
+        self.stats["throttled_seconds"] += wait
+        await asyncio.sleep(wait)
@@ -0,0 +1,276 @@
+"""Fair scheduling of LLM requests across bots sharing one Groq client"""
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Sequence
+
+from chat_history import MESSAGE_OVERHEAD_TOKENS, HistoryEntry, estimate_tokens
+from llm_client import GroqClient
+
+
+class LLMRequestShed(Exception):
+    """Raised when a request waited in the queue longer than max_wait and was dropped"""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` tokens per minute"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class _BotQueue:
+    """Pending requests and counters for one bot"""
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.requests: deque[_Request] = deque()
+        self.last_tag = 0.0
+
+        self.granted = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class _Request:
+    __slots__ = ("queue", "tag", "tokens", "future", "enqueued_at")
+
+    def __init__(self, queue: _BotQueue, tag: float, tokens: int, future: asyncio.Future):
+        self.queue = queue
+        self.tag = tag
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Admission control in front of GroqClient
+
+    Limits the number of in-flight requests, keeps request and token rates within
+    per-minute budgets, and serves waiting bots by weighted fair queuing so one busy
+    bot cannot starve the others. Requests that wait longer than max_wait are shed.
+    """
+
+    def __init__(
+        self,
+        client: GroqClient,
+        max_concurrency: int = 4,
+        requests_per_minute: int = 30,
+        tokens_per_minute: int = 12000,
+        max_wait: float = 30.0,
+        max_output_tokens: int = 500,
+    ):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.max_output_tokens = max_output_tokens
+
+        self._requests_bucket = TokenBucket(requests_per_minute)
+        self._tokens_bucket = TokenBucket(tokens_per_minute)
+        self._queues: dict[str, _BotQueue] = {}
+        self._virtual_time = 0.0
+        self._active = 0
+        self._retry_timer: asyncio.TimerHandle | None = None
+
+    def for_bot(self, bot_name: str, weight: float = 1.0) -> "ScheduledLLMClient":
+        """Return a GroqClient-compatible client whose requests are scheduled as `bot_name`"""
+        self._queues.setdefault(bot_name, _BotQueue(weight)).weight = weight
+        return ScheduledLLMClient(self, bot_name)
+
+    def estimate_tokens(self, role: str, message: str, chat_history: Sequence[HistoryEntry] | None) -> int:
+        """Estimate prompt plus completion tokens for budgeting"""
+        return self.client.estimate_input_tokens(role, message, chat_history) + self.max_output_tokens
+
+    async def generate_comment(
+        self,
+        bot_name: str,
+        role: str,
+        message: str,
+        chat_history: Sequence[HistoryEntry] | None = None
+    ) -> str:
+        """Wait for a slot as `bot_name`, then call GroqClient.generate_comment"""
+        await self._acquire(bot_name, self.estimate_tokens(role, message, chat_history))
+        try:
+            return await self.client.generate_comment(role, message, chat_history)
+        finally:
+            self._release()
+
+    async def stream_comment(
+        self,
+        bot_name: str,
+        role: str,
+        message: str,
+        chat_history: Sequence[HistoryEntry] | None = None
+    ) -> AsyncIterator[str]:
+        """Wait for a slot as `bot_name`, then stream GroqClient.stream_comment (slot held until done)"""
+        await self._acquire(bot_name, self.estimate_tokens(role, message, chat_history))
+        try:
+            async for chunk in self.client.stream_comment(role, message, chat_history):
+                yield chunk
+        finally:
+            self._release()
+
+    async def complete(
+        self,
+        bot_name: str,
+        messages: list[dict],
+        model: str | None = None,
+        max_tokens: int = 500,
+        temperature: float = 0.7
+    ) -> str:
+        """Wait for a slot as `bot_name`, then call GroqClient.complete (e.g. for history summaries)"""
+        tokens = sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages) + max_tokens
+        await self._acquire(bot_name, tokens)
+        try:
+            return await self.client.complete(messages, model, max_tokens, temperature)
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    async def _acquire(self, bot_name: str, tokens: int) -> None:
+        queue = self._queues.get(bot_name)
+        if queue is None:
+            queue = self._queues[bot_name] = _BotQueue(1.0)
+
+        # Start-time fair queuing: each request advances the bot's tag by 1/weight
+        tag = max(self._virtual_time, queue.last_tag) + 1 / queue.weight
+        queue.last_tag = tag
+        request = _Request(queue, tag, tokens, asyncio.get_running_loop().create_future())
+        queue.requests.append(request)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(request.future, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # Cancelled right after being granted a slot: give it back
+            if request.future.done() and not request.future.cancelled():
+                self._release()
+            raise
+        except TimeoutError:
+            # Granted in the same loop iteration as the timeout: the slot is ours, use it
+            if request.future.done() and not request.future.cancelled():
+                return
+            queue.shed += 1
+            raise LLMRequestShed(
+                f"LLM request from {bot_name} shed after waiting {self.max_wait:.0f}s "
+                f"({len(queue.requests)} queued)"
+            )
+
+    def _next_request(self) -> _Request | None:
+        """Return the waiting request with the smallest tag, dropping shed ones"""
+        best = None
+        for queue in self._queues.values():
+            while queue.requests and queue.requests[0].future.done():
+                queue.requests.popleft()
+            if queue.requests and (best is None or queue.requests[0].tag < best.tag):
+                best = queue.requests[0]
+        return best
+
+    def _dispatch(self) -> None:
+        """Grant slots to waiting requests while concurrency and rate budgets allow"""
+        while self._active < self.max_concurrency:
+            request = self._next_request()
+            if request is None:
+                return
+
+            wait = max(self._requests_bucket.wait_time(1), self._tokens_bucket.wait_time(request.tokens))
+            if wait > 0:
+                if self._retry_timer is None:
+                    self._retry_timer = asyncio.get_running_loop().call_later(wait, self._retry_dispatch)
+                return
+
+            self._requests_bucket.take(1)
+            self._tokens_bucket.take(request.tokens)
+            request.queue.requests.popleft()
+            self._virtual_time = request.tag
+            self._active += 1
+
+            waited = time.monotonic() - request.enqueued_at
+            request.queue.granted += 1
+            request.queue.total_wait += waited
+            request.queue.max_wait = max(request.queue.max_wait, waited)
+            request.future.set_result(None)
+
+    def _retry_dispatch(self) -> None:
+        self._retry_timer = None
+        self._dispatch()
+
+    def queue_depth(self, bot_name: str) -> int:
+        """Requests of this bot still waiting for a slot"""
+        queue = self._queues.get(bot_name)
+        if queue is None:
+            return 0
+        return sum(1 for r in queue.requests if not r.future.done())
+
+    def stats(self) -> dict:
+        """Per-bot queue depth and wait-time counters (for logs and metrics)"""
+        return {
+            bot_name: {
+                "queue_depth": self.queue_depth(bot_name),
+                "granted": queue.granted,
+                "shed": queue.shed,
+                "avg_wait_ms": round(queue.total_wait / queue.granted * 1000, 1) if queue.granted else 0.0,
+                "max_wait_ms": round(queue.max_wait * 1000, 1),
+            }
+            for bot_name, queue in self._queues.items()
+        }
+
+
+class ScheduledLLMClient:
+    """GroqClient-compatible view of an LLMScheduler for a single bot"""
+
+    def __init__(self, scheduler: LLMScheduler, bot_name: str):
+        self.scheduler = scheduler
+        self.bot_name = bot_name
+
+    async def generate_comment(
+        self,
+        role: str,
+        message: str,
+        chat_history: Sequence[HistoryEntry] | None = None
+    ) -> str:
+        """Generate a comment through the shared scheduler"""
+        return await self.scheduler.generate_comment(self.bot_name, role, message, chat_history)
+
+    def stream_comment(
+        self,
+        role: str,
+        message: str,
+        chat_history: Sequence[HistoryEntry] | None = None
+    ) -> AsyncIterator[str]:
+        """Stream a comment through the shared scheduler"""
+        return self.scheduler.stream_comment(self.bot_name, role, message, chat_history)
+
+    async def complete(
+        self,
+        messages: list[dict],
+        model: str | None = None,
+        max_tokens: int = 500,
+        temperature: float = 0.7
+    ) -> str:
+        """Run a plain chat completion through the shared scheduler"""
+        return await self.scheduler.complete(self.bot_name, messages, model, max_tokens, temperature)
@@ -0,0 +1,60 @@
+"""Event loop lag: how late a periodic timer fires, i.e. how long callbacks blocked the loop"""
+import asyncio
+import logging
+import time
+
+from metrics import EVENT_LOOP_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Sleeps `interval` seconds in a loop and records how much later than due it wakes up
+
+    Every handler, flush and parse that runs on the event loop without awaiting delays
+    everything else (polling, other bots' replies); the lag is that delay as seen by a timer.
+    Each sample goes to the event_loop_lag_seconds histogram.
+    """
+
+    def __init__(self, interval: float = 0.1, histogram=EVENT_LOOP_LAG_SECONDS):
+        self.interval = interval
+        self.histogram = histogram
+        self._task: asyncio.Task | None = None
+
+        self.samples = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            due = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, time.perf_counter() - due))
+
+    def record(self, lag: float) -> None:
+        self.samples += 1
+        self.total += lag
+        self.max = max(self.max, lag)
+        if self.histogram is not None:
+            self.histogram.observe(lag)
+
+    def as_dict(self) -> dict:
+        return {
+            "samples": self.samples,
+            "mean_ms": round(self.total / self.samples * 1000, 3) if self.samples else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -8,7 +8,12 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 from config import config
-from handlers import router
+from handlers import (
+    router, llm_client, role_storage, group_debouncer, stream_stats, response_cache, history_summarizer,
+    update_queue
+)
+from loop_monitor import LoopLagMonitor
+from metrics import start_metrics_server
 
 
 # Configure logging
@@ -40,16 +45,46 @@ async def main():
         BotCommand(command="setrole", description="Установить роль бота"),
         BotCommand(command="getrole", description="Посмотреть текущую роль"),
         BotCommand(command="deleterole", description="Удалить роль"),
+        BotCommand(command="historylimit", description="Лимит истории сообщений"),
     ]
     await bot.set_my_commands(commands, scope=BotCommandScopeDefault())
     logger.info("Bot commands set successfully")
 
+    # Event loop lag: time handlers and storage writes kept the loop from polling
+    loop_lag = LoopLagMonitor()
+    loop_lag.start()
+
+    metrics_runner = None
+    if config.metrics_port:
+        metrics_runner = await start_metrics_server(config.metrics_host, config.metrics_port)
+
     # Start polling
     try:
         logger.info("Bot started successfully!")
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        await loop_lag.aclose()
+        logger.info(f"Event loop lag: {loop_lag.as_dict()}")
+        if group_debouncer is not None:
+            await group_debouncer.aclose()
+        if update_queue is not None:
+            # The flushed bursts went to the queue: write them before the workers stop
+            await update_queue.aclose(drain=True)
+            logger.info(f"Update queue stats: {update_queue.as_dict()}")
+        if history_summarizer is not None:
+            await history_summarizer.aclose()
+            logger.info(f"History summary stats: {history_summarizer.stats}")
         await bot.session.close()
+        await llm_client.close()
+        await role_storage.aclose()
+        logger.info(f"Storage stats: {role_storage.stats.as_dict()}")
+        if config.stream_responses:
+            logger.info(f"Stream stats: {stream_stats.as_dict()}")
+        if response_cache is not None:
+            logger.info(f"Response cache stats: {response_cache.as_dict()}")
+            response_cache.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
@@ -2,15 +2,34 @@
 Multi-bot Telegram bot manager - runs multiple bots in a single process
 """
 import asyncio
+import hashlib
+import json
 import logging
+import os
+import signal
+import sys
+import time
+from contextlib import suppress
+from typing import Awaitable, Callable
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.enums import ParseMode
 from aiogram.types import BotCommand, BotCommandScopeDefault
 
-from multi_bot_config import load_config, BotConfig
-from multi_bot_handlers import BotHandlers
+from context_builder import ContextBuilder
+from database import atomic_write
+from health import BotHealth, HealthMonitor
+from multi_bot_config import load_config, BotConfig, MultiBotConfig
+from multi_bot_handlers import BotHandlers, create_router
 from llm_client import GroqClient
+from llm_scheduler import LLMScheduler, ScheduledLLMClient
+from loop_monitor import LoopLagMonitor
+from metrics import start_metrics_server
+from response_cache import ResponseCache
+from summarizer import HistorySummarizer
+from supervisor import Supervisor, worker_for_token
+from webhook_server import WebhookServer
 
 
 # Configure logging
@@ -20,21 +39,122 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Worker processes report their status to the supervisor this often
+WORKER_HEARTBEAT_INTERVAL = 5.0
 
-async def setup_bot_commands(bot: Bot, bot_name: str):
-    """Set bot commands for better UX"""
-    commands = [
-        BotCommand(command="start", description="Информация о боте"),
-        BotCommand(command="setrole", description="Установить роль бота"),
-        BotCommand(command="getrole", description="Посмотреть текущую роль"),
-        BotCommand(command="deleterole", description="Удалить роль"),
-    ]
-    await bot.set_my_commands(commands, scope=BotCommandScopeDefault())
+# A crashed bot is restarted after 1s, 2s, 4s, ... (capped); one that ran this long restarts fast again
+BOT_RESTART_BASE_DELAY = 1.0
+BOT_STABLE_AFTER = 60.0
+
+# Handlers of the bots currently running in this process, by bot name
+running_bots: dict[str, BotHandlers] = {}
+
+# Set on SIGTERM/SIGINT: bots stop instead of being restarted
+shutdown_event = asyncio.Event()
+
+
+BOT_COMMANDS = [
+    BotCommand(command="start", description="Информация о боте"),
+    BotCommand(command="setrole", description="Установить роль бота"),
+    BotCommand(command="getrole", description="Посмотреть текущую роль"),
+    BotCommand(command="deleterole", description="Удалить роль"),
+    BotCommand(command="historylimit", description="Лимит истории сообщений"),
+]
+COMMANDS_HASH = hashlib.sha256(
+    json.dumps([command.model_dump() for command in BOT_COMMANDS], ensure_ascii=False).encode("utf-8")
+).hexdigest()
+
+
+async def setup_bot_commands(bot: Bot, bot_name: str, data_dir: str | None = None):
+    """Set bot commands for better UX; skipped if the same commands were already set (hash kept in data_dir)"""
+    marker = None
+    if data_dir is not None:
+        token_hash = hashlib.md5(bot.token.encode()).hexdigest()[:8]
+        marker = os.path.join(data_dir, f"commands_{token_hash}.sha256")
+        with suppress(OSError), open(marker, encoding="utf-8") as f:
+            if f.read().strip() == COMMANDS_HASH:
+                logger.info(f"[{bot_name}] Commands unchanged, not setting them again")
+                return
+
+    await bot.set_my_commands(BOT_COMMANDS, scope=BotCommandScopeDefault())
     logger.info(f"[{bot_name}] Commands set successfully")
+    if marker is not None:
+        try:
+            atomic_write(marker, COMMANDS_HASH.encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"[{bot_name}] Could not remember the commands hash: {e}")
 
 
-async def run_bot(bot_config: BotConfig, groq_client: GroqClient, data_dir: str, history_limit: int):
-    """Run a single bot instance"""
+async def poll_until_shutdown(dp: Dispatcher, *bots: Bot) -> None:
+    """Long-poll until shutdown is requested; returns or raises earlier only if polling itself ends"""
+    polling = asyncio.create_task(dp.start_polling(
+        *bots,
+        allowed_updates=dp.resolve_used_update_types(),
+        handle_signals=False,
+        close_bot_session=False
+    ))
+    stopping = asyncio.create_task(shutdown_event.wait())
+    await asyncio.wait({polling, stopping}, return_when=asyncio.FIRST_COMPLETED)
+    stopping.cancel()
+    if not polling.done():
+        try:
+            await dp.stop_polling()
+        except RuntimeError:
+            # Shutdown arrived before polling started
+            polling.cancel()
+            await asyncio.wait({polling})
+            return
+    await polling
+
+
+async def keep_running(
+    name: str,
+    serve: Callable[[], Awaitable[None]],
+    health: list[BotHealth],
+    restart_max_delay: float = 60.0
+) -> None:
+    """Run serve() until shutdown, restarting it with exponential backoff when it crashes or stops early"""
+    failures = 0
+    while not shutdown_event.is_set():
+        started = time.monotonic()
+        try:
+            await serve()
+            if shutdown_event.is_set():
+                return
+            error: Exception = RuntimeError("stopped receiving updates")
+            logger.error(f"[{name}] Error: {error}")
+        except Exception as e:
+            if shutdown_event.is_set():
+                return
+            error = e
+            logger.error(f"[{name}] Error: {e}", exc_info=True)
+
+        # Quick successive crashes back off exponentially; a bot that ran for a while restarts fast
+        if time.monotonic() - started >= BOT_STABLE_AFTER:
+            failures = 0
+        delay = min(restart_max_delay, BOT_RESTART_BASE_DELAY * 2 ** failures)
+        failures += 1
+        for bot_health in health:
+            bot_health.record_crash(error)
+        logger.error(f"[{name}] Restarting in {delay:.1f}s")
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(shutdown_event.wait(), timeout=delay)
+
+
+async def run_bot(
+    bot_config: BotConfig,
+    llm_client: ScheduledLLMClient,
+    data_dir: str,
+    history_limit: int,
+    storage_options: dict | None = None,
+    response_cache: ResponseCache | None = None,
+    webhook_server: WebhookServer | None = None,
+    health_monitor: HealthMonitor | None = None,
+    restart_max_delay: float = 60.0,
+    summarizer: HistorySummarizer | None = None,
+    update_queue_options: dict | None = None
+):
+    """Run a single bot instance (long polling, or via the shared webhook server if given)"""
     logger.info(f"[{bot_config.name}] Starting bot...")
 
     # Initialize bot and dispatcher
@@ -44,28 +164,179 @@ async def run_bot(bot_config: BotConfig, groq_client: GroqClient, data_dir: str,
     )
     dp = Dispatcher()
 
-    # Create handlers for this bot
-    bot_handlers = BotHandlers(bot_config, groq_client, data_dir, history_limit)
+    # Create handlers for this bot (storage is loaded in a worker thread)
+    bot_handlers = await BotHandlers.create(
+        bot_config, llm_client, data_dir, history_limit, storage_options, response_cache, summarizer,
+        update_queue_options
+    )
+    running_bots[bot_config.name] = bot_handlers
+    if health_monitor is not None:
+        health_monitor.watch_session(bot)
+        health_monitor.add(bot_handlers.health, bot)
 
     # Register router with handlers
-    dp.include_router(bot_handlers.router)
+    dp.include_router(create_router(lambda _: bot_handlers))
 
-    # Set bot commands
-    await setup_bot_commands(bot, bot_config.name)
+    async def serve() -> None:
+        bot_handlers.health.state = "starting"
+        if webhook_server is not None:
+            await setup_bot_commands(bot, bot_config.name, data_dir)
+            bot_handlers.health.state = "running"
+            logger.info(f"[{bot_config.name}] Bot started successfully!")
+            await webhook_server.serve_bot(bot, dp, bot_config.name)
+        else:
+            # A webhook left over from webhook mode would make getUpdates fail
+            await asyncio.gather(setup_bot_commands(bot, bot_config.name, data_dir), bot.delete_webhook())
+            bot_handlers.health.state = "running"
+            logger.info(f"[{bot_config.name}] Bot started successfully!")
+            await poll_until_shutdown(dp, bot)
 
-    # Start polling
+    # Receive updates until shutdown; a crashed bot is restarted instead of staying dead
     try:
-        logger.info(f"[{bot_config.name}] Bot started successfully!")
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
-    except Exception as e:
-        logger.error(f"[{bot_config.name}] Error: {e}", exc_info=True)
+        await keep_running(bot_config.name, serve, [bot_handlers.health], restart_max_delay)
     finally:
+        bot_handlers.health.state = "stopped"
+        running_bots.pop(bot_config.name, None)
+        await bot_handlers.aclose()
         await bot.session.close()
+        log_bot_stats(bot_handlers)
         logger.info(f"[{bot_config.name}] Bot stopped")
 
 
+async def run_shared(
+    bot_configs: list[BotConfig],
+    llm_scheduler: LLMScheduler,
+    data_dir: str,
+    history_limit: int,
+    storage_options: dict | None = None,
+    response_cache: ResponseCache | None = None,
+    webhook_server: WebhookServer | None = None,
+    health_monitor: HealthMonitor | None = None,
+    restart_max_delay: float = 60.0,
+    summarizer: HistorySummarizer | None = None,
+    update_queue_options: dict | None = None
+):
+    """Run all bots on one Dispatcher and one Telegram HTTP session (multi-tenant mode)"""
+    logger.info(f"Starting {len(bot_configs)} bot(s) on a shared dispatcher...")
+
+    # One connection pool for all bots; requests carry the token in the URL, not the session
+    session = AiohttpSession()
+    default = DefaultBotProperties(parse_mode=ParseMode.HTML)
+
+    # Per-bot state, looked up by the id of the bot that received the update; storage of all
+    # bots is loaded in parallel in worker threads
+    bots = [Bot(token=bot_config.token, session=session, default=default) for bot_config in bot_configs]
+    all_handlers = await asyncio.gather(*(
+        BotHandlers.create(
+            bot_config,
+            llm_scheduler.for_bot(bot_config.name, bot_config.llm_weight),
+            data_dir,
+            history_limit,
+            storage_options,
+            response_cache,
+            summarizer,
+            update_queue_options
+        )
+        for bot_config in bot_configs
+    ))
+    handlers_by_bot_id: dict[int, BotHandlers] = {}
+    for bot, bot_config, bot_handlers in zip(bots, bot_configs, all_handlers):
+        handlers_by_bot_id[bot.id] = bot_handlers
+        running_bots[bot_config.name] = bot_handlers
+        if health_monitor is not None:
+            health_monitor.watch_session(bot)
+            health_monitor.add(bot_handlers.health, bot)
+
+    dp = Dispatcher()
+    dp.include_router(create_router(lambda bot: handlers_by_bot_id.get(bot.id)))
+    health = [bot_handlers.health for bot_handlers in handlers_by_bot_id.values()]
+
+    async def set_commands(bot: Bot, bot_config: BotConfig) -> None:
+        try:
+            await setup_bot_commands(bot, bot_config.name, data_dir)
+        except Exception as e:
+            logger.error(f"[{bot_config.name}] Could not set commands: {e}")
+
+    async def serve() -> None:
+        # One request per bot, all in flight at once (and skipped if the commands are unchanged)
+        await asyncio.gather(*(set_commands(bot, bot_config) for bot, bot_config in zip(bots, bot_configs)))
+
+        for bot_health in health:
+            bot_health.state = "running"
+        logger.info("Shared dispatcher started successfully!")
+        if webhook_server is not None:
+            # A TaskGroup cancels the other bots if one fails, so a restart starts from a clean slate
+            async with asyncio.TaskGroup() as group:
+                for bot, bot_config in zip(bots, bot_configs):
+                    group.create_task(webhook_server.serve_bot(bot, dp, bot_config.name))
+        else:
+            # A webhook left over from webhook mode would make getUpdates fail
+            await asyncio.gather(*(bot.delete_webhook() for bot in bots))
+            await poll_until_shutdown(dp, *bots)
+
+    # Receive updates until shutdown; if polling dies for any bot, the shared dispatcher is restarted
+    try:
+        await keep_running("shared dispatcher", serve, health, restart_max_delay)
+    finally:
+        for bot_handlers in handlers_by_bot_id.values():
+            bot_handlers.health.state = "stopped"
+            running_bots.pop(bot_handlers.bot_config.name, None)
+            await bot_handlers.aclose()
+            log_bot_stats(bot_handlers)
+        await session.close()
+        logger.info("Shared dispatcher stopped")
+
+
+def log_bot_stats(bot_handlers: BotHandlers) -> None:
+    """Log per-bot counters on shutdown"""
+    bot_config = bot_handlers.bot_config
+    logger.info(f"[{bot_config.name}] Storage stats: {bot_handlers.role_storage.stats.as_dict()}")
+    if bot_config.stream_responses:
+        logger.info(f"[{bot_config.name}] Stream stats: {bot_handlers.stream_stats.as_dict()}")
+    if bot_handlers.update_queue is not None:
+        logger.info(f"[{bot_config.name}] Update queue stats: {bot_handlers.update_queue.as_dict()}")
+
+
+async def report_worker_status(
+    llm_scheduler: LLMScheduler, groq_client: GroqClient, health_monitor: HealthMonitor, loop_lag: LoopLagMonitor
+) -> None:
+    """Print a JSON status line (heartbeat) for the supervisor every WORKER_HEARTBEAT_INTERVAL seconds"""
+    while True:
+        health_monitor.check_storage()
+        status = {
+            "running_bots": sorted(running_bots),
+            "groq": groq_client.stats,
+            "llm_scheduler": llm_scheduler.stats(),
+            "storage": {name: h.role_storage.stats.as_dict() for name, h in running_bots.items()},
+            "health": health_monitor.status(),
+            "loop_lag": loop_lag.as_dict(),
+        }
+        sys.stdout.write(json.dumps(status) + "\n")
+        sys.stdout.flush()
+        await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+
+async def run_supervisor(config: MultiBotConfig, bot_configs: list[BotConfig]) -> None:
+    """Split bots across worker processes and keep the workers running"""
+    shards: dict[int, list[str]] = {}
+    for bot_config in bot_configs:
+        shards.setdefault(worker_for_token(bot_config.token, config.workers), []).append(bot_config.name)
+    logger.info(f"Supervisor: {len(bot_configs)} bot(s) across {len(shards)} worker process(es)")
+
+    supervisor = Supervisor(
+        shards,
+        [sys.executable, os.path.abspath(__file__)],
+        host=config.supervisor_host,
+        port=config.supervisor_port,
+        health_port=config.health_port,
+        restart_max_delay=config.worker_restart_max_delay
+    )
+    await supervisor.run()
+
+
 async def main():
     """Start all bots"""
+    started_at = time.time()
     logger.info("=" * 60)
     logger.info("Multi-Bot Manager Starting")
     logger.info("=" * 60)
@@ -83,24 +354,159 @@ async def main():
         logger.error("No enabled bots found in configuration")
         return
 
+    # Supervisor mode: this process only starts and watches the worker processes
+    if config.workers > 1 and config.worker_index is None:
+        await run_supervisor(config, enabled_bots)
+        return
+
+    # Worker process: run only this worker's shard, with its share of the global LLM budgets
+    if config.worker_index is not None:
+        total_weight = sum(bot.llm_weight for bot in enabled_bots)
+        enabled_bots = [
+            bot for bot in enabled_bots
+            if worker_for_token(bot.token, config.workers) == config.worker_index
+        ]
+        if not enabled_bots:
+            logger.error(f"No bots assigned to worker {config.worker_index}")
+            return
+        share = sum(bot.llm_weight for bot in enabled_bots) / total_weight
+        config.llm_max_concurrency = max(1, round(config.llm_max_concurrency * share))
+        config.llm_requests_per_minute = max(1, round(config.llm_requests_per_minute * share))
+        config.llm_tokens_per_minute = max(1, round(config.llm_tokens_per_minute * share))
+        logger.info(f"Worker {config.worker_index}: {share:.0%} of the LLM budget")
+
     logger.info(f"Loaded configuration for {len(enabled_bots)} enabled bot(s)")
     for bot in enabled_bots:
         logger.info(f"  - {bot.name}")
 
-    # Create shared Groq client
-    groq_client = GroqClient(api_key=config.groq_api_key, proxy=config.proxy_url)
+    # Prompt token budget: keep the newest history that fits, truncate oversized messages
+    context_builder = None
+    if config.groq_max_input_tokens > 0:
+        context_builder = ContextBuilder(config.groq_max_input_tokens, config.groq_max_message_tokens)
+
+    # Create shared Groq client (one pooled HTTP session for all bots, opened on first request)
+    groq_client = GroqClient(
+        api_key=config.groq_api_key,
+        proxy=config.proxy_url,
+        pool_limit_per_host=config.groq_pool_limit_per_host,
+        keepalive_timeout=config.groq_keepalive_timeout,
+        dns_cache_ttl=config.groq_dns_cache_ttl,
+        max_retries=config.groq_max_retries,
+        request_deadline=config.groq_request_deadline,
+        context_builder=context_builder
+    )
     logger.info("Groq client initialized")
 
-    # Create tasks for all bots
-    tasks = [
-        run_bot(bot_config, groq_client, config.data_dir, config.chat_history_limit)
-        for bot_config in enabled_bots
-    ]
+    # Shared scheduler: global concurrency and rate budgets, fair share per bot
+    llm_scheduler = LLMScheduler(
+        groq_client,
+        max_concurrency=config.llm_max_concurrency,
+        requests_per_minute=config.llm_requests_per_minute,
+        tokens_per_minute=config.llm_tokens_per_minute,
+        max_wait=config.llm_max_wait_seconds
+    )
+
+    # Shared response cache for bots that allow repeating comments (role is part of the key)
+    response_cache = None
+    if any(bot_config.cache_responses for bot_config in enabled_bots):
+        response_cache = ResponseCache(groq_client.model, **config.response_cache_options)
+
+    # Rolling summary of old chat history: one background batcher for the chats of all bots.
+    # Each bot queues its chats with its scheduled client, so summaries share the LLM budgets
+    summarizer = None
+    if config.history_summary:
+        summarizer = HistorySummarizer(groq_client, **config.history_summary_options)
+
+    # Webhook mode: one HTTP server for all bots instead of a long-poll loop per bot
+    webhook_server = None
+    if config.update_mode == "webhook":
+        webhook_server = WebhookServer(
+            config.webhook_base_url,
+            host=config.webhook_host,
+            port=config.webhook_port,
+            secret=config.webhook_secret
+        )
+        await webhook_server.start()
+
+    # SIGTERM/SIGINT stop every bot (and the webhook server) instead of triggering restarts
+    def request_shutdown() -> None:
+        logger.info("Received shutdown signal")
+        shutdown_event.set()
+        if webhook_server is not None:
+            webhook_server.request_stop()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, request_shutdown)
+
+    # Event loop lag: all bots share this loop, anything blocking it delays all of them
+    loop_lag = LoopLagMonitor()
+    loop_lag.start()
+
+    # Health: per-bot polling/LLM state and data directory writability
+    health_monitor = HealthMonitor(
+        config.data_dir, config.update_mode, config.health_stale_after, started_at, len(enabled_bots)
+    )
+    health_monitor.check_storage()
+
+    # Create tasks for all bots: one shared dispatcher, or a dispatcher per bot
+    if config.shared_dispatcher:
+        tasks = [
+            run_shared(
+                enabled_bots,
+                llm_scheduler,
+                config.data_dir,
+                config.chat_history_limit,
+                config.storage_options,
+                response_cache,
+                webhook_server,
+                health_monitor,
+                config.bot_restart_max_delay,
+                summarizer,
+                config.update_queue_options
+            )
+        ]
+    else:
+        tasks = [
+            run_bot(
+                bot_config,
+                llm_scheduler.for_bot(bot_config.name, bot_config.llm_weight),
+                config.data_dir,
+                config.chat_history_limit,
+                config.storage_options,
+                response_cache,
+                webhook_server,
+                health_monitor,
+                config.bot_restart_max_delay,
+                summarizer,
+                config.update_queue_options
+            )
+            for bot_config in enabled_bots
+        ]
 
     logger.info("=" * 60)
-    logger.info(f"Starting {len(tasks)} bot instance(s)...")
+    logger.info(f"Starting {len(enabled_bots)} bot instance(s)...")
     logger.info("=" * 60)
 
+    # Each worker process serves its own metrics on the next ports after metrics_port
+    metrics_runner = None
+    if config.metrics_port:
+        metrics_port = config.metrics_port
+        if config.worker_index is not None:
+            metrics_port += 1 + config.worker_index
+        metrics_runner = await start_metrics_server(config.metrics_host, metrics_port)
+
+    # Health endpoints; worker processes report their health to the supervisor instead
+    health_runner = None
+    if config.health_port and config.worker_index is None:
+        health_runner = await health_monitor.start_server(config.health_host, config.health_port)
+
+    # Worker processes report to the supervisor
+    heartbeat_task = None
+    if config.worker_index is not None:
+        heartbeat_task = asyncio.create_task(report_worker_status(llm_scheduler, groq_client, health_monitor, loop_lag))
+
     # Run all bots concurrently
     try:
         await asyncio.gather(*tasks)
@@ -109,6 +515,26 @@ async def main():
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
     finally:
+        if heartbeat_task is not None:
+            heartbeat_task.cancel()
+        await loop_lag.aclose()
+        logger.info(f"Event loop lag: {loop_lag.as_dict()}")
+        if summarizer is not None:
+            await summarizer.aclose()
+            logger.info(f"History summary stats: {summarizer.stats}")
+        if webhook_server is not None:
+            await webhook_server.stop()
+            logger.info(f"Webhook server stats: {webhook_server.as_dict()}")
+        logger.info(f"LLM scheduler stats: {llm_scheduler.stats()}")
+        logger.info(f"Groq client stats: {groq_client.stats}")
+        if response_cache is not None:
+            logger.info(f"Response cache stats: {response_cache.as_dict()}")
+            response_cache.close()
+        await groq_client.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if health_runner is not None:
+            await health_runner.cleanup()
         logger.info("All bots stopped")
 
 
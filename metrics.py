@@ -0,0 +1,257 @@
+"""Minimal Prometheus-style metrics: counters, gauges and histograms with pre-bound label children"""
+import bisect
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds: Telegram/Groq calls range from ~50ms to tens of seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values: str):
+        """Return the child for these label values, creating it once (bind it outside hot paths)"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def remove(self, *values: str) -> None:
+        self._children.pop(tuple(str(value) for value in values), None)
+
+    @abstractmethod
+    def _new_child(self):
+        """Create the child holding the value(s) of one label combination"""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(_format_labels(self.labelnames, values), values, child))
+        return lines
+
+    def _render_child(self, labels: str, values: tuple[str, ...], child) -> list[str]:
+        return [f"{self.name}{labels} {child.get()}"]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def get(self) -> float:
+        return self.value
+
+
+class Counter(_Metric):
+    """Monotonically increasing value"""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Callable[[], float] | None = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute the value at scrape time instead (for queue depths, sizes and other state)"""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception as e:
+                logger.debug(f"Gauge callback failed: {e}")
+                return float("nan")
+        return self.value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or is computed at scrape time"""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        registry=None
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, labels: str, values: tuple[str, ...], child: _HistogramChild) -> list[str]:
+        lines = []
+        cumulative = 0
+        bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, child.counts):
+            cumulative += count
+            bucket_labels = _format_labels(self.labelnames, values, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# Per-bot pipeline: update received -> LLM request -> LLM response -> sent -> persisted
+UPDATES = Counter("bot_updates_total", "Group messages accepted for commenting", ["bot"])
+COMMENTS = Counter("bot_comments_total", "Comment attempts by outcome", ["bot", "result"])
+STAGE_SECONDS = Histogram(
+    "bot_stage_seconds",
+    "Time spent per comment stage (prepare, llm, send, persist, total)",
+    ["bot", "stage"]
+)
+DELETE_FAILURES = Counter("bot_delete_failures_total", "Failed deletions of the previous comment", ["bot"])
+HISTORY_MESSAGES = Histogram(
+    "bot_history_messages", "Chat history messages sent with a request", ["bot"], buckets=SIZE_BUCKETS
+)
+STORAGE_FLUSH_SECONDS = Histogram("bot_storage_flush_seconds", "Storage write/commit duration", ["bot"])
+LLM_QUEUE_DEPTH = Gauge("bot_llm_queue_depth", "Requests waiting for an LLM scheduler slot", ["bot"])
+DEBOUNCE_PENDING = Gauge("bot_debounce_pending_chats", "Chats with a message burst waiting to be flushed", ["bot"])
+UPDATE_QUEUE_DEPTH = Gauge("bot_update_queue_depth", "Group messages waiting for a comment worker", ["bot"])
+UPDATE_QUEUE_BUSY = Gauge("bot_update_queue_busy_workers", "Comment workers processing a message", ["bot"])
+UPDATE_QUEUE_SHED = Counter("bot_update_queue_shed_total", "Group messages dropped because the queue was full", ["bot"])
+UPDATE_QUEUE_WAIT_SECONDS = Histogram(
+    "bot_update_queue_wait_seconds", "Time a group message waited for a comment worker", ["bot"]
+)
+STARTUP_SECONDS = Gauge("bot_startup_seconds", "Time from process start to the bot's first getUpdates request", ["bot"])
+
+# Groq API (shared client)
+GROQ_REQUEST_SECONDS = Histogram("groq_request_seconds", "Duration of one Groq HTTP attempt")
+GROQ_RESPONSES = Counter("groq_responses_total", "Groq HTTP attempts by status code (0 = network error)", ["status"])
+GROQ_RETRIES = Counter("groq_retries_total", "Retried Groq attempts")
+GROQ_INPUT_TOKENS = Histogram(
+    "groq_input_tokens", "Estimated prompt tokens per Groq request", buckets=TOKEN_BUCKETS
+)
+
+# Event loop of this process
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds", "How late a periodic timer fired (time the event loop was blocked)", buckets=LAG_BUCKETS
+)
+
+
+class BotMetrics:
+    """Label children of the per-bot metrics, bound once so the hot path only increments"""
+
+    def __init__(self, bot_name: str):
+        self.updates = UPDATES.labels(bot_name)
+        self.comments_ok = COMMENTS.labels(bot_name, "ok")
+        self.comments_shed = COMMENTS.labels(bot_name, "shed")
+        self.comments_superseded = COMMENTS.labels(bot_name, "superseded")
+        self.comments_llm_error = COMMENTS.labels(bot_name, "llm_error")
+        self.comments_error = COMMENTS.labels(bot_name, "error")
+        self.prepare_seconds = STAGE_SECONDS.labels(bot_name, "prepare")
+        self.llm_seconds = STAGE_SECONDS.labels(bot_name, "llm")
+        self.send_seconds = STAGE_SECONDS.labels(bot_name, "send")
+        self.persist_seconds = STAGE_SECONDS.labels(bot_name, "persist")
+        self.total_seconds = STAGE_SECONDS.labels(bot_name, "total")
+        self.delete_failures = DELETE_FAILURES.labels(bot_name)
+        self.history_messages = HISTORY_MESSAGES.labels(bot_name)
+        self.storage_flush_seconds = STORAGE_FLUSH_SECONDS.labels(bot_name)
+        self.llm_queue_depth = LLM_QUEUE_DEPTH.labels(bot_name)
+        self.debounce_pending = DEBOUNCE_PENDING.labels(bot_name)
+        self.update_queue_depth = UPDATE_QUEUE_DEPTH.labels(bot_name)
+        self.update_queue_busy = UPDATE_QUEUE_BUSY.labels(bot_name)
+        self.update_queue_shed = UPDATE_QUEUE_SHED.labels(bot_name)
+        self.update_queue_wait_seconds = UPDATE_QUEUE_WAIT_SECONDS.labels(bot_name)
+
+
+async def start_metrics_server(host: str, port: int, registry: Registry = REGISTRY) -> web.AppRunner:
+    """Serve GET /metrics in the Prometheus text format; returns the runner to clean up on shutdown"""
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,28 @@
+"""Migrate JSON role storage files to the SQLite backend"""
+import glob
+import os
+import sqlite3
+import sys
+
+from sqlite_storage import SCHEMA, migrate_json_to_sqlite
+
+
+def migrate(data_dir: str) -> None:
+    for json_filename in sorted(glob.glob(os.path.join(data_dir, "role_*.json"))):
+        db_filename = json_filename[:-len(".json")] + ".db"
+        if os.path.exists(db_filename):
+            print(f"Skipping {json_filename}: {db_filename} already exists")
+            continue
+
+        conn = sqlite3.connect(db_filename)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            chats = migrate_json_to_sqlite(json_filename, conn)
+        finally:
+            conn.close()
+        print(f"Migrated {json_filename} -> {db_filename} ({chats} chats)")
+
+
+if __name__ == "__main__":
+    migrate(sys.argv[1] if len(sys.argv) > 1 else os.environ.get("DATA_DIR", "/data"))
@@ -1,6 +1,8 @@
 """Multi-bot configuration management"""
 import os
-from pydantic import BaseModel, Field, field_validator
+from typing import Literal
+
+from pydantic import BaseModel, Field, field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -13,6 +15,13 @@ class BotConfig(BaseModel):
     use_reply: bool = Field(False, description="Use reply instead of answer")
     delete_previous: bool = Field(True, description="Delete previous bot messages before sending new ones")
     channel_id: int | None = Field(None, description="Only reply to messages from this channel ID (optional)")
+    debounce_seconds: float = Field(0.0, description="Coalesce messages arriving within this window (0 = off)")
+    debounce_max_batch: int = Field(10, description="Max messages coalesced into one comment")
+    llm_weight: float = Field(1.0, description="Share of the LLM budget relative to other bots")
+    stream_responses: bool = Field(False, description="Send the comment early and edit it while it is generated")
+    stream_edit_interval: float = Field(1.5, description="Min seconds between edits of a streamed comment")
+    cache_responses: bool = Field(False, description="Reuse comments generated for identical or similar messages")
+    supersede: bool = Field(False, description="Cancel a comment still being generated when a newer message arrives")
 
     @property
     def admin_ids_list(self) -> list[int]:
@@ -33,6 +42,103 @@ class MultiBotConfig(BaseSettings):
     data_dir: str = Field("/data", description="Directory for persistent data")
     chat_history_limit: int = Field(20, description="Max number of messages to keep in chat history")
 
+    # Groq HTTP connection pool (one long-lived session shared by all bots)
+    groq_pool_limit_per_host: int = Field(10, description="Max open connections to the Groq API host")
+    groq_keepalive_timeout: float = Field(30.0, description="Seconds to keep an idle Groq connection open for reuse")
+    groq_dns_cache_ttl: int = Field(300, description="Seconds to cache resolved DNS entries for the Groq API")
+
+    # Groq retries (429/5xx/timeouts, honouring Retry-After)
+    groq_max_retries: int = Field(3, description="Max retries per Groq request")
+    groq_request_deadline: float = Field(45.0, description="Total seconds per Groq request including retries")
+
+    # Prompt token budget: newest history first, long messages truncated
+    groq_max_input_tokens: int = Field(4000, description="Max estimated prompt tokens per request (0 = no limit)")
+    groq_max_message_tokens: int = Field(1000, description="Max estimated tokens of a single message in the prompt")
+
+    # Group message queue per bot: bounded concurrency, per-chat ordering, oldest messages dropped when full
+    update_workers: int = Field(4, description="Comments generated concurrently per bot (0 = no queue)")
+    update_queue_max_pending: int = Field(100, description="Max messages waiting for a worker per bot")
+    update_queue_max_per_chat: int = Field(3, description="Max messages waiting per chat")
+
+    # Rolling summary: old history is folded into a running summary by a small model, off the request path
+    history_summary: bool = Field(False, description="Enable rolling summarization of chat history")
+    history_summary_model: str = Field("llama-3.1-8b-instant", description="Model that writes the summaries")
+    history_summary_threshold: int = Field(16, description="Summarize a chat once its history has this many messages")
+    history_summary_keep: int = Field(8, description="Newest messages kept verbatim when older ones are folded")
+    history_summary_interval: float = Field(10.0, description="Seconds between summarization batches")
+    history_summary_batch_size: int = Field(20, description="Max chats per batch across all bots")
+
+    # LLM scheduler (shared by all bots)
+    llm_max_concurrency: int = Field(4, description="Max Groq requests in flight across all bots")
+    llm_requests_per_minute: int = Field(30, description="Groq request budget per minute across all bots")
+    llm_tokens_per_minute: int = Field(12000, description="Groq token budget per minute across all bots")
+    llm_max_wait_seconds: float = Field(30.0, description="Drop requests that waited longer than this")
+
+    # Storage persistence (write-behind batches per-message writes into periodic flushes)
+    storage_backend: Literal["json", "sqlite", "log"] = Field(
+        "json", description="Storage backend: JSON file, SQLite database or append-only log per bot"
+    )
+    storage_write_behind: bool = Field(True, description="Batch storage writes in a background flusher")
+    storage_flush_interval_ms: int = Field(1000, description="Max delay before a pending change is written")
+    storage_flush_max_mutations: int = Field(50, description="Flush early after this many pending changes")
+    storage_write_thread: bool = Field(True, description="Encode and write the JSON file in a background thread")
+    storage_format: Literal["json", "json+zstd", "msgpack", "msgpack+zstd"] = Field(
+        "json", description="JSON backend file encoding (msgpack and zstd need their packages installed)"
+    )
+    storage_zstd_level: int = Field(3, description="zstd compression level for the +zstd formats")
+
+    # Hot chat history cache (sqlite backend): cold chats are loaded on demand
+    history_cache_max_chats: int = Field(1000, description="Max chats kept in memory per bot")
+    history_cache_max_bytes: int = Field(
+        16 * 1024 * 1024, description="Approximate max memory for cached histories per bot"
+    )
+    history_cache_ttl: float = Field(600.0, description="Seconds before an idle chat is evicted from memory")
+
+    # Streamed comments (enabled per bot with BOT_STREAM_RESPONSES)
+    stream_edit_interval: float = Field(
+        1.5, description="Min seconds between edits of a streamed comment (Telegram rate-limits edits)"
+    )
+
+    # Response cache (shared by bots with BOT_CACHE_RESPONSES enabled)
+    response_cache_max_entries: int = Field(1000, description="Max cached comments kept in memory")
+    response_cache_ttl: float = Field(86400.0, description="Seconds a cached comment can be reused")
+    response_cache_similarity: float = Field(
+        0.0, description="Reuse comments of near-duplicate messages at this similarity, 0-1 (0 = exact only)"
+    )
+    response_cache_match_history: bool = Field(
+        False, description="Include chat history in the cache key (only reuse within identical context)"
+    )
+    response_cache_persist: bool = Field(False, description="Also keep cached comments on disk under data_dir")
+
+    # Multi-tenant mode: one Dispatcher, one handler set and one Telegram HTTP session for all bots
+    shared_dispatcher: bool = Field(False, description="Serve all bots from a single shared dispatcher")
+
+    # Update delivery: long polling per bot, or one webhook server for all bots
+    update_mode: Literal["polling", "webhook"] = Field("polling", description="How bots receive updates")
+    webhook_base_url: str = Field("", description="Public HTTPS URL of the webhook server (webhook mode)")
+    webhook_host: str = Field("0.0.0.0", description="Interface the webhook server listens on")
+    webhook_port: int = Field(8080, description="Port the webhook server listens on")
+    webhook_secret: str = Field("", description="Extra secret mixed into per-bot webhook secret tokens")
+
+    # Prometheus metrics endpoint (GET /metrics); worker N of a supervisor uses metrics_port + 1 + N
+    metrics_port: int = Field(0, description="Port of the metrics endpoint (0 = off)")
+    metrics_host: str = Field("0.0.0.0", description="Interface the metrics endpoint listens on")
+
+    # Health checks (GET /healthz, /readyz) and automatic restart of bots whose polling loop died
+    health_port: int = Field(8081, description="Port of the health endpoints (0 = off)")
+    health_host: str = Field("0.0.0.0", description="Interface the health endpoints listen on")
+    health_stale_after: float = Field(
+        120.0, description="Seconds without a getUpdates call/success before a bot is not live/ready"
+    )
+    bot_restart_max_delay: float = Field(60.0, description="Max seconds between restarts of a crashed bot")
+
+    # Supervisor mode: bots are split across worker processes by a stable hash of their token
+    workers: int = Field(1, description="Number of worker processes (1 = run all bots in this process)")
+    worker_index: int | None = Field(None, description="Set by the supervisor for its worker processes")
+    supervisor_host: str = Field("0.0.0.0", description="Interface of the supervisor status endpoint")
+    supervisor_port: int = Field(8090, description="Port of the supervisor status endpoint (GET /status)")
+    worker_restart_max_delay: float = Field(60.0, description="Max seconds between restarts of a failing worker")
+
     # Bot tokens as comma-separated string
     bot_tokens: str = Field(..., description="Comma-separated bot tokens")
 
@@ -54,6 +160,24 @@ class MultiBotConfig(BaseSettings):
     # Optional: Channel IDs for specific bots (comma-separated channel IDs, matches bot order)
     bot_channel_ids: str = Field("", description="Comma-separated channel IDs for each bot (empty = all messages)")
 
+    # Optional: LLM budget weights for specific bots (comma-separated, matches bot order)
+    bot_llm_weights: str = Field("", description="Comma-separated LLM scheduling weights (default 1)")
+
+    # Optional: Debounce window in seconds for specific bots (comma-separated, matches bot order)
+    bot_debounce_seconds: str = Field("", description="Comma-separated debounce windows in seconds (0 = off)")
+
+    # Optional: Max messages per coalesced burst for specific bots (comma-separated, matches bot order)
+    bot_debounce_max_batch: str = Field("", description="Comma-separated max messages per coalesced burst")
+
+    # Optional: Stream comments for specific bots (comma-separated true/false, matches bot order)
+    bot_stream_responses: str = Field("", description="Comma-separated true/false for each bot")
+
+    # Optional: Cache comments for specific bots (comma-separated true/false, matches bot order)
+    bot_cache_responses: str = Field("", description="Comma-separated true/false for each bot")
+
+    # Optional: Let newer messages supersede comments still being generated (comma-separated true/false)
+    bot_supersede: str = Field("", description="Comma-separated true/false for each bot")
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -67,6 +191,62 @@ class MultiBotConfig(BaseSettings):
             raise ValueError("BOT_TOKENS must contain at least one bot token")
         return v
 
+    @model_validator(mode="after")
+    def validate_update_mode(self) -> "MultiBotConfig":
+        if self.update_mode == "webhook" and not self.webhook_base_url:
+            raise ValueError("WEBHOOK_BASE_URL is required when UPDATE_MODE=webhook")
+        if self.update_mode == "webhook" and self.workers > 1:
+            # Telegram can't be told which worker process serves which bot behind one URL
+            raise ValueError("UPDATE_MODE=webhook is not supported with WORKERS > 1")
+        return self
+
+    @property
+    def storage_options(self) -> dict:
+        """Keyword arguments for RoleStorage persistence settings"""
+        return {
+            "backend": self.storage_backend,
+            "write_behind": self.storage_write_behind,
+            "flush_interval_ms": self.storage_flush_interval_ms,
+            "flush_max_mutations": self.storage_flush_max_mutations,
+            "write_thread": self.storage_write_thread,
+            "file_format": self.storage_format,
+            "zstd_level": self.storage_zstd_level,
+            "cache_max_chats": self.history_cache_max_chats,
+            "cache_max_bytes": self.history_cache_max_bytes,
+            "cache_ttl": self.history_cache_ttl,
+        }
+
+    @property
+    def update_queue_options(self) -> dict:
+        """Keyword arguments for ChatWorkQueue settings"""
+        return {
+            "workers": self.update_workers,
+            "max_pending": self.update_queue_max_pending,
+            "max_pending_per_chat": self.update_queue_max_per_chat,
+        }
+
+    @property
+    def response_cache_options(self) -> dict:
+        """Keyword arguments for ResponseCache settings"""
+        return {
+            "max_entries": self.response_cache_max_entries,
+            "ttl": self.response_cache_ttl,
+            "similarity_threshold": self.response_cache_similarity,
+            "match_history": self.response_cache_match_history,
+            "data_dir": self.data_dir if self.response_cache_persist else None,
+        }
+
+    @property
+    def history_summary_options(self) -> dict:
+        """Keyword arguments for HistorySummarizer settings"""
+        return {
+            "model": self.history_summary_model,
+            "threshold": self.history_summary_threshold,
+            "keep_recent": self.history_summary_keep,
+            "interval": self.history_summary_interval,
+            "batch_size": self.history_summary_batch_size,
+        }
+
     def get_bots(self) -> list[BotConfig]:
         """Parse environment variables into list of BotConfig objects"""
         # Parse tokens
@@ -133,6 +313,78 @@ class MultiBotConfig(BaseSettings):
         if len(channel_ids_list) != len(tokens):
             channel_ids_list = [None] * len(tokens)
 
+        # Parse debounce_seconds settings (optional)
+        debounce_seconds_list = []
+        if self.bot_debounce_seconds:
+            for s in self.bot_debounce_seconds.split(","):
+                try:
+                    debounce_seconds_list.append(max(0.0, float(s.strip())))
+                except ValueError:
+                    debounce_seconds_list.append(0.0)
+        # If not provided or count mismatch, use default (0 = disabled)
+        if len(debounce_seconds_list) != len(tokens):
+            debounce_seconds_list = [0.0] * len(tokens)
+
+        # Parse debounce_max_batch settings (optional)
+        debounce_max_batch_list = []
+        if self.bot_debounce_max_batch:
+            for s in self.bot_debounce_max_batch.split(","):
+                try:
+                    debounce_max_batch_list.append(max(1, int(s.strip())))
+                except ValueError:
+                    debounce_max_batch_list.append(10)
+        # If not provided or count mismatch, use default (10)
+        if len(debounce_max_batch_list) != len(tokens):
+            debounce_max_batch_list = [10] * len(tokens)
+
+        # Parse llm_weights settings (optional)
+        llm_weights_list = []
+        if self.bot_llm_weights:
+            for s in self.bot_llm_weights.split(","):
+                try:
+                    llm_weights_list.append(max(0.01, float(s.strip())))
+                except ValueError:
+                    llm_weights_list.append(1.0)
+        # If not provided or count mismatch, use default (1.0)
+        if len(llm_weights_list) != len(tokens):
+            llm_weights_list = [1.0] * len(tokens)
+
+        # Parse stream_responses settings (optional)
+        stream_responses_list = []
+        if self.bot_stream_responses:
+            stream_responses_list = [
+                s.strip().lower() == "true"
+                for s in self.bot_stream_responses.split(",")
+                if s.strip()
+            ]
+        # If not provided or count mismatch, use default (False)
+        if len(stream_responses_list) != len(tokens):
+            stream_responses_list = [False] * len(tokens)
+
+        # Parse cache_responses settings (optional)
+        cache_responses_list = []
+        if self.bot_cache_responses:
+            cache_responses_list = [
+                s.strip().lower() == "true"
+                for s in self.bot_cache_responses.split(",")
+                if s.strip()
+            ]
+        # If not provided or count mismatch, use default (False)
+        if len(cache_responses_list) != len(tokens):
+            cache_responses_list = [False] * len(tokens)
+
+        # Parse supersede settings (optional)
+        supersede_list = []
+        if self.bot_supersede:
+            supersede_list = [
+                s.strip().lower() == "true"
+                for s in self.bot_supersede.split(",")
+                if s.strip()
+            ]
+        # If not provided or count mismatch, use default (False)
+        if len(supersede_list) != len(tokens):
+            supersede_list = [False] * len(tokens)
+
         # Create BotConfig for each token
         bots = []
         for i, token in enumerate(tokens):
@@ -143,7 +395,14 @@ class MultiBotConfig(BaseSettings):
                 enable_history=enable_history_list[i],
                 use_reply=use_reply_list[i],
                 delete_previous=delete_previous_list[i],
-                channel_id=channel_ids_list[i]
+                channel_id=channel_ids_list[i],
+                debounce_seconds=debounce_seconds_list[i],
+                debounce_max_batch=debounce_max_batch_list[i],
+                llm_weight=llm_weights_list[i],
+                stream_responses=stream_responses_list[i],
+                stream_edit_interval=self.stream_edit_interval,
+                cache_responses=cache_responses_list[i],
+                supersede=supersede_list[i]
             ))
 
         return bots
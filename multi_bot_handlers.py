@@ -1,34 +1,134 @@
 """Bot message handlers for multi-bot setup"""
-from aiogram import Router, F
+from typing import Any, Awaitable, Callable, Sequence
+
+from aiogram import Bot, Router, F
 from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
 from aiogram.enums import ChatType
+import asyncio
 import logging
-
-from database import RoleStorage
-from llm_client import GroqClient
+import time
+
+from chat_history import HistoryEntry
+from database import create_role_storage, open_role_storage
+from debounce import ChatDebouncer
+from health import BotHealth
+from llm_client import GroqAPIError, GroqClient
+from llm_scheduler import LLMRequestShed, ScheduledLLMClient
+from metrics import BotMetrics
 from multi_bot_config import BotConfig
+from response_cache import CachedLLMClient, ResponseCache
+from streaming import StreamStats, send_streamed_comment
+from summarizer import HistorySummarizer, history_with_summary
+from update_queue import ChatLocks, ChatWorkQueue
 
 logger = logging.getLogger(__name__)
 
 
 class BotHandlers:
-    """Handler factory for individual bot instances"""
-
-    def __init__(self, bot_config: BotConfig, groq_client: GroqClient, data_dir: str, history_limit: int = 20):
+    """Per-bot state (config, storage, LLM client) and handlers for one bot instance"""
+
+    def __init__(
+        self,
+        bot_config: BotConfig,
+        groq_client: GroqClient | ScheduledLLMClient,
+        data_dir: str,
+        history_limit: int = 20,
+        storage_options: dict | None = None,
+        response_cache: ResponseCache | None = None,
+        summarizer: HistorySummarizer | None = None,
+        update_queue_options: dict | None = None,
+        role_storage: Any = None
+    ):
         self.bot_config = bot_config
         self.groq_client = groq_client
-        self.router = Router()
 
-        # Each bot has its own storage
-        self.role_storage = RoleStorage(
+        # Shared rolling summarizer: folds old history of this bot's chats in the background
+        self.summarizer = summarizer if bot_config.enable_history else None
+
+        # Each bot has its own storage (already opened if created with BotHandlers.create)
+        self.role_storage = role_storage if role_storage is not None else create_role_storage(
             bot_token=bot_config.token,
             data_dir=data_dir,
-            history_limit=history_limit
+            history_limit=history_limit,
+            **(storage_options or {})
         )
 
-        # Register handlers
-        self._register_handlers()
+        # Bounded worker pool for group comments: per-chat ordering, oldest messages shed when full
+        self.update_queue: ChatWorkQueue | None = None
+        if update_queue_options and update_queue_options.get("workers", 0) > 0:
+            self.update_queue = ChatWorkQueue(
+                callback=self._comment_on_messages, name=bot_config.name, **update_queue_options
+            )
+
+        # One comment at a time per chat, in arrival order; newer messages may supersede
+        # a comment that is still being generated (chat_id -> generation task)
+        self.chat_locks = ChatLocks()
+        self._generations: dict[int, asyncio.Task] = {}
+
+        # Optional per-chat debounce: bursts of messages get a single combined comment
+        self.debouncer: ChatDebouncer | None = None
+        if bot_config.debounce_seconds > 0:
+            self.debouncer = ChatDebouncer(
+                window=bot_config.debounce_seconds,
+                max_batch=bot_config.debounce_max_batch,
+                callback=self._queue_burst if self.update_queue is not None else self._comment_on_messages
+            )
+
+        # Group comments go through the shared response cache when enabled for this bot
+        self.comment_client = groq_client
+        if response_cache is not None and bot_config.cache_responses:
+            self.comment_client = CachedLLMClient(groq_client, response_cache)
+
+        # Streamed comments: time to first visible text and edit counters
+        self.stream_stats = StreamStats()
+
+        # Metrics: label children are bound here so handlers only increment/observe
+        self.metrics = BotMetrics(bot_config.name)
+        self.role_storage.stats.flush_histogram = self.metrics.storage_flush_seconds
+        if isinstance(groq_client, ScheduledLLMClient):
+            self.metrics.llm_queue_depth.set_function(
+                lambda: groq_client.scheduler.queue_depth(groq_client.bot_name)
+            )
+        if self.debouncer is not None:
+            self.metrics.debounce_pending.set_function(lambda: self.debouncer.pending_chats)
+        if self.update_queue is not None:
+            self.update_queue.shed_counter = self.metrics.update_queue_shed
+            self.update_queue.wait_histogram = self.metrics.update_queue_wait_seconds
+            self.metrics.update_queue_depth.set_function(lambda: self.update_queue.depth)
+            self.metrics.update_queue_busy.set_function(lambda: self.update_queue.busy_workers)
+
+        # Health: polling state is filled in by main_multi, LLM results by the handlers
+        self.health = BotHealth(bot_config.name)
+
+    @classmethod
+    async def create(
+        cls,
+        bot_config: BotConfig,
+        groq_client: GroqClient | ScheduledLLMClient,
+        data_dir: str,
+        history_limit: int = 20,
+        storage_options: dict | None = None,
+        *args: Any,
+        **kwargs: Any
+    ) -> "BotHandlers":
+        """Same as the constructor, but the storage is loaded in a worker thread instead of on the event loop"""
+        role_storage = await open_role_storage(bot_config.token, data_dir, history_limit, **(storage_options or {}))
+        return cls(
+            bot_config, groq_client, data_dir, history_limit, storage_options, *args,
+            role_storage=role_storage, **kwargs
+        )
+
+    async def aclose(self) -> None:
+        """Flush pending message bursts, stop the workers and close storage"""
+        if self.debouncer is not None:
+            await self.debouncer.aclose()
+        if self.update_queue is not None:
+            # The flushed bursts went to the queue: write them before the workers stop
+            await self.update_queue.aclose(drain=True)
+        if self.summarizer is not None:
+            self.summarizer.forget(self.role_storage)
+        await self.role_storage.aclose()
 
     def _is_admin(self, user_id: int) -> bool:
         """Check if user is admin for this bot"""
@@ -38,209 +138,414 @@ class BotHandlers:
             return True
         return user_id in admin_ids
 
-    def _register_handlers(self):
-        """Register all message handlers for this bot"""
-
-        @self.router.message(Command("start"))
-        async def cmd_start(message: Message):
-            """Handle /start command"""
-            await message.answer(
-                f"Привет! Я {self.bot_config.name} - бот, который комментирует сообщения в группах.\n\n"
-                "Команды:\n"
-                "/setrole &lt;текст роли&gt; - установить роль для этого бота\n"
-                "/getrole - посмотреть текущую роль\n"
-                "/deleterole - удалить роль (вернуться к стандартной)\n\n"
-                "Добавь меня в группу, и я буду комментировать сообщения!"
+    async def _queue_burst(self, messages: list[Message]) -> None:
+        """Debouncer callback: hand a flushed burst to the worker queue"""
+        self.update_queue.submit(messages[-1].chat.id, messages)
+
+    async def _delete_previous(self, bot: Bot, chat_id: int, message_id: int) -> bool:
+        """Delete the bot's previous comment in a chat; False if Telegram refused"""
+        try:
+            await bot.delete_message(chat_id=chat_id, message_id=message_id)
+        except Exception as e:
+            self.metrics.delete_failures.inc()
+            logger.warning(
+                f"[{self.bot_config.name}] Could not delete previous message "
+                f"{message_id} in chat {chat_id}: {e}"
             )
-
-        @self.router.message(Command("setrole"))
-        async def cmd_set_role(message: Message, command: CommandObject):
-            """Set bot role (admin only)"""
-            if not self._is_admin(message.from_user.id):
-                await message.answer("У вас нет прав для выполнения этой команды.")
-                logger.warning(
-                    f"[{self.bot_config.name}] Unauthorized setrole attempt from user {message.from_user.id}"
+            return False
+        logger.info(
+            f"[{self.bot_config.name}] Deleted previous comment "
+            f"(message_id={message_id}) in chat {chat_id}"
+        )
+        return True
+
+    def _supersede(self, chat_id: int) -> None:
+        """Cancel the comment still being generated in a chat: a newer message makes it stale"""
+        generation = self._generations.pop(chat_id, None)
+        if generation is not None and not generation.done():
+            generation.cancel()
+            self.metrics.comments_superseded.inc()
+            logger.info(f"[{self.bot_config.name}] Newer message superseded the pending comment in chat {chat_id}")
+
+    async def _generate(
+        self,
+        chat_id: int,
+        role: str,
+        user_message: str,
+        chat_history: Sequence[HistoryEntry] | None
+    ) -> str | None:
+        """Generate a comment; None if a newer message superseded it (see _supersede)"""
+        if not self.bot_config.supersede:
+            return await self.comment_client.generate_comment(role, user_message, chat_history)
+
+        # Own task, so _supersede can cancel the LLM call without touching the caller
+        generation = asyncio.create_task(self.comment_client.generate_comment(role, user_message, chat_history))
+        self._generations[chat_id] = generation
+        try:
+            return await generation
+        except asyncio.CancelledError:
+            if not generation.cancelled() or asyncio.current_task().cancelling():
+                raise
+            return None
+        finally:
+            if self._generations.get(chat_id) is generation:
+                del self._generations[chat_id]
+
+    async def _comment_on_messages(self, messages: list[Message]) -> None:
+        """Generate and send one comment for one or more group messages from the same chat"""
+        # Comments of one chat are written one at a time, so each deletes its predecessor
+        async with self.chat_locks.hold(messages[-1].chat.id):
+            await self._write_comment(messages)
+
+    async def _write_comment(self, messages: list[Message]) -> None:
+        # Comment on the latest message; earlier ones in a burst are combined into one prompt
+        message = messages[-1]
+        chat_id = message.chat.id
+        role = self.role_storage.get_role()
+        user_message = "\n\n".join(m.text for m in messages)
+        metrics = self.metrics
+        start = time.perf_counter()
+
+        if len(messages) > 1:
+            logger.info(f"[{self.bot_config.name}] Coalesced {len(messages)} messages in chat {chat_id}")
+
+        # Delete the previous bot comment (if enabled) while the new one is generated
+        deletion: asyncio.Task | None = None
+        if self.bot_config.delete_previous:
+            last_message_id = self.role_storage.get_last_message_id(chat_id)
+            if last_message_id:
+                deletion = asyncio.create_task(self._delete_previous(message.bot, chat_id, last_message_id))
+
+        # Send comment as reply or answer based on config
+        reply = message.reply if self.bot_config.use_reply else message.answer
+
+        async def send(text: str) -> Message:
+            # The old comment goes away before the new one appears
+            if deletion is not None:
+                await deletion
+            return await reply(text)
+
+        recorded = False
+        try:
+            # Get chat history for context if enabled
+            chat_history = None
+            if self.bot_config.enable_history:
+                chat_history = history_with_summary(self.role_storage, chat_id)
+                metrics.history_messages.observe(len(chat_history))
+
+            llm_start = time.perf_counter()
+            metrics.prepare_seconds.observe(llm_start - start)
+
+            if self.bot_config.stream_responses:
+                # Show the comment as soon as its first words arrive, then edit it as it grows
+                # (generation and sending overlap, so the whole stream counts as the llm stage)
+                comment, sent_message = await send_streamed_comment(
+                    self.comment_client.stream_comment(role, user_message, chat_history),
+                    send,
+                    self.bot_config.stream_edit_interval,
+                    self.stream_stats
                 )
-                return
+                persist_start = time.perf_counter()
+                metrics.llm_seconds.observe(persist_start - llm_start)
+                self.health.record_llm(ok=True)
+            else:
+                # Generate comment using LLM with chat history
+                comment = await self._generate(chat_id, role, user_message, chat_history)
+                if comment is None:
+                    return
+                send_start = time.perf_counter()
+                metrics.llm_seconds.observe(send_start - llm_start)
+                self.health.record_llm(ok=True)
+                sent_message = await send(comment)
+                persist_start = time.perf_counter()
+                metrics.send_seconds.observe(persist_start - send_start)
+
+            # Store the ID of the new comment and (if history is enabled) the exchange in one write
+            exchange = (user_message, comment) if self.bot_config.enable_history else None
+            self.role_storage.record_comment(chat_id, sent_message.message_id, exchange)
+            recorded = True
+            if exchange is not None and self.summarizer is not None:
+                self.summarizer.note(self.role_storage, chat_id, self.groq_client)
+            end = time.perf_counter()
+            metrics.persist_seconds.observe(end - persist_start)
+            metrics.total_seconds.observe(end - start)
+            metrics.comments_ok.inc()
 
-            if not command.args:
-                await message.answer(
-                    "Использование: /setrole &lt;текст роли&gt;\n\n"
-                    "Пример:\n"
-                    "/setrole Ты опытный психолог, который дает мотивирующие комментарии к целям людей"
-                )
-                return
+            logger.info(
+                f"[{self.bot_config.name}] Commented in chat {chat_id} "
+                f"(message_id={sent_message.message_id})"
+            )
 
-            role = command.args
-            self.role_storage.set_role(role)
-
-            await message.answer(f"Роль установлена!\n\n{role}")
-            logger.info(f"[{self.bot_config.name}] Role set by user {message.from_user.id}: {role[:50]}...")
-
-        @self.router.message(Command("getrole"))
-        async def cmd_get_role(message: Message):
-            """Get current bot role"""
-            role = self.role_storage.get_role()
-            await message.answer(f"Текущая роль {self.bot_config.name}:\n\n{role}")
-
-        @self.router.message(Command("deleterole"))
-        async def cmd_delete_role(message: Message):
-            """Reset to default role (admin only)"""
-            if not self._is_admin(message.from_user.id):
-                await message.answer("У вас нет прав для выполнения этой команды.")
-                logger.warning(
-                    f"[{self.bot_config.name}] Unauthorized deleterole attempt from user {message.from_user.id}"
-                )
-                return
+        except LLMRequestShed as e:
+            # Overloaded: skip this comment instead of posting an error into the group
+            metrics.comments_shed.inc()
+            logger.warning(f"[{self.bot_config.name}] Skipped comment in chat {chat_id}: {e}")
+
+        except GroqAPIError as e:
+            metrics.comments_llm_error.inc()
+            self.health.record_llm(ok=False)
+            logger.error(f"[{self.bot_config.name}] Error generating comment: {e}")
+            # Rate limits and outages are temporary: don't add an error message to the group
+            if not e.retryable:
+                await message.answer("Извини, произошла ошибка при генерации комментария.")
 
-            self.role_storage.delete_role()
+        except Exception as e:
+            metrics.comments_error.inc()
+            logger.error(f"[{self.bot_config.name}] Error generating comment: {e}", exc_info=True)
+            await message.answer("Извини, произошла ошибка при генерации комментария.")
+
+        finally:
+            # No new comment replaced the ID of the deleted one (or of one that could not be
+            # deleted, which might have been deleted manually): forget it so it is not tried again
+            if deletion is not None and not recorded:
+                await deletion
+                self.role_storage.clear_last_message_id(chat_id)
+
+    async def cmd_start(self, message: Message):
+        """Handle /start command"""
+        await message.answer(
+            f"Привет! Я {self.bot_config.name} - бот, который комментирует сообщения в группах.\n\n"
+            "Команды:\n"
+            "/setrole &lt;текст роли&gt; - установить роль для этого бота\n"
+            "/getrole - посмотреть текущую роль\n"
+            "/deleterole - удалить роль (вернуться к стандартной)\n"
+            "/historylimit &lt;число&gt; - сколько сообщений помнить в каждом чате\n\n"
+            "Добавь меня в группу, и я буду комментировать сообщения!"
+        )
 
-            await message.answer("Роль сброшена на стандартную.")
-            logger.info(f"[{self.bot_config.name}] Role deleted by user {message.from_user.id}")
+    async def cmd_set_role(self, message: Message, command: CommandObject):
+        """Set bot role (admin only)"""
+        if not self._is_admin(message.from_user.id):
+            await message.answer("У вас нет прав для выполнения этой команды.")
+            logger.warning(
+                f"[{self.bot_config.name}] Unauthorized setrole attempt from user {message.from_user.id}"
+            )
+            return
 
-        @self.router.message(
-            F.chat.type.in_({ChatType.GROUP, ChatType.SUPERGROUP}),
-            F.text
-        )
-        async def handle_group_message(message: Message):
-            """Handle messages in groups"""
-            # Skip if message is a command
-            if message.text and message.text.startswith("/"):
-                return
+        if not command.args:
+            await message.answer(
+                "Использование: /setrole &lt;текст роли&gt;\n\n"
+                "Пример:\n"
+                "/setrole Ты опытный психолог, который дает мотивирующие комментарии к целям людей"
+            )
+            return
 
-            # Skip if message is from a bot user (not channel)
-            # Allow messages from channels (sender_chat is set but from_user might be None or a bot)
-            if message.from_user and message.from_user.is_bot and not message.sender_chat:
-                return
+        role = command.args
+        self.role_storage.set_role(role)
 
-            # If channel_id is configured, only respond to messages from that specific channel
-            if self.bot_config.channel_id is not None:
-                if not message.sender_chat or message.sender_chat.id != self.bot_config.channel_id:
-                    logger.debug(
-                        f"[{self.bot_config.name}] Ignoring message: not from configured "
-                        f"channel {self.bot_config.channel_id}"
-                    )
-                    return
+        await message.answer(f"Роль установлена!\n\n{role}")
+        logger.info(f"[{self.bot_config.name}] Role set by user {message.from_user.id}: {role[:50]}...")
 
-            chat_id = message.chat.id
-            role = self.role_storage.get_role()
-            user_message = message.text
-
-            # Log message source for debugging
-            if message.sender_chat:
-                logger.info(
-                    f"[{self.bot_config.name}] Processing message from channel/chat: "
-                    f"{message.sender_chat.title} (id={message.sender_chat.id})"
-                )
-            elif message.from_user:
-                logger.info(
-                    f"[{self.bot_config.name}] Processing message from user: "
-                    f"{message.from_user.username or message.from_user.id}"
-                )
+    async def cmd_get_role(self, message: Message):
+        """Get current bot role"""
+        role = self.role_storage.get_role()
+        await message.answer(f"Текущая роль {self.bot_config.name}:\n\n{role}")
 
-            try:
-                # Delete previous bot comment if it exists and deletion is enabled
-                if self.bot_config.delete_previous:
-                    last_message_id = self.role_storage.get_last_message_id(chat_id)
-                    if last_message_id:
-                        try:
-                            await message.bot.delete_message(chat_id=chat_id, message_id=last_message_id)
-                            logger.info(
-                                f"[{self.bot_config.name}] Deleted previous comment "
-                                f"(message_id={last_message_id}) in chat {chat_id}"
-                            )
-                        except Exception as e:
-                            logger.warning(
-                                f"[{self.bot_config.name}] Could not delete previous message "
-                                f"{last_message_id} in chat {chat_id}: {e}"
-                            )
-                            # Clear the stored message_id if deletion failed
-                            self.role_storage.clear_last_message_id(chat_id)
-
-                # Get chat history for context if enabled
-                chat_history = None
-                if self.bot_config.enable_history:
-                    chat_history = self.role_storage.get_chat_history(chat_id)
+    async def cmd_delete_role(self, message: Message):
+        """Reset to default role (admin only)"""
+        if not self._is_admin(message.from_user.id):
+            await message.answer("У вас нет прав для выполнения этой команды.")
+            logger.warning(
+                f"[{self.bot_config.name}] Unauthorized deleterole attempt from user {message.from_user.id}"
+            )
+            return
 
-                # Generate comment using LLM with chat history
-                comment = await self.groq_client.generate_comment(role, user_message, chat_history)
+        self.role_storage.delete_role()
 
-                # Send comment as reply or answer based on config
-                if self.bot_config.use_reply:
-                    sent_message = await message.reply(comment)
-                else:
-                    sent_message = await message.answer(comment)
+        await message.answer("Роль сброшена на стандартную.")
+        logger.info(f"[{self.bot_config.name}] Role deleted by user {message.from_user.id}")
 
-                # Add user message and bot response to chat history if enabled
-                if self.bot_config.enable_history:
-                    self.role_storage.add_message_to_history(chat_id, "user", user_message)
-                    self.role_storage.add_message_to_history(chat_id, "assistant", comment)
+    async def cmd_history_limit(self, message: Message, command: CommandObject):
+        """Show or change how many messages are kept per chat (admin only)"""
+        if not self._is_admin(message.from_user.id):
+            await message.answer("У вас нет прав для выполнения этой команды.")
+            logger.warning(
+                f"[{self.bot_config.name}] Unauthorized historylimit attempt from user {message.from_user.id}"
+            )
+            return
 
-                # Store the message ID of the new comment
-                self.role_storage.set_last_message_id(chat_id, sent_message.message_id)
+        if not command.args:
+            await message.answer(
+                f"Текущий лимит истории: {self.role_storage.history_limit}\n\n"
+                "Использование: /historylimit &lt;число&gt;"
+            )
+            return
 
-                logger.info(
-                    f"[{self.bot_config.name}] Commented in chat {chat_id} "
-                    f"(message_id={sent_message.message_id})"
-                )
+        try:
+            history_limit = int(command.args.strip())
+        except ValueError:
+            history_limit = 0
+        if history_limit < 1:
+            await message.answer("Лимит должен быть положительным числом.")
+            return
 
-            except Exception as e:
-                logger.error(f"[{self.bot_config.name}] Error generating comment: {e}", exc_info=True)
-                await message.answer("Извини, произошла ошибка при генерации комментария.")
+        self.role_storage.set_history_limit(history_limit)
 
-        @self.router.message(
-            F.chat.type == ChatType.PRIVATE,
-            F.text
+        await message.answer(f"Лимит истории установлен: {history_limit}")
+        logger.info(
+            f"[{self.bot_config.name}] History limit set to {history_limit} by user {message.from_user.id}"
         )
-        async def handle_private_message(message: Message):
-            """Handle messages in private chat"""
-            if message.text and message.text.startswith("/"):
-                return
 
-            # Check if user is admin
-            if not self._is_admin(message.from_user.id):
-                await message.answer(
-                    f"Я {self.bot_config.name} и работаю в групповых чатах! "
-                    "Добавь меня в группу, чтобы я комментировал сообщения.\n\n"
-                    "Используй /start для списка команд."
+    async def handle_group_message(self, message: Message):
+        """Handle messages in groups"""
+        # Skip if message is a command
+        if message.text and message.text.startswith("/"):
+            return
+
+        # Skip if message is from a bot user (not channel)
+        # Allow messages from channels (sender_chat is set but from_user might be None or a bot)
+        if message.from_user and message.from_user.is_bot and not message.sender_chat:
+            return
+
+        # If channel_id is configured, only respond to messages from that specific channel
+        if self.bot_config.channel_id is not None:
+            if not message.sender_chat or message.sender_chat.id != self.bot_config.channel_id:
+                logger.debug(
+                    f"[{self.bot_config.name}] Ignoring message: not from configured "
+                    f"channel {self.bot_config.channel_id}"
                 )
                 return
 
-            # Admin user - process message with LLM considering bot's role
-            user_message = message.text
-            role = self.role_storage.get_role()
-
+        # Log message source for debugging
+        if message.sender_chat:
             logger.info(
-                f"[{self.bot_config.name}] Processing private message from admin "
+                f"[{self.bot_config.name}] Processing message from channel/chat: "
+                f"{message.sender_chat.title} (id={message.sender_chat.id})"
+            )
+        elif message.from_user:
+            logger.info(
+                f"[{self.bot_config.name}] Processing message from user: "
                 f"{message.from_user.username or message.from_user.id}"
             )
 
-            try:
-                # Get chat history for context if enabled
-                chat_id = message.chat.id
-                chat_history = None
-                if self.bot_config.enable_history:
-                    chat_history = self.role_storage.get_chat_history(chat_id)
+        self.metrics.updates.inc()
 
-                # Generate response using LLM with bot's role
-                response = await self.groq_client.generate_comment(role, user_message, chat_history)
+        # A comment still being generated for an older message is stale now
+        if self.bot_config.supersede:
+            self._supersede(message.chat.id)
 
-                # Send response
-                await message.answer(response)
+        # Coalesce bursts into a single comment when debouncing is enabled
+        if self.debouncer is not None:
+            self.debouncer.submit(message.chat.id, message)
+            return
 
-                # Add to chat history if enabled
-                if self.bot_config.enable_history:
-                    self.role_storage.add_message_to_history(chat_id, "user", user_message)
-                    self.role_storage.add_message_to_history(chat_id, "assistant", response)
+        # Bounded concurrency: the update handler returns at once, a worker writes the comment
+        if self.update_queue is not None:
+            self.update_queue.submit(message.chat.id, [message])
+            return
 
-                logger.info(
-                    f"[{self.bot_config.name}] Responded to admin in private chat "
-                    f"(user_id={message.from_user.id})"
-                )
+        await self._comment_on_messages([message])
 
-            except Exception as e:
-                logger.error(
-                    f"[{self.bot_config.name}] Error generating response for admin: {e}",
-                    exc_info=True
-                )
-                await message.answer("Извини, произошла ошибка при генерации ответа.")
+    async def handle_private_message(self, message: Message):
+        """Handle messages in private chat"""
+        if message.text and message.text.startswith("/"):
+            return
+
+        # Check if user is admin
+        if not self._is_admin(message.from_user.id):
+            await message.answer(
+                f"Я {self.bot_config.name} и работаю в групповых чатах! "
+                "Добавь меня в группу, чтобы я комментировал сообщения.\n\n"
+                "Используй /start для списка команд."
+            )
+            return
+
+        # Admin user - process message with LLM considering bot's role
+        user_message = message.text
+        role = self.role_storage.get_role()
+
+        logger.info(
+            f"[{self.bot_config.name}] Processing private message from admin "
+            f"{message.from_user.username or message.from_user.id}"
+        )
+
+        try:
+            # Get chat history for context if enabled
+            chat_id = message.chat.id
+            chat_history = None
+            if self.bot_config.enable_history:
+                chat_history = history_with_summary(self.role_storage, chat_id)
+
+            # Generate response using LLM with bot's role
+            response = await self.groq_client.generate_comment(role, user_message, chat_history)
+            self.health.record_llm(ok=True)
+
+            # Send response
+            await message.answer(response)
+
+            # Add to chat history if enabled
+            if self.bot_config.enable_history:
+                self.role_storage.add_exchange(chat_id, user_message, response)
+                if self.summarizer is not None:
+                    self.summarizer.note(self.role_storage, chat_id, self.groq_client)
+
+            logger.info(
+                f"[{self.bot_config.name}] Responded to admin in private chat "
+                f"(user_id={message.from_user.id})"
+            )
+
+        except Exception as e:
+            logger.error(
+                f"[{self.bot_config.name}] Error generating response for admin: {e}",
+                exc_info=True
+            )
+            await message.answer("Извини, произошла ошибка при генерации ответа.")
+
+
+def create_router(get_handlers: Callable[[Bot], BotHandlers | None]) -> Router:
+    """
+    Router serving one or many bots
+
+    Handlers are registered once; the BotHandlers of the bot that received the update is
+    looked up with get_handlers and passed to them. Updates for unknown bots are dropped.
+    """
+    router = Router()
+
+    @router.message.outer_middleware()
+    async def resolve_bot_handlers(
+        handler: Callable[[Message, dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: dict[str, Any]
+    ) -> Any:
+        bot_handlers = get_handlers(data["bot"])
+        if bot_handlers is None:
+            logger.warning(f"Dropping update for unknown bot {data['bot'].id}")
+            return None
+        data["bot_handlers"] = bot_handlers
+        return await handler(event, data)
+
+    @router.message(Command("start"))
+    async def cmd_start(message: Message, bot_handlers: BotHandlers):
+        await bot_handlers.cmd_start(message)
+
+    @router.message(Command("setrole"))
+    async def cmd_set_role(message: Message, command: CommandObject, bot_handlers: BotHandlers):
+        await bot_handlers.cmd_set_role(message, command)
+
+    @router.message(Command("getrole"))
+    async def cmd_get_role(message: Message, bot_handlers: BotHandlers):
+        await bot_handlers.cmd_get_role(message)
+
+    @router.message(Command("deleterole"))
+    async def cmd_delete_role(message: Message, bot_handlers: BotHandlers):
+        await bot_handlers.cmd_delete_role(message)
+
+    @router.message(Command("historylimit"))
+    async def cmd_history_limit(message: Message, command: CommandObject, bot_handlers: BotHandlers):
+        await bot_handlers.cmd_history_limit(message, command)
+
+    @router.message(
+        F.chat.type.in_({ChatType.GROUP, ChatType.SUPERGROUP}),
+        F.text
+    )
+    async def handle_group_message(message: Message, bot_handlers: BotHandlers):
+        await bot_handlers.handle_group_message(message)
+
+    @router.message(
+        F.chat.type == ChatType.PRIVATE,
+        F.text
+    )
+    async def handle_private_message(message: Message, bot_handlers: BotHandlers):
+        await bot_handlers.handle_private_message(message)
+
+    return router
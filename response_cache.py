@@ -0,0 +1,342 @@
+"""Cache of generated comments for repeated and near-identical messages"""
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import struct
+import time
+from collections import Counter, OrderedDict
+from typing import AsyncIterator, Sequence
+
+from chat_history import HistoryEntry, estimate_tokens
+from llm_client import GroqClient
+from llm_scheduler import ScheduledLLMClient
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# MinHash: NUM_PERMUTATIONS hash values per shingle, split into LSH bands of BAND_ROWS values each
+NUM_PERMUTATIONS = 64
+BAND_ROWS = 4
+SHINGLE_SIZE = 4
+# Near-duplicate candidates scored per lookup (the ones sharing the most LSH bands)
+MAX_CANDIDATES = 16
+SHINGLE_HASHES = struct.Struct(f"<{NUM_PERMUTATIONS}I")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    key TEXT PRIMARY KEY,
+    context TEXT NOT NULL,
+    message TEXT NOT NULL,
+    comment TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS response_cache_expires_at ON response_cache (expires_at);
+"""
+
+
+def normalize_message(message: str) -> str:
+    """Case-fold and collapse whitespace so trivially different reposts share a key"""
+    return WHITESPACE_PATTERN.sub(" ", message.casefold()).strip()
+
+
+def minhash_signature(normalized: str) -> tuple[int, ...]:
+    """MinHash signature over character shingles of a normalized message"""
+    if len(normalized) <= SHINGLE_SIZE:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    # One SHAKE digest gives all NUM_PERMUTATIONS hash values of a shingle; take column-wise minima
+    hashes = (
+        SHINGLE_HASHES.unpack(hashlib.shake_128(shingle.encode()).digest(SHINGLE_HASHES.size))
+        for shingle in shingles
+    )
+    return tuple(map(min, zip(*hashes)))
+
+
+def estimated_similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class _CachedComment:
+    __slots__ = ("context", "normalized", "comment", "expires_at", "signature")
+
+    def __init__(self, context: str, normalized: str, comment: str, expires_at: float):
+        self.context = context
+        self.normalized = normalized
+        self.comment = comment
+        self.expires_at = expires_at
+        self.signature: tuple[int, ...] | None = None
+
+
+class ResponseCache:
+    """
+    Bounded LRU/TTL cache of generated comments, keyed by (model, role, normalized message)
+
+    Optionally the chat history is part of the key too. With a similarity threshold set,
+    a message that is not an exact match can reuse the comment of a near-duplicate
+    (MinHash over character shingles, LSH banding to find candidates). With a
+    data_dir, entries are also kept in an SQLite file and survive restarts.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        max_entries: int = 1000,
+        ttl: float = 86400.0,
+        similarity_threshold: float = 0.0,
+        match_history: bool = False,
+        data_dir: str | None = None,
+        disk_max_entries: int = 20000,
+    ):
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.match_history = match_history
+        self.disk_max_entries = disk_max_entries
+
+        self._entries: OrderedDict[str, _CachedComment] = OrderedDict()
+        # (context, band index, band values) -> keys of entries in that LSH bucket
+        self._buckets: dict[tuple, set[str]] = {}
+
+        self.hits = 0
+        self.near_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_tokens = 0
+
+        self._conn: sqlite3.Connection | None = None
+        self._puts = 0
+        if data_dir is not None:
+            os.makedirs(data_dir, exist_ok=True)
+            self.filename = os.path.join(data_dir, "response_cache.db")
+            self._conn = sqlite3.connect(self.filename)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._load()
+
+    def _context(self, role: str, chat_history: Sequence[HistoryEntry] | None) -> str:
+        """Hash of everything besides the message that the comment depends on"""
+        context = hashlib.sha256()
+        context.update(self.model.encode())
+        context.update(b"\0")
+        context.update(role.encode())
+        if self.match_history and chat_history:
+            for entry in chat_history:
+                context.update(b"\0%d\0" % entry.role)
+                context.update(entry.content.encode())
+        return context.hexdigest()
+
+    @staticmethod
+    def _key(context: str, normalized: str) -> str:
+        return hashlib.sha256(f"{context}\0{normalized}".encode()).hexdigest()
+
+    def get(self, role: str, message: str, chat_history: Sequence[HistoryEntry] | None = None) -> str | None:
+        """Return a cached comment for this message (or a near-duplicate), or None on miss"""
+        context = self._context(role, chat_history)
+        normalized = normalize_message(message)
+        key = self._key(context, normalized)
+
+        cached = self._lookup(key)
+        if cached is not None:
+            self.hits += 1
+        else:
+            cached = self._lookup_disk(key)
+            if cached is not None:
+                self.hits += 1
+                self.disk_hits += 1
+            elif self.similarity_threshold > 0:
+                cached = self._lookup_similar(context, normalized)
+                if cached is not None:
+                    self.hits += 1
+                    self.near_hits += 1
+
+        if cached is None:
+            self.misses += 1
+            return None
+
+        # Tokens the skipped request would have used: the prompt plus the comment
+        saved_tokens = estimate_tokens(role) + estimate_tokens(message) + estimate_tokens(cached.comment)
+        if chat_history:
+            saved_tokens += sum(entry.tokens for entry in chat_history)
+        self.saved_tokens += saved_tokens
+        return cached.comment
+
+    def put(
+        self,
+        role: str,
+        message: str,
+        chat_history: Sequence[HistoryEntry] | None,
+        comment: str
+    ) -> None:
+        """Cache a generated comment"""
+        context = self._context(role, chat_history)
+        normalized = normalize_message(message)
+        key = self._key(context, normalized)
+        expires_at = time.time() + self.ttl
+        self._insert(key, _CachedComment(context, normalized, comment, expires_at))
+
+        if self._conn is not None:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, context, message, comment, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, context, normalized, comment, expires_at)
+            )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._prune_disk()
+            self._conn.commit()
+
+    def _lookup(self, key: str) -> _CachedComment | None:
+        cached = self._entries.get(key)
+        if cached is None:
+            return None
+        if cached.expires_at <= time.time():
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        return cached
+
+    def _lookup_disk(self, key: str) -> _CachedComment | None:
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT context, message, comment, expires_at FROM response_cache WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        cached = _CachedComment(*row)
+        self._insert(key, cached)
+        return cached
+
+    def _lookup_similar(self, context: str, normalized: str) -> _CachedComment | None:
+        """Best near-duplicate in the same context at or above the similarity threshold"""
+        signature = minhash_signature(normalized)
+        shared_bands: Counter[str] = Counter()
+        for band in range(0, NUM_PERMUTATIONS, BAND_ROWS):
+            shared_bands.update(self._buckets.get((context, band, signature[band:band + BAND_ROWS]), ()))
+
+        best_key, best_similarity = None, self.similarity_threshold
+        for key, _ in shared_bands.most_common(MAX_CANDIDATES):
+            similarity = estimated_similarity(signature, self._entries[key].signature)
+            if similarity >= best_similarity:
+                best_key, best_similarity = key, similarity
+        if best_key is None:
+            return None
+        return self._lookup(best_key)
+
+    def _insert(self, key: str, cached: _CachedComment) -> None:
+        if key in self._entries:
+            self._evict(key, count=False)
+        if self.similarity_threshold > 0:
+            cached.signature = minhash_signature(cached.normalized)
+            for band in range(0, NUM_PERMUTATIONS, BAND_ROWS):
+                self._buckets.setdefault(
+                    (cached.context, band, cached.signature[band:band + BAND_ROWS]), set()
+                ).add(key)
+        self._entries[key] = cached
+
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str, count: bool = True) -> None:
+        cached = self._entries.pop(key)
+        if cached.signature is not None:
+            for band in range(0, NUM_PERMUTATIONS, BAND_ROWS):
+                bucket_key = (cached.context, band, cached.signature[band:band + BAND_ROWS])
+                bucket = self._buckets.get(bucket_key)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._buckets[bucket_key]
+        if count:
+            self.evictions += 1
+
+    def _load(self) -> None:
+        """Drop expired rows and warm the memory tier with the freshest ones"""
+        self._prune_disk()
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT key, context, message, comment, expires_at FROM response_cache "
+            "ORDER BY expires_at DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        for key, *fields in reversed(rows):
+            self._insert(key, _CachedComment(*fields))
+        if rows:
+            logger.info(f"Loaded {len(rows)} cached comment(s) from {self.filename}")
+
+    def _prune_disk(self) -> None:
+        self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        self._conn.execute(
+            "DELETE FROM response_cache WHERE key NOT IN "
+            "(SELECT key FROM response_cache ORDER BY expires_at DESC LIMIT ?)",
+            (self.disk_max_entries,)
+        )
+
+    def close(self) -> None:
+        """Close the on-disk tier"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def as_dict(self) -> dict:
+        """Return cache counters as a plain dict (for logs and metrics)"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_tokens": self.saved_tokens,
+        }
+
+
+class CachedLLMClient:
+    """GroqClient-compatible client that answers repeated messages from a ResponseCache"""
+
+    def __init__(self, client: GroqClient | ScheduledLLMClient, cache: ResponseCache):
+        self.client = client
+        self.cache = cache
+
+    async def generate_comment(
+        self,
+        role: str,
+        message: str,
+        chat_history: Sequence[HistoryEntry] | None = None
+    ) -> str:
+        """Return a cached comment, or generate one and cache it"""
+        comment = self.cache.get(role, message, chat_history)
+        if comment is not None:
+            return comment
+        comment = await self.client.generate_comment(role, message, chat_history)
+        self.cache.put(role, message, chat_history, comment)
+        return comment
+
+    async def stream_comment(
+        self,
+        role: str,
+        message: str,
+        chat_history: Sequence[HistoryEntry] | None = None
+    ) -> AsyncIterator[str]:
+        """Yield a cached comment in one chunk, or stream a new one and cache it once complete"""
+        comment = self.cache.get(role, message, chat_history)
+        if comment is not None:
+            yield comment
+            return
+
+        chunks = []
+        async for chunk in self.client.stream_comment(role, message, chat_history):
+            chunks.append(chunk)
+            yield chunk
+        self.cache.put(role, message, chat_history, "".join(chunks))
@@ -0,0 +1,113 @@
+"""Encodings of the JSON storage file: compact JSON (default) or msgpack, optionally in a zstd frame"""
+import importlib
+import json
+from typing import Any
+
+# First bytes of a zstd frame
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# The stored data is a map: msgpack starts it with a fixmap (0x80-0x8f), map16 or map32 marker
+MSGPACK_MAP_MARKERS = frozenset(range(0x80, 0x90)) | {0xDE, 0xDF}
+
+STORAGE_FORMATS = ("json", "json+zstd", "msgpack", "msgpack+zstd")
+
+
+class StorageFormatError(RuntimeError):
+    """A storage format needs a package that is not installed"""
+
+
+def _require(module: str) -> Any:
+    """Import an optional dependency, failing loudly (never fall back to an empty storage)"""
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise StorageFormatError(
+            f"The {module} package is required for this storage format: pip install {module}"
+        ) from e
+
+
+class JSONSerializer:
+    """Compact UTF-8 JSON: no indentation or spaces after separators"""
+
+    name = "json"
+
+    def dumps(self, data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, raw: bytes) -> Any:
+        return json.loads(raw)
+
+
+class MsgpackSerializer:
+    """msgpack: binary, integer chat IDs stay integers"""
+
+    name = "msgpack"
+
+    def __init__(self):
+        self._msgpack = _require("msgpack")
+
+    def dumps(self, data: Any) -> bytes:
+        return self._msgpack.packb(data, use_bin_type=True)
+
+    def loads(self, raw: bytes) -> Any:
+        # Errors (truncated or trailing data, bad markers) are ValueErrors
+        return self._msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+class ZstdSerializer:
+    """Another serializer's output in a zstd frame"""
+
+    def __init__(self, inner: JSONSerializer | MsgpackSerializer, level: int = 3):
+        self._zstd = _require("zstandard")
+        self.inner = inner
+        self.level = level
+        self.name = f"{inner.name}+zstd"
+
+    def dumps(self, data: Any) -> bytes:
+        return self._zstd.ZstdCompressor(level=self.level).compress(self.inner.dumps(data))
+
+    def loads(self, raw: bytes) -> Any:
+        return self.inner.loads(_decompress(raw))
+
+
+Serializer = JSONSerializer | MsgpackSerializer | ZstdSerializer
+
+
+def get_serializer(file_format: str = "json", zstd_level: int = 3) -> Serializer:
+    """Serializer for a STORAGE_FORMAT value ("json", "msgpack", either with "+zstd")"""
+    base, _, compression = file_format.partition("+")
+    if base == "json":
+        serializer = JSONSerializer()
+    elif base == "msgpack":
+        serializer = MsgpackSerializer()
+    else:
+        raise ValueError(f"Unknown storage format: {file_format}")
+
+    if compression == "zstd":
+        return ZstdSerializer(serializer, zstd_level)
+    if compression:
+        raise ValueError(f"Unknown storage compression: {compression}")
+    return serializer
+
+
+def _decompress(raw: bytes) -> bytes:
+    zstd = _require("zstandard")
+    try:
+        return zstd.ZstdDecompressor().decompress(raw)
+    except zstd.ZstdError as e:
+        raise ValueError(f"Corrupt zstd frame: {e}") from e
+
+
+def decode(raw: bytes) -> tuple[Any, str]:
+    """
+    Decode a storage file in any supported format; returns (data, format detected from the first bytes)
+
+    Files written before the format was configurable (indented JSON) and files written
+    with another STORAGE_FORMAT load the same way; the next write uses the configured one.
+    Raises ValueError for corrupt data and StorageFormatError if a package is missing.
+    """
+    compressed = raw.startswith(ZSTD_MAGIC)
+    if compressed:
+        raw = _decompress(raw)
+    serializer = MsgpackSerializer() if raw[:1] and raw[0] in MSGPACK_MAP_MARKERS else JSONSerializer()
+    return serializer.loads(raw), (f"{serializer.name}+zstd" if compressed else serializer.name)
@@ -0,0 +1,299 @@
+"""SQLite-based storage for bot role, last message IDs and chat histories"""
+import json
+import logging
+import os
+import hashlib
+import sqlite3
+import time
+from collections import deque
+
+from chat_history import HistoryEntry, MessageRole
+from database import RoleStorage, StorageStats
+from history_cache import HistoryCache
+from serializers import decode
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS last_message_ids (
+    chat_id INTEGER PRIMARY KEY,
+    message_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_history (
+    chat_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (chat_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chat_summaries (
+    chat_id INTEGER PRIMARY KEY,
+    summary TEXT NOT NULL
+);
+"""
+
+
+class SQLiteRoleStorage:
+    """RoleStorage-compatible storage backed by SQLite (WAL mode, one row per history message)"""
+
+    DEFAULT_ROLE = RoleStorage.DEFAULT_ROLE
+
+    def __init__(
+        self,
+        bot_token: str,
+        data_dir: str = "/data",
+        history_limit: int = 20,
+        history_cache: HistoryCache | None = None
+    ):
+        # Create data directory if it doesn't exist
+        os.makedirs(data_dir, exist_ok=True)
+
+        # Use hash of bot token for unique filename (same scheme as the JSON backend)
+        token_hash = hashlib.md5(bot_token.encode()).hexdigest()[:8]
+        self.filename = os.path.join(data_dir, f"role_{token_hash}.db")
+        self.json_filename = os.path.join(data_dir, f"role_{token_hash}.json")
+        self.history_limit = history_limit
+        self.stats = StorageStats()
+
+        # Hot chat histories stay in memory; cold ones are read from the database on demand
+        self.history_cache = history_cache if history_cache is not None else HistoryCache()
+
+        is_new = not os.path.exists(self.filename)
+        # The connection may be opened in a worker thread (see open_role_storage) and used on the event loop
+        self._conn = sqlite3.connect(self.filename, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        # One-shot migration from the JSON file of the same bot
+        if is_new and os.path.isfile(self.json_filename):
+            try:
+                migrated = migrate_json_to_sqlite(self.json_filename, self._conn)
+                logger.info(f"Migrated {migrated} chat(s) from {self.json_filename} to {self.filename}")
+            except (json.JSONDecodeError, ValueError, KeyError) as e:
+                logger.warning(f"Could not migrate {self.json_filename}: {e}")
+
+        row = self._conn.execute("SELECT value FROM settings WHERE key = 'role'").fetchone()
+        self.role: str = row[0] if row else self.DEFAULT_ROLE
+
+    def _commit(self) -> None:
+        """Commit the current transaction and update stats"""
+        start = time.perf_counter()
+        self._conn.commit()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        self.stats.mutations += 1
+        self.stats.record_flush(elapsed_ms)
+
+    def flush(self) -> None:
+        """Nothing to do: every mutation is committed immediately"""
+
+    async def aclose(self) -> None:
+        """Close the database connection"""
+        self._conn.close()
+        logger.info(f"History cache stats for {self.filename}: {self.history_cache.as_dict()}")
+
+    def get_role(self) -> str:
+        """Get current role"""
+        return self.role
+
+    def set_role(self, role: str) -> None:
+        """Set new role"""
+        self.role = role
+        self._conn.execute(
+            "INSERT INTO settings (key, value) VALUES ('role', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (role,)
+        )
+        self._commit()
+
+    def delete_role(self) -> None:
+        """Reset to default role"""
+        self.role = self.DEFAULT_ROLE
+        self._conn.execute("DELETE FROM settings WHERE key = 'role'")
+        self._commit()
+
+    def get_last_message_id(self, chat_id: int) -> int | None:
+        """Get last message ID for a chat"""
+        row = self._conn.execute(
+            "SELECT message_id FROM last_message_ids WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _write_last_message_id(self, chat_id: int, message_id: int) -> None:
+        self._conn.execute(
+            "INSERT INTO last_message_ids (chat_id, message_id) VALUES (?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET message_id = excluded.message_id",
+            (chat_id, message_id)
+        )
+
+    def set_last_message_id(self, chat_id: int, message_id: int) -> None:
+        """Set last message ID for a chat"""
+        self._write_last_message_id(chat_id, message_id)
+        self._commit()
+
+    def clear_last_message_id(self, chat_id: int) -> None:
+        """Clear last message ID for a chat"""
+        cursor = self._conn.execute("DELETE FROM last_message_ids WHERE chat_id = ?", (chat_id,))
+        if cursor.rowcount:
+            self._commit()
+        else:
+            # Nothing deleted: still end the transaction the DELETE opened, it holds the write lock
+            self._conn.commit()
+
+    def get_chat_history(self, chat_id: int) -> deque[HistoryEntry]:
+        """Get chat history for a specific chat"""
+        history = self.history_cache.get(chat_id)
+        if history is None:
+            rows = self._conn.execute(
+                "SELECT role, content FROM chat_history WHERE chat_id = ? ORDER BY seq",
+                (chat_id,)
+            ).fetchall()
+            history = deque(
+                (HistoryEntry(MessageRole.parse(role), content) for role, content in rows),
+                maxlen=self.history_limit
+            )
+            self.history_cache.put(chat_id, history)
+        return history
+
+    def _insert_history(self, chat_id: int, entries: list[HistoryEntry]) -> None:
+        """Insert history rows and trim the chat to history_limit (the caller commits)"""
+        row = self._conn.execute(
+            "SELECT MAX(seq) FROM chat_history WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        seq = row[0] or 0
+
+        self._conn.executemany(
+            "INSERT INTO chat_history (chat_id, seq, role, content) VALUES (?, ?, ?, ?)",
+            [(chat_id, seq + i, entry.role.label, entry.content) for i, entry in enumerate(entries, start=1)]
+        )
+        seq += len(entries)
+
+        # Trim history: a range delete on the (chat_id, seq) primary key
+        self._conn.execute(
+            "DELETE FROM chat_history WHERE chat_id = ? AND seq <= ?",
+            (chat_id, seq - self.history_limit)
+        )
+
+    def _append_history(self, chat_id: int, entries: list[HistoryEntry]) -> None:
+        """Insert history rows and trim the chat to history_limit in one transaction"""
+        self._insert_history(chat_id, entries)
+        self._commit()
+
+        for entry in entries:
+            self.history_cache.append(chat_id, entry)
+
+    def add_message_to_history(self, chat_id: int, role: str, content: str) -> None:
+        """Add a message to chat history and maintain limit"""
+        self._append_history(chat_id, [HistoryEntry(MessageRole.parse(role), content)])
+
+    def add_exchange(self, chat_id: int, user_message: str, assistant_message: str) -> None:
+        """Add a user message and the bot's reply to chat history in a single transaction"""
+        self._append_history(chat_id, [
+            HistoryEntry(MessageRole.USER, user_message),
+            HistoryEntry(MessageRole.ASSISTANT, assistant_message),
+        ])
+
+    def record_comment(self, chat_id: int, message_id: int, exchange: tuple[str, str] | None = None) -> None:
+        """Store the ID of a new bot comment and add the (user message, comment) exchange in one transaction"""
+        entries = []
+        if exchange is not None:
+            entries = [HistoryEntry(MessageRole.USER, exchange[0]), HistoryEntry(MessageRole.ASSISTANT, exchange[1])]
+            self._insert_history(chat_id, entries)
+        self._write_last_message_id(chat_id, message_id)
+        self._commit()
+
+        for entry in entries:
+            self.history_cache.append(chat_id, entry)
+
+    def set_history_limit(self, history_limit: int) -> None:
+        """Change the max number of messages kept per chat, trimming existing histories"""
+        if history_limit == self.history_limit:
+            return
+        self.history_limit = history_limit
+        self._conn.execute(
+            "DELETE FROM chat_history AS h "
+            "WHERE seq <= (SELECT MAX(seq) FROM chat_history WHERE chat_id = h.chat_id) - ?",
+            (history_limit,)
+        )
+        self._commit()
+        self.history_cache.resize(history_limit)
+
+    def get_summary(self, chat_id: int) -> str | None:
+        """Get the running summary of a chat's folded history"""
+        row = self._conn.execute(
+            "SELECT summary FROM chat_summaries WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def fold_history(self, chat_id: int, count: int, summary: str) -> None:
+        """Replace the `count` oldest history messages of a chat with a new running summary"""
+        self._conn.execute(
+            "DELETE FROM chat_history WHERE chat_id = ? AND seq IN "
+            "(SELECT seq FROM chat_history WHERE chat_id = ? ORDER BY seq LIMIT ?)",
+            (chat_id, chat_id, count)
+        )
+        self._conn.execute(
+            "INSERT INTO chat_summaries (chat_id, summary) VALUES (?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET summary = excluded.summary",
+            (chat_id, summary)
+        )
+        self._commit()
+        # Folding is rare: reload the shortened history on next access
+        self.history_cache.discard(chat_id)
+
+    def clear_chat_history(self, chat_id: int) -> None:
+        """Clear chat history (and its summary) for a specific chat"""
+        self.history_cache.discard(chat_id)
+        cursor = self._conn.execute("DELETE FROM chat_history WHERE chat_id = ?", (chat_id,))
+        deleted = cursor.rowcount
+        cursor = self._conn.execute("DELETE FROM chat_summaries WHERE chat_id = ?", (chat_id,))
+        if deleted or cursor.rowcount:
+            self._commit()
+        else:
+            self._conn.commit()
+
+
+def migrate_json_to_sqlite(json_filename: str, conn: sqlite3.Connection) -> int:
+    """
+    Copy role, last message IDs, chat histories and summaries from a JSON storage file into SQLite
+
+    Args:
+        json_filename: Path to an existing role_<hash>.json file (in any format of serializers.py)
+        conn: Open connection to a database with the storage schema
+
+    Returns:
+        Number of chats with history that were migrated
+    """
+    with open(json_filename, "rb") as f:
+        data, _ = decode(f.read())
+
+    with conn:
+        if data.get("role"):
+            conn.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES ('role', ?)",
+                (data["role"],)
+            )
+        conn.executemany(
+            "INSERT OR REPLACE INTO last_message_ids (chat_id, message_id) VALUES (?, ?)",
+            [(int(k), v) for k, v in data.get("last_message_ids", {}).items()]
+        )
+        chat_histories = data.get("chat_histories", {})
+        conn.executemany(
+            "INSERT OR REPLACE INTO chat_history (chat_id, seq, role, content) VALUES (?, ?, ?, ?)",
+            [
+                (int(chat_id), seq, entry.role.label, entry.content)
+                for chat_id, history in chat_histories.items()
+                for seq, entry in enumerate(map(HistoryEntry.from_json, history), start=1)
+            ]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO chat_summaries (chat_id, summary) VALUES (?, ?)",
+            [(int(chat_id), summary) for chat_id, summary in data.get("chat_summaries", {}).items()]
+        )
+    return len(chat_histories)
@@ -0,0 +1,119 @@
+"""Progressive delivery of streamed LLM comments via Telegram message edits"""
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from llm_client import GroqAPIError
+
+logger = logging.getLogger(__name__)
+
+# Shown after the partial text while the comment is still being generated
+STREAMING_CURSOR = " …"
+
+
+class StreamStats:
+    """Counters for streamed comments (time to first visible token, edits)"""
+
+    def __init__(self):
+        self.streams = 0
+        self.first_visible_total = 0.0
+        self.first_visible_max = 0.0
+        self.edits = 0
+        self.failed_edits = 0
+
+    def record_first_visible(self, seconds: float) -> None:
+        self.streams += 1
+        self.first_visible_total += seconds
+        self.first_visible_max = max(self.first_visible_max, seconds)
+
+    def as_dict(self) -> dict:
+        """Return counters as a plain dict (for logs and metrics)"""
+        return {
+            "streams": self.streams,
+            "avg_first_visible_ms": (
+                round(self.first_visible_total / self.streams * 1000, 1) if self.streams else 0.0
+            ),
+            "max_first_visible_ms": round(self.first_visible_max * 1000, 1),
+            "edits": self.edits,
+            "failed_edits": self.failed_edits,
+        }
+
+
+async def send_streamed_comment(
+    chunks: AsyncIterator[str],
+    send: Callable[[str], Awaitable[Message]],
+    edit_interval: float,
+    stats: StreamStats,
+) -> tuple[str, Message]:
+    """
+    Send a comment as soon as its first text arrives, then edit it as the rest streams in
+
+    Edits are made at most once per `edit_interval` seconds (Telegram rate-limits edits,
+    roughly 20 messages per minute in groups). If the stream fails after the first chunk
+    was sent, the partial message is deleted before the error is re-raised.
+
+    Args:
+        chunks: Text chunks from GroqClient.stream_comment
+        send: Sends the first chunk (message.reply or message.answer)
+        edit_interval: Minimum seconds between edits of the sent message
+        stats: Counters to update
+
+    Returns:
+        The full comment text and the sent message
+    """
+    started = time.monotonic()
+    text = ""
+    sent_message: Message | None = None
+    visible_text = ""
+    last_edit = 0.0
+
+    try:
+        async for chunk in chunks:
+            text += chunk
+            if sent_message is None:
+                if not text.strip():
+                    continue
+                sent_message = await send(text + STREAMING_CURSOR)
+                visible_text = text
+                last_edit = time.monotonic()
+                stats.record_first_visible(last_edit - started)
+                logger.debug(f"First comment text visible after {(last_edit - started) * 1000:.0f} ms")
+            elif time.monotonic() - last_edit >= edit_interval and text != visible_text:
+                visible_text = text
+                last_edit = time.monotonic()
+                await _edit(sent_message, text + STREAMING_CURSOR, stats)
+
+        if sent_message is None:
+            raise GroqAPIError("Groq API returned an empty comment")
+
+        # Final edit drops the cursor; retry once if Telegram asks us to slow down
+        try:
+            await sent_message.edit_text(text)
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            await sent_message.edit_text(text)
+        stats.edits += 1
+
+    except BaseException:
+        if sent_message is not None:
+            try:
+                await sent_message.delete()
+            except Exception as e:
+                logger.warning(f"Could not delete partial comment {sent_message.message_id}: {e}")
+        raise
+
+    return text, sent_message
+
+
+async def _edit(message: Message, text: str, stats: StreamStats) -> None:
+    """Intermediate edit; failures are skipped since a later edit will catch up"""
+    try:
+        await message.edit_text(text)
+        stats.edits += 1
+    except (TelegramBadRequest, TelegramRetryAfter) as e:
+        stats.failed_edits += 1
+        logger.debug(f"Skipped intermediate edit of message {message.message_id}: {e}")
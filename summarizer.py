@@ -0,0 +1,205 @@
+"""Rolling summarization: the oldest turns of long chat histories are folded into a stored summary"""
+import asyncio
+import itertools
+import logging
+from typing import Any, Sequence
+
+from chat_history import HistoryEntry, MessageRole
+from context_builder import truncate_to_tokens
+from llm_client import GroqAPIError, GroqClient
+from llm_scheduler import LLMRequestShed, ScheduledLLMClient
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Ты ведёшь краткий конспект переписки в групповом чате. Обнови конспект с учётом новых "
+    "сообщений: сохрани важные факты, имена, договорённости и темы, убери повторы и мелочи. "
+    "Пиши сжато, в третьем лице, без вступлений. Ответь только текстом конспекта."
+)
+
+# Prefix of the system message that carries the summary into comment prompts
+SUMMARY_HEADER = "Краткое содержание более ранней переписки в этом чате:"
+
+SPEAKERS = {MessageRole.USER: "Участник", MessageRole.ASSISTANT: "Бот", MessageRole.SYSTEM: "Система"}
+
+# Long messages are shortened before they are summarized
+MAX_FOLDED_MESSAGE_TOKENS = 500
+
+
+def history_with_summary(storage: Any, chat_id: int) -> Sequence[HistoryEntry]:
+    """Chat history for a prompt: the running summary (as a system message), then the recent messages"""
+    history = storage.get_chat_history(chat_id)
+    summary = storage.get_summary(chat_id)
+    if not summary:
+        return history
+    return [HistoryEntry(MessageRole.SYSTEM, f"{SUMMARY_HEADER}\n{summary}"), *history]
+
+
+def _still_oldest(history: Sequence[HistoryEntry], folded: list[HistoryEntry]) -> int:
+    """How many of the folded messages are still the oldest in history (some may have dropped off)"""
+    head = list(itertools.islice(history, len(folded)))
+    for dropped in range(len(folded)):
+        count = len(folded) - dropped
+        if head[:count] == folded[dropped:]:
+            return count
+    return 0
+
+
+class HistorySummarizer:
+    """
+    Folds the oldest turns of long chat histories into a running summary, off the request path
+
+    Handlers call note() after adding to a chat's history. Once the history has `threshold`
+    messages (or the storage's history limit, if lower) the chat is queued. A background task
+    wakes every `interval` seconds, or as soon as `batch_size` chats are queued, and summarizes
+    the queued chats of all bots as one batch with at most `concurrency` requests in flight.
+    Each chat keeps its `keep_recent` newest messages verbatim; the older ones and the previous
+    summary are condensed into the new summary by a small model. A chat's summary is requested
+    with the client passed to note() (a bot's ScheduledLLMClient, so it counts against the shared
+    LLM budgets and that bot's fair share), or with `client` if none was passed.
+    """
+
+    def __init__(
+        self,
+        client: GroqClient | ScheduledLLMClient,
+        model: str = "llama-3.1-8b-instant",
+        threshold: int = 16,
+        keep_recent: int = 8,
+        interval: float = 10.0,
+        batch_size: int = 20,
+        concurrency: int = 4,
+        max_summary_tokens: int = 300,
+    ):
+        self.client = client
+        self.model = model
+        self.threshold = threshold
+        self.keep_recent = keep_recent
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_summary_tokens = max_summary_tokens
+
+        # (storage, chat_id) keys, in the order they became due -> client for their summary
+        self._pending: dict[tuple[Any, int], GroqClient | ScheduledLLMClient] = {}
+        self._running: set[tuple[Any, int]] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._worker: asyncio.Task | None = None
+
+        self.stats = {"batches": 0, "summarized_chats": 0, "folded_messages": 0, "discarded": 0, "failures": 0}
+
+    def _limits(self, storage: Any) -> tuple[int, int]:
+        """Effective (threshold, keep_recent) for a storage, whose history limit can change at runtime"""
+        threshold = min(self.threshold, storage.history_limit)
+        return threshold, min(self.keep_recent, threshold // 2)
+
+    def note(self, storage: Any, chat_id: int, client: GroqClient | ScheduledLLMClient | None = None) -> None:
+        """Queue the chat for summarization if its history has grown past the threshold (using `client`)"""
+        threshold, keep = self._limits(storage)
+        if len(storage.get_chat_history(chat_id)) < max(threshold, keep + 1):
+            return
+
+        key = (storage, chat_id)
+        if key in self._pending or key in self._running:
+            return
+        self._pending[key] = client or self.client
+
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        """Summarize a batch every interval, or early when a full batch is queued"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._pending:
+                await self._run_batch()
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+
+    async def _run_batch(self) -> None:
+        batch = list(itertools.islice(self._pending.items(), self.batch_size))
+        for key, _ in batch:
+            del self._pending[key]
+            self._running.add(key)
+        self.stats["batches"] += 1
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def summarize(key: tuple[Any, int], client: GroqClient | ScheduledLLMClient) -> None:
+            async with semaphore:
+                try:
+                    await self._summarize(*key, client)
+                except Exception as e:
+                    self.stats["failures"] += 1
+                    logger.error(f"Failed to summarize history of chat {key[1]}: {e}", exc_info=True)
+                finally:
+                    self._running.discard(key)
+
+        await asyncio.gather(*(summarize(key, client) for key, client in batch))
+
+    def _prompt(self, summary: str | None, folded: list[HistoryEntry]) -> list[dict]:
+        lines = "\n".join(
+            f"{SPEAKERS[entry.role]}: {truncate_to_tokens(entry.content, MAX_FOLDED_MESSAGE_TOKENS)}"
+            for entry in folded
+        )
+        return [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Текущий конспект:\n{summary or '(пусто)'}\n\nНовые сообщения:\n{lines}"},
+        ]
+
+    async def _summarize(self, storage: Any, chat_id: int, client: GroqClient | ScheduledLLMClient) -> None:
+        """Fold everything but the newest keep_recent messages of a chat into its summary"""
+        history = storage.get_chat_history(chat_id)
+        _, keep = self._limits(storage)
+        folded = list(itertools.islice(history, max(len(history) - keep, 0)))
+        if not folded:
+            return
+
+        try:
+            summary = await client.complete(
+                self._prompt(storage.get_summary(chat_id), folded),
+                model=self.model,
+                max_tokens=self.max_summary_tokens,
+                temperature=0.3
+            )
+        except (GroqAPIError, LLMRequestShed) as e:
+            # Nothing is lost: the chat is queued again with its next message
+            self.stats["failures"] += 1
+            logger.warning(f"Could not summarize history of chat {chat_id}: {e}")
+            return
+        if (storage, chat_id) not in self._running:
+            return  # The storage was closed meanwhile (see forget)
+
+        # The history may have changed during the request: new messages are fine, a cleared
+        # history (nothing folded is left) means the summary is stale
+        count = _still_oldest(storage.get_chat_history(chat_id), folded)
+        if not count or not summary.strip():
+            self.stats["discarded"] += 1
+            return
+
+        storage.fold_history(chat_id, count, summary.strip())
+        self.stats["summarized_chats"] += 1
+        self.stats["folded_messages"] += count
+        logger.info(f"Folded {count} messages of chat {chat_id} into its summary ({len(summary)} chars)")
+
+    def forget(self, storage: Any) -> None:
+        """Drop queued and in-flight work for a storage that is about to be closed"""
+        for key in [key for key in self._pending if key[0] is storage]:
+            del self._pending[key]
+        self._running = {key for key in self._running if key[0] is not storage}
+
+    async def aclose(self) -> None:
+        """Stop the background task; queued chats are picked up again with their next message"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
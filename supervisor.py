@@ -0,0 +1,228 @@
+"""Supervisor: runs bots in several worker processes and restarts workers that die"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from contextlib import suppress
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+def worker_for_token(bot_token: str, workers: int) -> int:
+    """Stable worker index for a bot (same md5 token hash as the storage file names)"""
+    return int(hashlib.md5(bot_token.encode()).hexdigest()[:8], 16) % workers
+
+
+class WorkerProcess:
+    """One worker process and what the supervisor knows about it"""
+
+    def __init__(self, index: int, bot_names: list[str]):
+        self.index = index
+        self.bot_names = bot_names
+        self.process: asyncio.subprocess.Process | None = None
+        self.started_at = 0.0
+        self.last_heartbeat: float | None = None
+        self.status: dict = {}
+        self.restarts = 0
+        self.failures = 0  # Consecutive quick failures, drives the restart backoff
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def heartbeat_age(self) -> float:
+        return time.monotonic() - (self.last_heartbeat or self.started_at)
+
+
+class Supervisor:
+    """
+    Starts one worker process per shard of bots and keeps them running
+
+    Workers are `main_multi.py` processes started with WORKER_INDEX set; each runs only
+    the bots whose token hashes to its index, so it owns their storage files exclusively.
+    Workers print JSON status lines on stdout (heartbeats), which the supervisor
+    aggregates and serves at GET /status. A worker that exits or stops sending
+    heartbeats is restarted with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        shards: dict[int, list[str]],
+        command: list[str],
+        host: str = "0.0.0.0",
+        port: int = 8090,
+        health_port: int = 0,
+        restart_base_delay: float = 1.0,
+        restart_max_delay: float = 60.0,
+        heartbeat_timeout: float = 60.0,
+        stable_after: float = 60.0,
+        shutdown_timeout: float = 30.0,
+    ):
+        self.command = command
+        self.host = host
+        self.port = port
+        self.health_port = health_port
+        self.restart_base_delay = restart_base_delay
+        self.restart_max_delay = restart_max_delay
+        self.heartbeat_timeout = heartbeat_timeout
+        self.stable_after = stable_after
+        self.shutdown_timeout = shutdown_timeout
+
+        self.workers = [WorkerProcess(index, bot_names) for index, bot_names in sorted(shards.items())]
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        """Run workers until SIGTERM/SIGINT, then stop them gracefully"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            with suppress(NotImplementedError):
+                loop.add_signal_handler(sig, self._stopping.set)
+
+        app = web.Application()
+        app.router.add_get("/status", self._handle_status)
+        app.router.add_get("/healthz", self._handle_healthz)
+        app.router.add_get("/readyz", self._handle_readyz)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port).start()
+        logger.info(f"Supervisor status on http://{self.host}:{self.port}/status")
+        # Same endpoints on the health port, so health checks work the same with or without workers
+        if self.health_port and self.health_port != self.port:
+            await web.TCPSite(runner, self.host, self.health_port).start()
+            logger.info(f"Health checks on http://{self.host}:{self.health_port}/healthz and /readyz")
+
+        tasks = [asyncio.create_task(self._keep_running(worker)) for worker in self.workers]
+        tasks.append(asyncio.create_task(self._watchdog()))
+        try:
+            await self._stopping.wait()
+            logger.info("Stopping workers...")
+        finally:
+            self._stopping.set()
+            await asyncio.gather(*(self._stop_worker(worker) for worker in self.workers))
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await runner.cleanup()
+            logger.info("Supervisor stopped")
+
+    async def _keep_running(self, worker: WorkerProcess) -> None:
+        """Start the worker, read its heartbeats, and restart it with backoff when it exits"""
+        while not self._stopping.is_set():
+            env = dict(os.environ, WORKER_INDEX=str(worker.index))
+            worker.process = await asyncio.create_subprocess_exec(
+                *self.command, env=env, stdout=asyncio.subprocess.PIPE, limit=1024 * 1024
+            )
+            worker.started_at = time.monotonic()
+            worker.last_heartbeat = None
+            logger.info(
+                f"Worker {worker.index} started (pid={worker.process.pid}, bots: {', '.join(worker.bot_names)})"
+            )
+
+            await self._read_heartbeats(worker)
+            returncode = await worker.process.wait()
+            if self._stopping.is_set():
+                return
+
+            # Quick successive failures back off exponentially; a worker that ran for a while restarts fast
+            if time.monotonic() - worker.started_at >= self.stable_after:
+                worker.failures = 0
+            delay = min(self.restart_max_delay, self.restart_base_delay * 2 ** worker.failures)
+            worker.failures += 1
+            worker.restarts += 1
+            logger.error(f"Worker {worker.index} exited with code {returncode}, restarting in {delay:.1f}s")
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+
+    async def _read_heartbeats(self, worker: WorkerProcess) -> None:
+        """Consume the worker's stdout until it closes; JSON lines are status reports"""
+        async for line in worker.process.stdout:
+            try:
+                status = json.loads(line)
+            except ValueError:
+                sys.stdout.write(line.decode(errors="replace"))
+                continue
+            worker.status = status
+            worker.last_heartbeat = time.monotonic()
+
+    async def _watchdog(self) -> None:
+        """Kill workers that stopped reporting (hung event loop); _keep_running restarts them"""
+        while True:
+            await asyncio.sleep(self.heartbeat_timeout / 4)
+            for worker in self.workers:
+                if worker.alive and worker.heartbeat_age() > self.heartbeat_timeout:
+                    logger.error(
+                        f"Worker {worker.index} sent no heartbeat for {worker.heartbeat_age():.0f}s, killing it"
+                    )
+                    worker.process.kill()
+
+    async def _stop_worker(self, worker: WorkerProcess) -> None:
+        if not worker.alive:
+            return
+        worker.process.terminate()
+        try:
+            await asyncio.wait_for(worker.process.wait(), timeout=self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Worker {worker.index} did not stop in {self.shutdown_timeout:.0f}s, killing it")
+            worker.process.kill()
+            await worker.process.wait()
+
+    def is_healthy(self, worker: WorkerProcess) -> bool:
+        return worker.alive and worker.last_heartbeat is not None and worker.heartbeat_age() <= self.heartbeat_timeout
+
+    def status(self) -> dict:
+        """Aggregated health and metrics of all workers"""
+        workers = []
+        groq: dict[str, float] = {}
+        llm_scheduler: dict[str, dict] = {}
+        storage: dict[str, dict] = {}
+        bots: dict[str, dict] = {}
+        for worker in self.workers:
+            health = worker.status.get("health", {})
+            workers.append({
+                "index": worker.index,
+                "pid": worker.process.pid if worker.process is not None else None,
+                "alive": worker.alive,
+                "healthy": self.is_healthy(worker),
+                "restarts": worker.restarts,
+                "heartbeat_age": round(worker.heartbeat_age(), 1) if worker.process is not None else None,
+                "bots": worker.bot_names,
+                "running_bots": worker.status.get("running_bots", []),
+                "live": health.get("live", True),
+                "ready": self.is_healthy(worker) and health.get("ready", False),
+                "storage_writable": health.get("storage", {}).get("writable"),
+            })
+            for key, value in worker.status.get("groq", {}).items():
+                groq[key] = groq.get(key, 0) + value
+            llm_scheduler.update(worker.status.get("llm_scheduler", {}))
+            storage.update(worker.status.get("storage", {}))
+            bots.update(health.get("bots", {}))
+
+        return {
+            "healthy": all(worker["healthy"] for worker in workers),
+            # Dead workers are restarted here; only a hung bot inside a running worker is not live
+            "live": all(worker["live"] for worker in workers),
+            "ready": all(worker["ready"] for worker in workers),
+            "workers": workers,
+            "bots": bots,
+            "groq": groq,
+            "llm_scheduler": llm_scheduler,
+            "storage": storage,
+        }
+
+    async def _handle_status(self, request: web.Request) -> web.Response:
+        status = self.status()
+        return web.json_response(status, status=200 if status["healthy"] else 503)
+
+    async def _handle_healthz(self, request: web.Request) -> web.Response:
+        status = self.status()
+        return web.json_response(status, status=200 if status["live"] else 503)
+
+    async def _handle_readyz(self, request: web.Request) -> web.Response:
+        status = self.status()
+        return web.json_response(status, status=200 if status["ready"] else 503)
@@ -0,0 +1,188 @@
+"""Bounded per-bot work queue: a fixed number of workers, per-chat ordering and load shedding"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class ChatWorkQueue:
+    """
+    Runs work items (bursts of group messages) on a fixed pool of worker tasks
+
+    Items of one chat are processed one at a time in arrival order, and chats with pending
+    items take turns, so a busy chat cannot starve the others. At most `max_pending` items
+    wait in total and at most `max_pending_per_chat` per chat. When a limit is exceeded the
+    oldest waiting item of that chat is dropped (for the global limit: of the chat with the
+    longest backlog). A comment on the newest message is worth more than one on a message
+    that has already scrolled away.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        callback: Callable[[Any], Awaitable[None]],
+        max_pending: int = 100,
+        max_pending_per_chat: int = 3,
+        name: str = "",
+    ):
+        self.workers = workers
+        self.callback = callback
+        self.max_pending = max_pending
+        self.max_pending_per_chat = max_pending_per_chat
+        self.name = name
+
+        self._chats: dict[int, deque[tuple[float, Any]]] = {}  # chat_id -> (enqueued at, item), oldest first
+        self._ready: asyncio.Queue[int | None] | None = None  # Chats with pending items, none in progress
+        self._queued: set[int] = set()
+        self._busy: set[int] = set()
+        self._size = 0
+        self._tasks: list[asyncio.Task] = []
+        self._closed = False
+        self._drained: asyncio.Event | None = None  # Set when the last waiting item is taken (aclose(drain=True))
+
+        # Optional metric children (see BotMetrics), set by the owner
+        self.shed_counter = None
+        self.wait_histogram = None
+
+        self.submitted = 0
+        self.processed = 0
+        self.shed = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        """Items waiting for a worker"""
+        return self._size
+
+    @property
+    def busy_workers(self) -> int:
+        return len(self._busy)
+
+    def submit(self, chat_id: int, item: Any) -> None:
+        """Queue an item for the chat, shedding the oldest waiting item if a limit is exceeded"""
+        if self._closed:
+            return
+        self.submitted += 1
+        pending = self._chats.setdefault(chat_id, deque())
+        pending.append((time.monotonic(), item))
+        self._size += 1
+
+        if len(pending) > self.max_pending_per_chat:
+            self._shed(chat_id)
+        elif self._size > self.max_pending:
+            self._shed(max(self._chats, key=lambda c: len(self._chats[c])))
+        self.max_depth = max(self.max_depth, self._size)
+
+        if not self._tasks:
+            self._ready = asyncio.Queue()
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+        if chat_id not in self._busy and chat_id not in self._queued:
+            self._queued.add(chat_id)
+            self._ready.put_nowait(chat_id)
+
+    def _shed(self, chat_id: int) -> None:
+        self._chats[chat_id].popleft()
+        self._size -= 1
+        self.shed += 1
+        if self.shed_counter is not None:
+            self.shed_counter.inc()
+        logger.warning(f"[{self.name}] Update queue full: dropped the oldest pending message of chat {chat_id}")
+
+    async def _work(self) -> None:
+        while True:
+            chat_id = await self._ready.get()
+            if chat_id is None:
+                return
+            self._queued.discard(chat_id)
+            pending = self._chats.get(chat_id)
+            if not pending:
+                self._chats.pop(chat_id, None)
+                continue
+
+            enqueued_at, item = pending.popleft()
+            self._size -= 1
+            if self._drained is not None and not self._size:
+                self._drained.set()
+            self._busy.add(chat_id)
+            if self.wait_histogram is not None:
+                self.wait_histogram.observe(time.monotonic() - enqueued_at)
+            try:
+                await self.callback(item)
+            except Exception as e:
+                logger.error(f"[{self.name}] Update worker failed in chat {chat_id}: {e}", exc_info=True)
+            finally:
+                self.processed += 1
+                self._busy.discard(chat_id)
+                # Next item of the same chat goes to the back of the line, behind other chats
+                if self._chats.get(chat_id):
+                    self._queued.add(chat_id)
+                    self._ready.put_nowait(chat_id)
+                else:
+                    self._chats.pop(chat_id, None)
+
+    def as_dict(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "shed": self.shed,
+            "depth": self._size,
+            "max_depth": self.max_depth,
+        }
+
+    async def aclose(self, drain: bool = False) -> None:
+        """
+        Stop accepting items and let the workers finish their current item
+
+        Items still waiting are dropped, or with drain=True processed first (e.g. bursts
+        the debouncer flushed on shutdown).
+        """
+        self._closed = True
+        if drain and self._size:
+            logger.info(f"[{self.name}] Processing {self._size} pending update(s) before shutdown")
+            self._drained = asyncio.Event()
+            await self._drained.wait()
+        elif self._size:
+            logger.info(f"[{self.name}] Dropping {self._size} pending update(s) on shutdown")
+        self._chats.clear()
+        self._size = 0
+        for _ in self._tasks:
+            self._ready.put_nowait(None)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+class ChatLocks:
+    """
+    One asyncio.Lock per chat, created on first use and dropped when nobody holds or waits for it
+
+    Comment writers hold their chat's lock from reading last_message_id to recording the new
+    comment, so two comments of one chat never interleave (which would leave one of them
+    undeleted). Waiters are served in arrival order.
+    """
+
+    def __init__(self):
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._users: dict[int, int] = {}  # chat_id -> tasks holding or waiting for the lock
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, chat_id: int) -> AsyncIterator[None]:
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = asyncio.Lock()
+        self._users[chat_id] = self._users.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[chat_id] -= 1
+            if not self._users[chat_id]:
+                del self._locks[chat_id], self._users[chat_id]
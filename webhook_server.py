@@ -0,0 +1,153 @@
+"""Webhook runtime: one aiohttp server receiving updates for all bots"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class _WebhookBot:
+    __slots__ = ("bot", "dispatcher", "secret_token")
+
+    def __init__(self, bot: Bot, dispatcher: Dispatcher, secret_token: str):
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.secret_token = secret_token
+
+
+class WebhookServer:
+    """
+    Serves POST /webhook/<bot-id> for every registered bot on a single port
+
+    Each request is checked against the bot's secret token, acknowledged right away and
+    processed by the bot's Dispatcher in a background task, so Telegram never waits on
+    the LLM. serve_bot() returns only after stop() has drained the updates in progress.
+    """
+
+    def __init__(self, base_url: str, host: str = "0.0.0.0", port: int = 8080, secret: str = ""):
+        self.base_url = base_url.rstrip("/")
+        self.host = host
+        self.port = port
+        self.secret = secret
+
+        self._bots: dict[str, _WebhookBot] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._runner: web.AppRunner | None = None
+        self._stopped = asyncio.Event()
+        self._stop_task: asyncio.Task | None = None
+
+        self.updates = 0
+        self.rejected = 0
+        self.failed = 0
+        self.total_ack = 0.0
+        self.max_ack = 0.0
+
+        self.app = web.Application()
+        self.app.router.add_post("/webhook/{bot_id}", self._handle)
+
+    def secret_token_for(self, bot: Bot) -> str:
+        """Per-bot secret token (derived from the bot token, so nothing extra has to be stored)"""
+        return hmac.new(self.secret.encode(), bot.token.encode(), hashlib.sha256).hexdigest()
+
+    def webhook_url_for(self, bot: Bot) -> str:
+        return f"{self.base_url}/webhook/{bot.id}"
+
+    async def start(self) -> None:
+        """Start listening (call before bots register their webhooks)"""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"Webhook server listening on {self.host}:{self.port}")
+
+    def request_stop(self) -> None:
+        """Schedule stop() (for use from signal handlers)"""
+        if self._stop_task is None:
+            self._stop_task = asyncio.get_running_loop().create_task(self.stop())
+
+    async def stop(self) -> None:
+        """Stop accepting updates, wait for the ones being processed, then release serve_bot() calls"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._stopped.set()
+
+    def register(self, bot: Bot, dispatcher: Dispatcher) -> None:
+        """Route updates for `bot` to `dispatcher` without touching the Telegram webhook setting"""
+        self._bots[str(bot.id)] = _WebhookBot(bot, dispatcher, self.secret_token_for(bot))
+
+    def unregister(self, bot: Bot) -> None:
+        self._bots.pop(str(bot.id), None)
+
+    async def serve_bot(self, bot: Bot, dispatcher: Dispatcher, bot_name: str) -> None:
+        """Register the bot, point its Telegram webhook at this server and serve until stopped"""
+        self.register(bot, dispatcher)
+        try:
+            await bot.set_webhook(
+                self.webhook_url_for(bot),
+                secret_token=self.secret_token_for(bot),
+                allowed_updates=dispatcher.resolve_used_update_types()
+            )
+            logger.info(f"[{bot_name}] Webhook set to {self.webhook_url_for(bot)}")
+            await self._stopped.wait()
+        finally:
+            self.unregister(bot)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        start = time.perf_counter()
+        webhook_bot = self._bots.get(request.match_info["bot_id"])
+        if webhook_bot is None:
+            self.rejected += 1
+            return web.Response(status=404)
+
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), webhook_bot.secret_token):
+            self.rejected += 1
+            logger.warning(f"Rejected webhook request for bot {webhook_bot.bot.id}: bad secret token")
+            return web.Response(status=401)
+
+        try:
+            update = await request.json()
+        except ValueError:
+            self.rejected += 1
+            return web.Response(status=400)
+
+        # Acknowledge now; Telegram retries (and blocks later updates) until it gets a 200
+        task = asyncio.create_task(self._process(webhook_bot, update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        elapsed = time.perf_counter() - start
+        self.updates += 1
+        self.total_ack += elapsed
+        self.max_ack = max(self.max_ack, elapsed)
+        return web.Response()
+
+    async def _process(self, webhook_bot: _WebhookBot, update: dict) -> None:
+        try:
+            await webhook_bot.dispatcher.feed_raw_update(webhook_bot.bot, update)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error processing update for bot {webhook_bot.bot.id}: {e}", exc_info=True)
+
+    def as_dict(self) -> dict:
+        """Return server counters as a plain dict (for logs and metrics)"""
+        return {
+            "bots": len(self._bots),
+            "updates": self.updates,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "in_flight": len(self._tasks),
+            "avg_ack_ms": round(self.total_ack / self.updates * 1000, 3) if self.updates else 0.0,
+            "max_ack_ms": round(self.max_ack * 1000, 3),
+        }